@@ -0,0 +1,70 @@
+"""
+Time and peak memory of chunking a cleaned page.
+
+Compares chunker.chunk_spans (offsets, chunk text sliced on access) with
+the word-window chunk_text it replaced, on large synthetic pages. Both are
+measured up to the point where every chunk has been handed out once, as
+embed_page does. Run from the backend directory:
+
+    python -m benchmarks.bench_chunking --pages 20 --sections 200
+"""
+import time
+import argparse
+import tracemalloc
+
+from nymcard.core.chunker import chunk_spans, PageChunks
+from nymcard.core.storage_format import extract_text
+from nymcard.utils.helpers import count_tokens
+from benchmarks.synthetic_pages import make_pages
+
+
+def legacy_chunks(text: str, chunk_size: int = 500, overlap: int = 50):
+    """The previous chunk_text: windows of `chunk_size` words, `overlap` shared."""
+    words = text.split()
+    chunks = []
+    start = 0
+    while start < len(words):
+        end = start + chunk_size
+        chunks.append(" ".join(words[start:end]))
+        start = end - overlap
+    yield from chunks
+
+
+def span_chunks(text: str):
+    for chunk in PageChunks(text, chunk_spans(text)):
+        yield chunk
+
+
+def measure(fn, texts):
+    """(seconds, largest peak of extra memory over one page in bytes)."""
+    elapsed = 0.0
+    peak = 0
+    for text in texts:
+        tracemalloc.start()
+        start = time.perf_counter()
+        for _ in fn(text):
+            pass
+        elapsed += time.perf_counter() - start
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--sections", type=int, default=200)
+    args = parser.parse_args()
+
+    texts = [extract_text(page["body"]["storage"]["value"]) for page in make_pages(args.pages, args.sections)]
+    largest = max(len(text) for text in texts)
+    count_tokens("warm up")  # loads the tokenizer outside the timed runs
+    print(f"Corpus: {len(texts)} pages, largest {largest / 1e6:.2f} MB of cleaned text")
+
+    for name, fn in (("chunk_text ", legacy_chunks), ("chunk_spans", span_chunks)):
+        elapsed, peak = measure(fn, texts)
+        print(f"{name}: {elapsed:6.2f} s, peak {peak / 1e6:6.2f} MB ({peak / largest:.1f}x page)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Throughput of storage-format text extraction, in MB/s of page HTML.
+
+Compares storage_format.extract_text with the two-regex clean_text it
+replaced, on a synthetic corpus. clean_text only strips tags, dropping the
+line structure, lists, tables and code blocks extract_text keeps, so it is
+a floor rather than a target: the ratio is the overhead of that structure.
+Run from the backend directory:
+
+    python -m benchmarks.bench_storage_extract --pages 500
+"""
+import re
+import time
+import argparse
+
+from nymcard.core.storage_format import extract_text
+from benchmarks.synthetic_pages import make_pages
+
+
+def legacy_clean_text(html_text: str) -> str:
+    """The previous clean_text: strip tags, collapse whitespace."""
+    text = re.sub(r"<[^>]+>", " ", html_text)
+    text = re.sub(r"\s+", " ", text)
+    return text.strip()
+
+
+def measure(fn, bodies, repeat: int) -> float:
+    """Best-of-`repeat` throughput of `fn` over `bodies`, in MB/s."""
+    total_mb = sum(len(body.encode("utf-8")) for body in bodies) / 1e6
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for body in bodies:
+            fn(body)
+        best = min(best, time.perf_counter() - start)
+    return total_mb / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--sections", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    bodies = [page["body"]["storage"]["value"] for page in make_pages(args.pages, args.sections)]
+    corpus_mb = sum(len(body.encode("utf-8")) for body in bodies) / 1e6
+    print(f"Corpus: {len(bodies)} pages, {corpus_mb:.1f} MB")
+
+    legacy = measure(legacy_clean_text, bodies, args.repeat)
+    current = measure(extract_text, bodies, args.repeat)
+    print(f"regex clean_text : {legacy:8.1f} MB/s")
+    print(f"extract_text     : {current:8.1f} MB/s ({current / legacy:.2f}x of the structure-less regex)")
+
+
+if __name__ == "__main__":
+    main()
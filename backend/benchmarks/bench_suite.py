@@ -0,0 +1,309 @@
+"""
+Component benchmarks against local stand-ins for Confluence and OpenAI.
+
+Starts FakeConfluence and FakeOpenAI (see fake_services) and points the
+backend at them through its environment variables, with every store in a
+temporary directory. Then measures, in order:
+
+- startup: time to import the CLI (nymcard.main) and the API
+  (nymcard.API.asgi), until ingestion has its vector store, and until the
+  API is warmed up and ready, each in a fresh interpreter (median of
+  --startup-runs)
+- process: process_confluence_page throughput (MB/s of storage format)
+- ingest: fetch_and_ingest_pages pages/s over the whole fake space
+- search: VectorStoreManager.similarity_search_with_scores latency
+- pipeline: end-to-end pipeline.query latency (includes --llm-latency) and
+  LLM input tokens per query, with the --reranker second stage
+
+with the process's peak RSS after each stage. Results are written as JSON;
+pass an earlier result file as --baseline to compare. A run that embedded
+no pages or whose searches came back empty measured nothing useful: its
+errors are printed, no results file is written and the exit status is 1. Run from the backend
+directory:
+
+    python -m benchmarks.bench_suite --pages 200 --output bench.json
+    python -m benchmarks.bench_suite --baseline bench.json --output bench-new.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+import urllib.request
+from dataclasses import asdict
+from datetime import datetime, timezone
+from typing import Dict, List
+
+import numpy as np
+
+from benchmarks.fake_services import ServiceConfig, start_services, stop_services
+from benchmarks.synthetic_pages import make_pages, _WORDS
+
+SPACE_KEY = "BENCH"
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _latency_stats(seconds: List[float]) -> Dict:
+    millis = np.array(seconds) * 1000
+    return {
+        "count": len(millis),
+        "mean_ms": float(millis.mean()),
+        "p50_ms": float(np.percentile(millis, 50)),
+        "p99_ms": float(np.percentile(millis, 99)),
+    }
+
+
+def make_queries(count: int, seed: int = 11) -> List[str]:
+    """Distinct questions, so the query caches do not hide the work being measured."""
+    rng = random.Random(seed)
+    return [f"how does {' '.join(rng.choices(_WORDS, k=rng.randint(2, 5)))} work ({i})" for i in range(count)]
+
+
+# What each startup metric runs in a fresh interpreter.
+STARTUP_SNIPPETS = {
+    "cli_import_ms": "import nymcard.main",
+    "cli_ingest_ready_ms": "import nymcard.main as main; main.VectorStoreManager()",
+    "api_import_ms": "import nymcard.API.asgi",
+    "api_ready_ms": "import asyncio, nymcard.API.asgi as asgi; asyncio.run(asgi.warm_up())",
+}
+
+
+def measure_startup(runs: int) -> Dict:
+    """Median milliseconds of each STARTUP_SNIPPETS entry, timed inside the child process."""
+    results = {}
+    for metric, snippet in STARTUP_SNIPPETS.items():
+        code = f"import time; start = time.perf_counter(); {snippet}; print(time.perf_counter() - start)"
+        timings = []
+        for _ in range(runs):
+            child = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+            timings.append(float(child.stdout.strip().splitlines()[-1]) * 1000)
+        results[metric] = float(np.median(timings))
+    return results
+
+
+def configure_environment(confluence_url: str, openai_url: str, workdir: str, args):
+    """Point the backend at the fake services and keep every store under `workdir`."""
+    os.environ.update({
+        "CONFLUENCE_URL": confluence_url,
+        "CONFLUENCE_USERNAME": "bench",
+        "CONFLUENCE_API_TOKEN": "bench",
+        "CONFLUENCE_SPACE_KEY": SPACE_KEY,
+        "OPENAI_API_KEY": "sk-bench",
+        "OPENAI_API_BASE": openai_url,
+        "OPENAI_BASE_URL": openai_url,
+        "NO_PROXY": "127.0.0.1,localhost",
+        "EMBEDDING_PROVIDER": args.embedding_provider,
+        "VECTORSTORE_BACKEND": args.backend,
+        "RERANKER": args.reranker,
+        "VECTORSTORE_DIRECTORY": os.path.join(workdir, "chroma_db"),
+        "EMBEDDING_CACHE_PATH": os.path.join(workdir, "embedding_cache.sqlite3"),
+        "BM25_INDEX_PATH": os.path.join(workdir, "bm25_index.sqlite3"),
+        "ENTITY_INDEX_PATH": os.path.join(workdir, "entity_index.sqlite3"),
+        "REGISTRY_PATH": os.path.join(workdir, "doc_registry.sqlite3"),
+        "ANONYMIZED_TELEMETRY": "False",
+    })
+
+
+async def run_suite(args, config: ServiceConfig, confluence_url: str, workdir: str) -> Dict:
+    results = {}
+    if args.startup_runs > 0:
+        results["startup"] = measure_startup(args.startup_runs)
+
+    # Imported only now: these modules read their configuration at import time.
+    from nymcard.core import doc_registry
+    from nymcard.core.doc_processor import process_confluence_page
+    from nymcard.core.vectorstore_manager import VectorStoreManager
+    from nymcard.core.advanced_rag_pipeline import CustomConversationalRAGPipeline
+    from nymcard.main import fetch_and_ingest_pages, OPENAI_API_KEY
+    from nymcard.utils.helpers import count_tokens
+    from nymcard.core.metrics import LLM_TOKENS
+    from nymcard.core.ingest_jobs import IngestProgress
+
+    # These files have fixed paths under nymcard/data; never touch the real ones.
+    doc_registry.REGISTRY_FILE = os.path.join(workdir, "ingested_docs.json")
+    doc_registry.CHECKPOINT_FILE = os.path.join(workdir, "sync_checkpoints.json")
+    doc_registry.CORPUS_VERSION_FILE = os.path.join(workdir, "corpus_version.json")
+    count_tokens("warm up")  # loads the tokenizer outside the timed runs
+
+    pages = make_pages(config.pages, config.sections, config.seed)
+    size = sum(len(page["body"]["storage"]["value"].encode("utf-8")) for page in pages)
+    start = time.perf_counter()
+    chunks = sum(len(process_confluence_page(page)["chunks"]) for page in pages)
+    elapsed = time.perf_counter() - start
+    results["process"] = {
+        "pages": len(pages), "chunks": chunks, "mb": size / 1e6, "seconds": elapsed,
+        "mb_per_s": size / 1e6 / elapsed, "peak_rss_mb": _peak_rss_mb(),
+    }
+    del pages
+
+    vs_manager = VectorStoreManager()
+    all_docs_text = []
+    ingest = {}
+    progress = IngestProgress()
+    start = time.perf_counter()
+    try:
+        updated, all_docs_text = await fetch_and_ingest_pages(
+            SPACE_KEY, vs_manager, workers=args.workers, batch_size=args.batch_size, progress=progress
+        )
+        ingest["embedded_pages"] = updated
+    except Exception as e:
+        ingest["error"] = f"{type(e).__name__}: {e}"
+    ingest["errors"] = list(progress.errors)
+    elapsed = time.perf_counter() - start
+    with urllib.request.urlopen(f"{confluence_url}/__stats") as response:
+        confluence_stats = json.load(response)
+    ingest.update({
+        "pages": len(all_docs_text),
+        # Failed body requests are retried or reported, so this should stay 0.
+        "empty_pages": sum(1 for text in all_docs_text if not text.strip()),
+        "seconds": elapsed,
+        "pages_per_s": len(all_docs_text) / elapsed,
+        "confluence_requests": confluence_stats["requests"],
+        "rate_limited": confluence_stats["rate_limited"],
+        "peak_rss_mb": _peak_rss_mb(),
+    })
+    results["ingest"] = ingest
+
+    queries = make_queries(args.queries)
+    latencies = []
+    empty = 0
+    for query in queries:
+        start = time.perf_counter()
+        found = await vs_manager.similarity_search_with_scores(query, k=args.k)
+        latencies.append(time.perf_counter() - start)
+        empty += not found
+    results["search"] = {**_latency_stats(latencies), "empty_results": empty, "peak_rss_mb": _peak_rss_mb()}
+
+    pipeline = CustomConversationalRAGPipeline(vs_manager, OPENAI_API_KEY)
+    latencies = []
+    tokens_in = LLM_TOKENS.value(direction="in")
+    for i, query in enumerate(make_queries(args.pipeline_queries, seed=13)):
+        start = time.perf_counter()
+        await pipeline.query(query, session_id=f"bench-{i}")
+        latencies.append(time.perf_counter() - start)
+    tokens_in = LLM_TOKENS.value(direction="in") - tokens_in
+    results["pipeline"] = {
+        **_latency_stats(latencies),
+        "prompt_tokens_per_query": tokens_in / max(1, len(latencies)),
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+    return results
+
+
+def invalid_run(results: Dict) -> List[str]:
+    """Why the results are no measurement at all (e.g. every embedding batch failed); empty if they are fine."""
+    ingest, search = results.get("ingest", {}), results.get("search", {})
+    problems = []
+    if "error" in ingest:
+        problems.append(f"ingestion failed: {ingest['error']}")
+    if not ingest.get("embedded_pages"):
+        problems.append("ingestion embedded no pages")
+    if search.get("empty_results"):
+        problems.append(f"{search['empty_results']} of {search['count']} searches returned nothing")
+    if problems:
+        problems.extend(f"ingestion error: {error}" for error in ingest.get("errors", []))
+    return problems
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _higher_is_better(metric: str) -> bool:
+    return metric.endswith("_per_s")
+
+
+def compare(baseline: Dict, current: Dict, threshold: float) -> List[str]:
+    """Lines comparing every numeric metric of both runs; regressions beyond `threshold` are flagged."""
+    lines = []
+    for stage, metrics in current["results"].items():
+        for metric, value in metrics.items():
+            old = baseline.get("results", {}).get(stage, {}).get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or not old:
+                continue
+            change = (value - old) / old
+            worse = -change if _higher_is_better(metric) else change
+            flag = "  REGRESSION" if metric.endswith(("_ms", "_per_s", "seconds")) and worse > threshold else ""
+            lines.append(f"{stage + '.' + metric:<28} {old:12.3f} {value:12.3f} {change:+8.1%}{flag}")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--sections", type=int, default=8)
+    parser.add_argument("--confluence-latency", type=float, default=0.02, help="seconds per request")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--body-in-search", type=float, default=0.9)
+    parser.add_argument("--embedding-latency", type=float, default=0.05, help="seconds per request")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="seconds per request")
+    parser.add_argument("--embedding-provider", default="openai", choices=["openai", "local", "hashing"])
+    parser.add_argument("--backend", default="chroma", choices=["chroma", "numpy"])
+    parser.add_argument("--workers", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--pipeline-queries", type=int, default=20)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--reranker", default="none", choices=["none", "lexical", "cross-encoder"])
+    parser.add_argument("--startup-runs", type=int, default=3, help="fresh interpreters per startup metric (0 skips)")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change flagged as a regression")
+    args = parser.parse_args()
+
+    config = ServiceConfig(
+        pages=args.pages, sections=args.sections, confluence_latency=args.confluence_latency,
+        rate_limit=args.rate_limit, body_in_search=args.body_in_search,
+        embedding_latency=args.embedding_latency, llm_latency=args.llm_latency
+    )
+    process, (confluence_url, openai_url) = start_services(config)
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            configure_environment(confluence_url, openai_url, workdir, args)
+            results = asyncio.run(run_suite(args, config, confluence_url, workdir))
+    finally:
+        stop_services(process)
+
+    report = {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": {**asdict(config), **{key: value for key, value in vars(args).items()
+                                        if key not in ("output", "baseline", "threshold")}},
+        "results": results,
+    }
+    print(json.dumps(results, indent=2))
+    problems = invalid_run(results)
+    if problems:
+        print("\nThis run measured nothing useful; no results written:", file=sys.stderr)
+        print("\n".join(f"- {problem}" for problem in problems), file=sys.stderr)
+        return 1
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {args.baseline} (commit {baseline.get('commit')}):")
+        print(f"{'metric':<28} {'baseline':>12} {'current':>12} {'change':>8}")
+        print("\n".join(compare(baseline, report, args.threshold)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
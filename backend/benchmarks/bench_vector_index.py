@@ -0,0 +1,127 @@
+"""
+Latency, memory and recall@k of the vector store backends.
+
+Builds Chroma, the exact NumpyVectorIndex and its IVF mode over the same
+synthetic clustered embeddings, then runs the same queries against each.
+Recall is measured against brute-force search. Each backend runs in its
+own process so resident memory is not shared between them. Run from the
+backend directory:
+
+    python -m benchmarks.bench_vector_index --vectors 20000 --dim 1536
+"""
+import os
+import time
+import argparse
+import tempfile
+import multiprocessing
+
+import numpy as np
+
+BATCH_SIZE = 4000
+
+
+def make_data(count: int, dim: int, queries: int, seed: int = 7):
+    """
+    Unit vectors around `count // 50` cluster centres, and queries near
+    random points. Noise is scaled by 1/sqrt(dim) so the cluster structure
+    (like topics in real embeddings) holds at any dimension.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, count // 50), dim)).astype(np.float32)
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+    noise = rng.normal(scale=0.5 / np.sqrt(dim), size=(count, dim)).astype(np.float32)
+    vectors = centers[rng.integers(len(centers), size=count)] + noise
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    noise = rng.normal(scale=0.2 / np.sqrt(dim), size=(queries, dim)).astype(np.float32)
+    query_vectors = vectors[rng.integers(count, size=queries)] + noise
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+    return vectors, query_vectors
+
+
+class _LookupEmbeddings:
+    """Embedding function returning the precomputed vector of 'doc-<i>'."""
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+
+    def embed_documents(self, texts):
+        return self.vectors[[int(text[4:]) for text in texts]].tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def _build(backend: str, directory: str, embeddings, ivf_lists: int, ivf_probe: int):
+    if backend == "chroma":
+        from langchain_chroma import Chroma
+        return Chroma(collection_name="bench", embedding_function=embeddings, persist_directory=directory)
+    from nymcard.core.numpy_vector_index import NumpyVectorIndex
+    return NumpyVectorIndex(directory, embeddings, ivf_lists=ivf_lists if backend == "numpy-ivf" else 0,
+                            ivf_probe=ivf_probe)
+
+
+def run_backend(backend: str, args) -> dict:
+    vectors, query_vectors = make_data(args.vectors, args.dim, args.queries)
+    truth = np.argsort(-(query_vectors @ vectors.T), axis=1)[:, :args.k]
+    baseline_rss = _rss_mb()
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = _build(backend, directory, _LookupEmbeddings(vectors), args.ivf_lists, args.ivf_probe)
+        start = time.perf_counter()
+        for first in range(0, len(vectors), BATCH_SIZE):
+            ids = [str(i) for i in range(first, min(first + BATCH_SIZE, len(vectors)))]
+            store.add_texts([f"doc-{i}" for i in ids], [{"row": int(i)} for i in ids], ids=ids)
+        build_seconds = time.perf_counter() - start
+
+        latencies = []
+        hits = 0
+        for query, expected in zip(query_vectors, truth):
+            start = time.perf_counter()
+            results = store.similarity_search_by_vector_with_relevance_scores(query.tolist(), k=args.k)
+            latencies.append(time.perf_counter() - start)
+            hits += len({doc.metadata["row"] for doc, _ in results} & set(expected.tolist()))
+        rss = _rss_mb() - baseline_rss
+
+    latencies = np.array(latencies) * 1000
+    return {
+        "backend": backend,
+        "build_s": build_seconds,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "recall": hits / (len(query_vectors) * args.k),
+        "rss_mb": rss,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--ivf-lists", type=int, default=64)
+    parser.add_argument("--ivf-probe", type=int, default=8)
+    parser.add_argument("--backends", default="chroma,numpy,numpy-ivf")
+    args = parser.parse_args()
+
+    print(f"{args.vectors} vectors x {args.dim} dims, {args.queries} queries, recall@{args.k}")
+    print(f"{'backend':<10} {'build s':>8} {'p50 ms':>8} {'p95 ms':>8} {'recall':>7} {'rss MB':>8}")
+    context = multiprocessing.get_context("spawn")
+    for backend in args.backends.split(","):
+        with context.Pool(1) as pool:
+            row = pool.apply(run_backend, (backend, args))
+        print(f"{row['backend']:<10} {row['build_s']:8.2f} {row['p50_ms']:8.2f} {row['p95_ms']:8.2f} "
+              f"{row['recall']:7.3f} {row['rss_mb']:8.1f}")
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+    main()
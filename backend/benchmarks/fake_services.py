@@ -0,0 +1,213 @@
+"""
+Local stand-ins for Confluence and OpenAI, for benchmarks.
+
+FakeConfluence serves synthetic pages (see synthetic_pages) through the
+two REST endpoints ConfluenceLoader uses: CQL search and get-page-by-ID.
+FakeOpenAI answers embeddings and chat completions requests. Both add a
+fixed latency to every request, and FakeConfluence answers a given
+fraction of requests with 429 Too Many Requests.
+
+start_services() runs both in a separate process, so serving requests
+does not compete with the code being measured for the GIL.
+"""
+import json
+import time
+import base64
+import random
+import threading
+import multiprocessing
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from benchmarks.synthetic_pages import make_pages
+
+# Dimension of text-embedding-ada-002, the model VectorStoreManager defaults to.
+EMBEDDING_DIMENSION = 1536
+
+
+@dataclass
+class ServiceConfig:
+    pages: int = 200
+    sections: int = 8
+    # Seconds added to every Confluence request.
+    confluence_latency: float = 0.02
+    # Fraction of Confluence requests answered with 429.
+    rate_limit: float = 0.0
+    retry_after: int = 1
+    # Fraction of pages whose body comes back with the CQL search; the rest
+    # need a get-page-by-ID request, as for large pages on real instances.
+    body_in_search: float = 0.9
+    # Seconds added to every embeddings / chat completions request.
+    embedding_latency: float = 0.05
+    llm_latency: float = 0.3
+    seed: int = 7
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload, headers: Dict[str, str] = None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> Dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+
+class FakeConfluence(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, config: ServiceConfig, address=("127.0.0.1", 0)):
+        super().__init__(address, _ConfluenceHandler)
+        self.config = config
+        self.pages = make_pages(config.pages, config.sections, config.seed)
+        self.by_id = {page["id"]: page for page in self.pages}
+        rng = random.Random(config.seed)
+        self.body_in_search = {page["id"] for page in self.pages if rng.random() < config.body_in_search}
+        self._rng = random.Random(config.seed + 1)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "rate_limited": 0}
+
+    def admit(self) -> bool:
+        """Count a request; False if it should be rate limited."""
+        with self._lock:
+            self.stats["requests"] += 1
+            limited = self._rng.random() < self.config.rate_limit
+            self.stats["rate_limited"] += limited
+        return not limited
+
+
+class _ConfluenceHandler(_Handler):
+    server: FakeConfluence
+
+    def do_GET(self):
+        config = self.server.config
+        time.sleep(config.confluence_latency)
+        url = urlsplit(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+        if url.path.endswith("/__stats"):
+            return self._send_json(200, self.server.stats)
+        if not self.server.admit():
+            return self._send_json(429, {"message": "Rate limit exceeded"},
+                                   {"Retry-After": str(config.retry_after)})
+        if url.path.endswith("/rest/api/search"):
+            return self._send_json(200, self._search(params))
+        if "/rest/api/content/" in url.path:
+            page = self.server.by_id.get(url.path.rstrip("/").rsplit("/", 1)[-1])
+            if page is None:
+                return self._send_json(404, {"message": "No content found"})
+            return self._send_json(200, {"id": page["id"], "title": page["title"], "body": page["body"]})
+        self._send_json(404, {"message": f"Unknown endpoint {url.path}"})
+
+    def _search(self, params: Dict[str, str]) -> Dict:
+        start = int(params.get("start", 0))
+        limit = int(params.get("limit", 25))
+        expand_body = "body.storage" in params.get("expand", "")
+        results = []
+        for page in self.server.pages[start:start + limit]:
+            content = {"id": page["id"], "type": "page", "title": page["title"], "version": {"number": 1}}
+            if expand_body and page["id"] in self.server.body_in_search:
+                content["body"] = page["body"]
+            results.append({"content": content, "title": page["title"]})
+        return {"results": results, "start": start, "limit": limit, "size": len(results)}
+
+
+class FakeOpenAI(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, config: ServiceConfig, address=("127.0.0.1", 0)):
+        super().__init__(address, _OpenAIHandler)
+        self.config = config
+        # Imported here: the parent process should not load nymcard before
+        # its environment points at these services.
+        from nymcard.core.embedding_providers import HashingEmbeddings
+        self.embeddings = HashingEmbeddings(EMBEDDING_DIMENSION)
+
+
+class _OpenAIHandler(_Handler):
+    server: FakeOpenAI
+
+    def do_POST(self):
+        request = self._read_json()
+        path = urlsplit(self.path).path
+        if path.endswith("/embeddings"):
+            time.sleep(self.server.config.embedding_latency)
+            return self._send_json(200, self._embeddings(request))
+        if path.endswith("/chat/completions"):
+            time.sleep(self.server.config.llm_latency)
+            return self._send_json(200, self._chat(request))
+        self._send_json(404, {"error": {"message": f"Unknown endpoint {path}"}})
+
+    def _embeddings(self, request: Dict) -> Dict:
+        inputs = request["input"]
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        # langchain sends token IDs when it checks context length.
+        texts = [text if isinstance(text, str) else " ".join(map(str, text)) for text in inputs]
+        vectors = self.server.embeddings.embed_documents(texts)
+        data = []
+        for index, vector in enumerate(vectors):
+            if request.get("encoding_format") == "base64":
+                vector = base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode("ascii")
+            data.append({"object": "embedding", "index": index, "embedding": vector})
+        tokens = sum(len(text.split()) for text in texts)
+        return {"object": "list", "data": data, "model": request.get("model"),
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
+
+    def _chat(self, request: Dict) -> Dict:
+        prompt_tokens = sum(len(str(message.get("content", "")).split()) for message in request["messages"])
+        return {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "This is a benchmark answer."},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": 5, "total_tokens": prompt_tokens + 5},
+        }
+
+
+def _serve(config: ServiceConfig, ready):
+    servers = [FakeConfluence(config), FakeOpenAI(config)]
+    for server in servers:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    ready.send([server.server_address[1] for server in servers])
+    ready.recv()  # blocks until the parent asks us to stop
+    for server in servers:
+        server.shutdown()
+
+
+def start_services(config: ServiceConfig) -> Tuple[multiprocessing.Process, List[str]]:
+    """
+    Start both services in a child process. Returns the process and the
+    base URLs of (Confluence, OpenAI); stop with stop_services().
+    """
+    parent, child = multiprocessing.get_context("spawn").Pipe()
+    process = multiprocessing.get_context("spawn").Process(target=_serve, args=(config, child), daemon=True)
+    process.start()
+    confluence_port, openai_port = parent.recv()
+    process.pipe = parent
+    return process, [f"http://127.0.0.1:{confluence_port}", f"http://127.0.0.1:{openai_port}/v1"]
+
+
+def stop_services(process: multiprocessing.Process):
+    process.pipe.send("stop")
+    process.join(timeout=5)
@@ -0,0 +1,84 @@
+"""
+Synthetic Confluence pages in storage format, for benchmarks. Pages are
+generated from a fixed seed so runs are comparable.
+"""
+import random
+
+_WORDS = (
+    "card issuer program bin pan token wallet authorization settlement clearing ledger account "
+    "balance limit fee currency merchant acquirer network scheme webhook endpoint request response "
+    "status error retry timeout customer kyc onboarding virtual physical activate block reissue"
+).split()
+
+
+def _sentence(rng: random.Random, min_words=6, max_words=18) -> str:
+    words = rng.choices(_WORDS, k=rng.randint(min_words, max_words))
+    if rng.random() < 0.3:
+        words.insert(rng.randrange(len(words)), f"ERR_{rng.randint(1000, 9999)}")
+    if rng.random() < 0.2:
+        words.insert(rng.randrange(len(words)), "&amp; &lt;v2&gt; &nbsp;&#8212;")
+    return " ".join(words).capitalize() + "."
+
+
+def _paragraph(rng: random.Random) -> str:
+    sentences = " ".join(_sentence(rng) for _ in range(rng.randint(2, 6)))
+    return f"<p>{sentences} See <strong>{rng.choice(_WORDS)}</strong> and " \
+           f"<ac:link><ri:page ri:content-title=\"{rng.choice(_WORDS).title()} Guide\" /></ac:link>.</p>"
+
+
+def _table(rng: random.Random) -> str:
+    header = "".join(f"<th><p>{rng.choice(_WORDS).title()}</p></th>" for _ in range(4))
+    rows = "".join(
+        "<tr>" + "".join(f"<td><p>{_sentence(rng, 1, 4)}</p></td>" for _ in range(4)) + "</tr>"
+        for _ in range(rng.randint(3, 10))
+    )
+    return f"<table><tbody><tr>{header}</tr>{rows}</tbody></table>"
+
+
+def _list(rng: random.Random) -> str:
+    items = "".join(f"<li><p>{_sentence(rng, 3, 10)}</p></li>" for _ in range(rng.randint(3, 8)))
+    return f"<ul>{items}</ul>"
+
+
+def _code_macro(rng: random.Random) -> str:
+    lines = "\n".join(
+        f"    if (status == {rng.randint(100, 599)} && retries < 3) {{ retry(\"{rng.choice(_WORDS)}\"); }}"
+        for _ in range(rng.randint(4, 15))
+    )
+    return (
+        '<ac:structured-macro ac:name="code" ac:schema-version="1">'
+        '<ac:parameter ac:name="language">java</ac:parameter>'
+        f"<ac:plain-text-body><![CDATA[{lines}]]></ac:plain-text-body></ac:structured-macro>"
+    )
+
+
+def _info_macro(rng: random.Random) -> str:
+    return (
+        '<ac:structured-macro ac:name="info"><ac:parameter ac:name="title">Note</ac:parameter>'
+        f"<ac:rich-text-body>{_paragraph(rng)}</ac:rich-text-body></ac:structured-macro>"
+    )
+
+
+_BLOCKS = [_paragraph, _paragraph, _paragraph, _table, _list, _code_macro, _info_macro]
+
+
+def make_page_body(rng: random.Random, sections: int) -> str:
+    parts = []
+    for section in range(sections):
+        parts.append(f"<h2>Section {section}: {rng.choice(_WORDS).title()}</h2>")
+        for _ in range(rng.randint(2, 6)):
+            parts.append(rng.choice(_BLOCKS)(rng))
+    return "".join(parts)
+
+
+def make_pages(count: int, sections: int = 8, seed: int = 7):
+    """`count` page dicts shaped like ConfluenceLoader results."""
+    rng = random.Random(seed)
+    return [
+        {
+            "id": str(100000 + i),
+            "title": f"Synthetic page {i}",
+            "body": {"storage": {"value": make_page_body(rng, sections)}},
+        }
+        for i in range(count)
+    ]
@@ -0,0 +1,282 @@
+import os
+import json
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+# Share the vector store and pipeline (memory, caches) with the Flask routes.
+from .routes import (
+    get_vs_manager, get_pipeline, warm_up, start_ingest_schedules, resolve_session_id, list_documents,
+    ingest_scheduler, SESSION_HEADER
+)
+from ..core.metrics import REGISTRY, render_metrics, PROMETHEUS_CONTENT_TYPE
+
+logger = logging.getLogger(__name__)
+
+API_MAX_CONCURRENCY = int(os.getenv("API_MAX_CONCURRENCY", "16"))
+API_MAX_QUEUE = int(os.getenv("API_MAX_QUEUE", "64"))
+
+# Cheap endpoints that must answer even when the server is saturated.
+UNLIMITED_PATHS = frozenset({"/health", "/metrics"})
+
+REJECTED_REQUESTS = REGISTRY.counter("nymcard_api_rejected_total", "Requests answered 429 because the server was busy.")
+
+
+class ConcurrencyLimiter:
+    """
+    Caps the number of requests handled at once. Up to `max_queue` further
+    requests wait for a free slot; beyond that acquire() fails immediately so
+    the caller can shed load instead of queueing without bound.
+    """
+
+    def __init__(self, max_concurrency: int = API_MAX_CONCURRENCY, max_queue: int = API_MAX_QUEUE):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def acquire(self) -> bool:
+        """Wait for a slot; returns False right away if the queue is full."""
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            REJECTED_REQUESTS.inc()
+            return False
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        return True
+
+    def release(self):
+        self.active -= 1
+        self._semaphore.release()
+
+
+class ConcurrencyLimitMiddleware:
+    """
+    ASGI middleware that runs every HTTP request (except UNLIMITED_PATHS)
+    under a ConcurrencyLimiter and answers 429 when it is saturated. The slot
+    is held until the response has been fully sent.
+    """
+
+    def __init__(self, app, limiter: ConcurrencyLimiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in UNLIMITED_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        if not await self.limiter.acquire():
+            logger.warning(f"[ASGI] Saturated, rejecting {scope['method']} {scope['path']}.")
+            response = JSONResponse(
+                {"error": "Server is busy, please retry shortly."}, status_code=429, headers={"Retry-After": "1"}
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.limiter.release()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # uvicorn accepts connections only once startup is over, so the first
+    # requests find the index and models loaded.
+    await warm_up()
+    start_ingest_schedules()
+    yield
+
+
+app = FastAPI(title="Nymcard Confluence Knowledge Assistant", lifespan=lifespan)
+limiter = ConcurrencyLimiter()
+app.add_middleware(ConcurrencyLimitMiddleware, limiter=limiter)
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+
+
+async def _json_body(request: Request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+@app.post("/query")
+async def query(request: Request):
+    """
+    Endpoint to handle user queries.
+    Expects JSON payload: { "question": "Your question here", "session_id": "optional" }
+    Returns the answer and the session ID to send with follow-up questions.
+    """
+    data = await _json_body(request)
+    if not isinstance(data, dict) or 'question' not in data:
+        return JSONResponse({"error": "Invalid request. 'question' field is required."}, status_code=400)
+
+    question = data['question']
+    session_id = resolve_session_id(data, request.headers)
+    logger.info(f"Received query: {question}")
+
+    try:
+        answer = await get_pipeline().query(question, session_id=session_id)
+        return JSONResponse({"answer": answer, "session_id": session_id}, status_code=200)
+    except Exception as e:
+        logger.error(f"Error processing query: {e}", exc_info=True)
+        return JSONResponse({"error": "An error occurred while processing the query."}, status_code=500)
+
+
+@app.post("/query/stream")
+async def query_stream(request: Request):
+    """
+    Streaming variant of /query as Server-Sent Events.
+    Expects JSON payload: { "question": "Your question here", "session_id": "optional" }
+    Emits `data: {"token": "..."}` events as the answer is generated, then
+    `event: done` with the full answer and session ID, or `event: error` on failure.
+    """
+    data = await _json_body(request)
+    if not isinstance(data, dict) or 'question' not in data:
+        return JSONResponse({"error": "Invalid request. 'question' field is required."}, status_code=400)
+
+    question = data['question']
+    session_id = resolve_session_id(data, request.headers)
+    logger.info(f"Received streaming query: {question}")
+
+    async def events():
+        # Starlette cancels this generator when the client disconnects;
+        # closing the pipeline stream then aborts the LLM request.
+        stream = get_pipeline().query_stream(question, session_id=session_id)
+        parts = []
+        try:
+            async for token in stream:
+                parts.append(token)
+                yield _sse_event({"token": token})
+            yield _sse_event({"answer": "".join(parts).strip(), "session_id": session_id}, event="done")
+        except Exception as e:
+            logger.error(f"Error streaming query: {e}", exc_info=True)
+            yield _sse_event({"error": "An error occurred while processing the query."}, event="error")
+        finally:
+            await stream.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", SESSION_HEADER: session_id}
+    )
+
+
+def _sse_event(payload: dict, event: str = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(payload)}\n\n"
+
+
+@app.post("/ingest")
+async def ingest(request: Request):
+    """
+    Endpoint to trigger ingestion of Confluence pages in the background.
+    Expects JSON payload: { "space_key": "TD", "delta": true } (both optional)
+    Returns 202 with the job; poll GET /ingest/jobs/{job_id} for its progress.
+    """
+    data = await _json_body(request)
+    data = data if isinstance(data, dict) else {}
+    space_key = data.get('space_key', 'TD')
+    delta = bool(data.get('delta', False))
+    logger.info(f"Requested ingestion for space_key: {space_key} (delta={delta})")
+
+    job = ingest_scheduler.submit(str(space_key), delta=delta)
+    return JSONResponse({"message": "Ingestion started.", "job": job.to_dict()}, status_code=202)
+
+
+@app.get("/ingest/jobs")
+async def ingest_jobs():
+    """
+    Endpoint to list recent ingestion jobs, most recent first.
+    """
+    return {"jobs": [job.to_dict() for job in ingest_scheduler.list_jobs()]}
+
+
+@app.get("/ingest/jobs/{job_id}")
+async def ingest_job(job_id: str):
+    """
+    Endpoint to report the status and progress of an ingestion job.
+    """
+    job = ingest_scheduler.get(job_id)
+    if job is None:
+        return JSONResponse({"error": f"Unknown ingestion job {job_id}."}, status_code=404)
+    return job.to_dict()
+
+
+@app.get("/health")
+async def health_check():
+    """
+    Simple health check endpoint to verify the API is running.
+    """
+    return {"status": "OK"}
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """
+    Hit-rate counters of the query-embedding and answer caches.
+    """
+    return get_pipeline().cache_stats()
+
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Stage latencies, token, cache and error counters in the Prometheus text format.
+    """
+    return Response(render_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@app.get("/documents")
+async def get_documents(offset: str = None, limit: str = None):
+    """
+    Endpoint to list ingested documents, `limit` (default 100) at a time from `offset`.
+    """
+    return await list_documents(offset, limit)
+
+
+@app.delete("/documents/{page_id}")
+async def delete_document(page_id: str):
+    """
+    Endpoint to delete a document from the vector store based on page_id.
+    """
+    from ..main import delete_pages  # Import here to avoid circular imports
+
+    try:
+        deleted_chunks = await delete_pages([page_id], get_vs_manager())
+        return {"message": f"Document {page_id} deleted successfully.", "deleted_chunks": deleted_chunks}
+    except Exception as e:
+        logger.error(f"Error deleting document {page_id}: {e}", exc_info=True)
+        return JSONResponse({"error": "An error occurred while deleting the document."}, status_code=500)
+
+
+@app.delete("/documents")
+async def delete_documents(request: Request):
+    """
+    Endpoint to delete many documents at once.
+    Expects JSON payload: { "page_ids": ["123", "456"] }
+    """
+    data = await _json_body(request)
+    page_ids = data.get('page_ids') if isinstance(data, dict) else None
+    if not isinstance(page_ids, list) or not page_ids:
+        return JSONResponse({"error": "Invalid request. 'page_ids' must be a non-empty list."}, status_code=400)
+
+    from ..main import delete_pages  # Import here to avoid circular imports
+
+    try:
+        deleted_chunks = await delete_pages([str(p) for p in page_ids], get_vs_manager())
+        return {"message": f"{len(page_ids)} documents deleted successfully.", "deleted_chunks": deleted_chunks}
+    except Exception as e:
+        logger.error(f"Error deleting documents {page_ids}: {e}", exc_info=True)
+        return JSONResponse({"error": "An error occurred while deleting the documents."}, status_code=500)
@@ -1,12 +1,18 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 import asyncio
 from flask_cors import CORS  
 import logging
 import os
+import threading
+import time
+import uuid
 
 from ..core.vectorstore_manager import VectorStoreManager
 from ..core.advanced_rag_pipeline import CustomConversationalRAGPipeline
-from ..utils.helpers import run_async
+from ..core.metrics import render_metrics, PROMETHEUS_CONTENT_TYPE
+from ..core.doc_registry import open_registry
+from ..core.ingest_jobs import IngestScheduler, IngestProgress, parse_schedule, INGEST_SCHEDULE
+from ..utils.helpers import run_async, count_tokens
 
 app = Flask(__name__)
 CORS(app) 
@@ -20,29 +26,99 @@ load_dotenv()
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-vs_manager = VectorStoreManager()
-pipeline = CustomConversationalRAGPipeline(
-    vectorstore_manager=vs_manager,
-    openai_api_key=OPENAI_API_KEY,
-    all_docs_text=[] 
-)
+# Clients keep their conversation by sending back the session ID they were given.
+SESSION_HEADER = "X-Session-ID"
+
+# Registry entries returned by GET /documents per request.
+DOCUMENTS_PAGE_SIZE = 100
+DOCUMENTS_MAX_PAGE_SIZE = 1000
+
+# Built on first use (or by warm_up()), not at import: the vector store opens
+# its files and clients, which CLI modes importing this package never need.
+_vs_manager = None
+_pipeline = None
+_services_lock = threading.Lock()
+_schedules_started = False
+
+def get_vs_manager() -> VectorStoreManager:
+    """The VectorStoreManager shared by all endpoints."""
+    global _vs_manager
+    with _services_lock:
+        if _vs_manager is None:
+            _vs_manager = VectorStoreManager()
+        return _vs_manager
+
+def get_pipeline() -> CustomConversationalRAGPipeline:
+    """The RAG pipeline (memory, caches) shared by all endpoints."""
+    global _pipeline
+    vs_manager = get_vs_manager()
+    with _services_lock:
+        if _pipeline is None:
+            _pipeline = CustomConversationalRAGPipeline(
+                vectorstore_manager=vs_manager,
+                openai_api_key=OPENAI_API_KEY
+            )
+        return _pipeline
+
+async def warm_up():
+    """
+    Build the shared services and load the vector index, embedding model,
+    reranker and tokenizer, so that the first request does not pay for
+    them. Called by both servers before they accept requests.
+    """
+    started = time.perf_counter()
+    pipeline = await asyncio.to_thread(get_pipeline)
+    await get_vs_manager().warm_up()
+    if pipeline.hybrid_retriever.reranker is not None:
+        await asyncio.to_thread(pipeline.hybrid_retriever.reranker.score_batch, "warm up", ["warm up"])
+    await asyncio.to_thread(count_tokens, "warm up")
+    logger.info(f"[API] Warm-up done in {time.perf_counter() - started:.2f}s.")
+
+async def run_ingest_job(space_key: str, delta: bool, progress: IngestProgress) -> int:
+    """Ingestion job body run by ingest_scheduler; returns the number of pages embedded."""
+    from ..main import fetch_and_ingest_pages  # Import here to avoid circular imports
+
+    updated_count, _ = await fetch_and_ingest_pages(space_key, get_vs_manager(), delta=delta, progress=progress)
+    return updated_count
+
+ingest_scheduler = IngestScheduler(run_ingest_job)
+
+def start_ingest_schedules():
+    """Start the periodic refreshes of INGEST_SCHEDULE, once per process."""
+    global _schedules_started
+    with _services_lock:
+        if _schedules_started:
+            return
+        _schedules_started = True
+    for space_key, interval in parse_schedule(INGEST_SCHEDULE).items():
+        ingest_scheduler.schedule(space_key, interval)
+
+def resolve_session_id(data, headers) -> str:
+    """
+    Session of a request: `session_id` in the JSON payload or the
+    X-Session-ID header. Requests without one start a new session.
+    """
+    session_id = (data or {}).get('session_id') or headers.get(SESSION_HEADER)
+    return str(session_id) if session_id else uuid.uuid4().hex
 
 @app.route('/query', methods=['POST'])
 def query():
     """
     Endpoint to handle user queries.
-    Expects JSON payload: { "question": "Your question here" }
+    Expects JSON payload: { "question": "Your question here", "session_id": "optional" }
+    Returns the answer and the session ID to send with follow-up questions.
     """
     data = request.get_json()
     if not data or 'question' not in data:
         return jsonify({"error": "Invalid request. 'question' field is required."}), 400
     
     question = data['question']
+    session_id = resolve_session_id(data, request.headers)
     logger.info(f"Received query: {question}")
     
     try:
-        answer = run_async(pipeline.query(question))
-        return jsonify({"answer": answer}), 200
+        answer = run_async(get_pipeline().query(question, session_id=session_id))
+        return jsonify({"answer": answer, "session_id": session_id}), 200
     except Exception as e:
         logger.error(f"Error processing query: {e}", exc_info=True)
         return jsonify({"error": "An error occurred while processing the query."}), 500
@@ -50,24 +126,34 @@ def query():
 @app.route('/ingest', methods=['POST'])
 def ingest():
     """
-    Endpoint to trigger ingestion of Confluence pages.
-    Expects JSON payload: { "space_key": "TD" } (optional)
+    Endpoint to trigger ingestion of Confluence pages in the background.
+    Expects JSON payload: { "space_key": "TD", "delta": true } (both optional)
+    Returns 202 with the job; poll GET /ingest/jobs/<job_id> for its progress.
     """
     data = request.get_json()
     space_key = data.get('space_key', 'TD') if data else 'TD'
-    logger.info(f"Starting ingestion for space_key: {space_key}")
-    
-    from main import fetch_and_ingest_pages  # Import here to avoid circular imports
-    
-    try:
-        updated_count, all_docs_text = run_async(fetch_and_ingest_pages(space_key, vs_manager))
-        return jsonify({
-            "message": "Ingestion complete.",
-            "updated_count": updated_count
-        }), 200
-    except Exception as e:
-        logger.error(f"Error during ingestion: {e}", exc_info=True)
-        return jsonify({"error": "An error occurred during ingestion."}), 500
+    delta = bool(data.get('delta', False)) if data else False
+    logger.info(f"Requested ingestion for space_key: {space_key} (delta={delta})")
+
+    job = ingest_scheduler.submit(str(space_key), delta=delta)
+    return jsonify({"message": "Ingestion started.", "job": job.to_dict()}), 202
+
+@app.route('/ingest/jobs', methods=['GET'])
+def ingest_jobs():
+    """
+    Endpoint to list recent ingestion jobs, most recent first.
+    """
+    return jsonify({"jobs": [job.to_dict() for job in ingest_scheduler.list_jobs()]}), 200
+
+@app.route('/ingest/jobs/<job_id>', methods=['GET'])
+def ingest_job(job_id):
+    """
+    Endpoint to report the status and progress of an ingestion job.
+    """
+    job = ingest_scheduler.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown ingestion job {job_id}."}), 404
+    return jsonify(job.to_dict()), 200
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -76,25 +162,85 @@ def health_check():
     """
     return jsonify({"status": "OK"}), 200
 
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """
+    Hit-rate counters of the query-embedding and answer caches.
+    """
+    return jsonify(get_pipeline().cache_stats()), 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Stage latencies, token, cache and error counters in the Prometheus text format.
+    """
+    return Response(render_metrics(), status=200, content_type=PROMETHEUS_CONTENT_TYPE)
+
+async def list_documents(offset, limit) -> dict:
+    """
+    One page of the ingestion registry, ordered by page ID, for GET /documents
+    on both servers. `offset` and `limit` come from the query string; bad
+    values fall back to the defaults.
+    """
+    try:
+        offset = max(0, int(offset or 0))
+        limit = min(max(1, int(limit or DOCUMENTS_PAGE_SIZE)), DOCUMENTS_MAX_PAGE_SIZE)
+    except ValueError:
+        offset, limit = 0, DOCUMENTS_PAGE_SIZE
+    registry = open_registry()
+    # Registry reads are blocking SQLite calls; keep them off the event loop.
+    documents = await asyncio.to_thread(registry.list_pages, offset, limit)
+    total = await asyncio.to_thread(len, registry)
+    return {
+        "documents": dict(documents),
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+    }
+
 @app.route('/documents', methods=['GET'])
 def get_documents():
     """
-    Endpoint to retrieve all ingested documents.
+    Endpoint to list ingested documents, `limit` (default 100) at a time from `offset`.
     """
-    from core.doc_registry import load_registry
-    registry = load_registry()
-    return jsonify({"documents": registry}), 200
+    return jsonify(run_async(list_documents(request.args.get('offset'), request.args.get('limit')))), 200
 
 @app.route('/documents/<page_id>', methods=['DELETE'])
 def delete_document(page_id):
     """
     Endpoint to delete a document from the vector store based on page_id.
     """
+    from ..main import delete_pages  # Import here to avoid circular imports
+
     try:
-        from core.vectorstore_manager import VectorStoreManager
-        vs_manager = VectorStoreManager()
-        vs_manager.delete_document(page_id)
-        return jsonify({"message": f"Document {page_id} deleted successfully."}), 200
+        deleted_chunks = run_async(delete_pages([page_id], get_vs_manager()))
+        return jsonify({
+            "message": f"Document {page_id} deleted successfully.",
+            "deleted_chunks": deleted_chunks
+        }), 200
     except Exception as e:
         logger.error(f"Error deleting document {page_id}: {e}", exc_info=True)
         return jsonify({"error": "An error occurred while deleting the document."}), 500
+
+@app.route('/documents', methods=['DELETE'])
+def delete_documents():
+    """
+    Endpoint to delete many documents at once.
+    Expects JSON payload: { "page_ids": ["123", "456"] }
+    """
+    data = request.get_json()
+    page_ids = data.get('page_ids') if data else None
+    if not isinstance(page_ids, list) or not page_ids:
+        return jsonify({"error": "Invalid request. 'page_ids' must be a non-empty list."}), 400
+
+    from ..main import delete_pages  # Import here to avoid circular imports
+
+    try:
+        deleted_chunks = run_async(delete_pages([str(p) for p in page_ids], get_vs_manager()))
+        return jsonify({
+            "message": f"{len(page_ids)} documents deleted successfully.",
+            "deleted_chunks": deleted_chunks
+        }), 200
+    except Exception as e:
+        logger.error(f"Error deleting documents {page_ids}: {e}", exc_info=True)
+        return jsonify({"error": "An error occurred while deleting the documents."}), 500
@@ -1,45 +1,137 @@
+import os
 import logging
-import asyncio
-from langchain_openai import ChatOpenAI  # Synchronous ChatOpenAI
+from typing import AsyncIterator, List, Optional, Tuple
+from langchain_openai import ChatOpenAI
 from langchain.schema import SystemMessage, HumanMessage
-from langchain.memory import ConversationBufferMemory
 
 from .hybrid_retriever import HybridRetriever
-from ..utils.helpers import run_async
+from .reranker import create_reranker
+from .query_cache import TTLCache, normalize_query
+from .session_memory import SessionMemoryStore, DEFAULT_SESSION_ID, SESSION_SUMMARY_MAX_TOKENS
+from .doc_registry import compute_content_hash, load_corpus_version
+from .context_packer import pack_context, context_budget
+from .metrics import span, count_cache_lookup, LLM_TOKENS
+from ..utils.helpers import count_tokens
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=logging.INFO)
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1024"))
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", "3600"))
+# Fold turns that fall out of a session's history window into a summary.
+SESSION_SUMMARIZE = os.getenv("SESSION_SUMMARIZE", "false").lower() == "true"
 
 
 class CustomConversationalRAGPipeline:
-    def __init__(self, vectorstore_manager, openai_api_key: str, all_docs_text=None):
+    def __init__(self, vectorstore_manager, openai_api_key: str):
         self.vectorstore_manager = vectorstore_manager
 
-        self.memory = ConversationBufferMemory(
-            memory_key="chat_history",
-            return_messages=True
-        )
-
-        # Synchronous ChatOpenAI
         self.llm = ChatOpenAI(
             openai_api_key=openai_api_key,
             temperature=0
         )
 
+        # One token-budgeted history per session instead of a single shared buffer.
+        self.memory = SessionMemoryStore(summarizer=self._summarize_history if SESSION_SUMMARIZE else None)
+
         self.hybrid_retriever = HybridRetriever(
             vectorstore_manager=self.vectorstore_manager,
-            all_docs_text=all_docs_text or []
+            lexical_index=getattr(self.vectorstore_manager, "lexical_index", None),
+            entity_index=getattr(self.vectorstore_manager, "entity_index", None),
+            reranker=create_reranker()
         )
 
-    async def query(self, user_query: str) -> str:
-        logger.info(f"[CustomConversationalRAGPipeline] New user query: {user_query}")
+        # Answers are reused only for the same question over the same
+        # retrieved chunks, chat history and corpus version.
+        self.answer_cache = TTLCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL)
+
+    async def query(self, user_query: str, session_id: str = DEFAULT_SESSION_ID) -> str:
+        with span("pipeline.query"):
+            return await self._query(user_query, session_id)
+
+    async def _query(self, user_query: str, session_id: str) -> str:
+        logger.info(f"[CustomConversationalRAGPipeline] New user query (session={session_id}): {user_query}")
+
+        messages, cache_key, cached_answer = await self._prepare_query(user_query, session_id)
+        if cached_answer is not None:
+            logger.info("[CustomConversationalRAGPipeline] Answer cache hit, skipping LLM call.")
+            with span("pipeline.save_turn"):
+                await self.memory.save_turn(session_id, user_query, cached_answer)
+            return cached_answer
+
+        # 4) Call the LLM through its async client, like query_stream() does
+        try:
+            with span("pipeline.llm"):
+                llm_response = await self.llm.ainvoke(messages)
+
+            generated_content = llm_response.content.strip()
+            self._count_tokens(messages, generated_content, getattr(llm_response, "usage_metadata", None))
+
+            logger.debug("[CustomConversationalRAGPipeline] LLM Response: %s", generated_content)
+        except Exception as e:
+            logger.error(f"[CustomConversationalRAGPipeline] LLM error: {e}", exc_info=True)
+            return "Sorry, an error occurred while generating the response."
+
+        self.answer_cache.put(cache_key, generated_content)
+
+        # 5) Save context
+        with span("pipeline.save_turn"):
+            await self.memory.save_turn(session_id, user_query, generated_content)
+
+        return generated_content
 
+    async def query_stream(self, user_query: str, session_id: str = DEFAULT_SESSION_ID) -> AsyncIterator[str]:
+        """
+        Streaming variant of query(): yields the answer in pieces as the LLM
+        produces them. The exchange is saved to memory (and the answer cache)
+        only once the stream has completed; if the consumer stops early, e.g.
+        because the client disconnected, closing the generator stops generation
+        and nothing is saved.
+        Raises on LLM errors so the caller can report them in-stream.
+        """
+        logger.info(f"[CustomConversationalRAGPipeline] New streaming query (session={session_id}): {user_query}")
+
+        messages, cache_key, cached_answer = await self._prepare_query(user_query, session_id)
+        if cached_answer is not None:
+            logger.info("[CustomConversationalRAGPipeline] Answer cache hit, skipping LLM call.")
+            yield cached_answer
+            await self.memory.save_turn(session_id, user_query, cached_answer)
+            return
+
+        parts = []
+        usage = None
+        with span("pipeline.llm_stream"):
+            async for chunk in self.llm.astream(messages):
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                if chunk.content:
+                    parts.append(chunk.content)
+                    yield chunk.content
+
+        generated_content = "".join(parts).strip()
+        self._count_tokens(messages, generated_content, usage)
+        logger.debug("[CustomConversationalRAGPipeline] LLM Response: %s", generated_content)
+        self.answer_cache.put(cache_key, generated_content)
+        await self.memory.save_turn(session_id, user_query, generated_content)
+
+    async def _prepare_query(self, user_query: str, session_id: str) -> Tuple[Optional[List], tuple, Optional[str]]:
+        """
+        Retrieval and prompt assembly shared by query() and query_stream().
+        Returns (messages, answer_cache_key, cached_answer); messages is None
+        when the answer cache already holds an answer.
+        """
         # 1) Retrieving Docs here
-        retrieved = await self.hybrid_retriever.retrieve(user_query)
-        docs_text = "\n\n".join(r[0] for r in retrieved)
+        with span("pipeline.retrieve"):
+            retrieved = await self.hybrid_retriever.retrieve(user_query)
 
         # 2) Get conversation history
-        chat_history = self.memory.load_memory_variables({})["chat_history"]
+        with span("pipeline.history"):
+            chat_history = self.memory.load_history(session_id)
+
+        cache_key = self._answer_cache_key(user_query, retrieved, chat_history)
+        cached_answer = self.answer_cache.get(cache_key)
+        count_cache_lookup("answers", cached_answer is not None)
+        if cached_answer is not None:
+            return None, cache_key, cached_answer
 
         # 3) Build messages
         messages = [
@@ -54,38 +146,62 @@ class CustomConversationalRAGPipeline:
         for msg in chat_history:
             messages.append(msg)
 
-        messages.append(
-            HumanMessage(
-                content=(
-                    f"{user_query}\n\n"
-                    "If the current query is linked to the previous query, please use it. "
-                    "Here are some relevant docs:\n"
-                    f"{docs_text}"
-                )
-            )
+        question = (
+            f"{user_query}\n\n"
+            "If the current query is linked to the previous query, please use it. "
+            "Here are some relevant docs:\n"
         )
-
-        logger.debug("[CustomConversationalRAGPipeline] Built Messages: %s", messages)
-
-        # 4) Because ChatOpenAI is synchronous, wrap it in asyncio.to_thread
-        try:
-            def sync_call_llm(msgs):
-                """Helper to call the LLM synchronously."""
-                return self.llm(msgs)
-
-            llm_response = await asyncio.to_thread(sync_call_llm, messages)
-
-            generated_content = llm_response.content.strip()
-
-            logger.debug("[CustomConversationalRAGPipeline] LLM Response: %s", generated_content)
-        except Exception as e:
-            logger.error(f"[CustomConversationalRAGPipeline] LLM error: {e}", exc_info=True)
-            return "Sorry, an error occurred while generating the response."
-
-        # 5) Save context
-        self.memory.save_context(
-            {"input": user_query},
-            {"output": generated_content}
+        # Fit the docs into whatever the instructions, history and answer leave free.
+        with span("pipeline.prompt"):
+            prompt_tokens = count_tokens(question) + sum(count_tokens(m.content) for m in messages)
+            docs_text = pack_context(retrieved, context_budget(prompt_tokens))
+
+        messages.append(HumanMessage(content=f"{question}{docs_text}"))
+
+        # Sizes only: the full prompt repeats every retrieved chunk.
+        logger.debug(f"[CustomConversationalRAGPipeline] Built {len(messages)} messages, "
+                     f"{len(docs_text)} characters of docs.")
+        return messages, cache_key, None
+
+    async def _summarize_history(self, summary: str, messages) -> str:
+        """Fold turns that left a session's history window into its running summary."""
+        transcript = "\n".join(
+            f"{'User' if m.type == 'human' else 'Assistant'}: {m.content}" for m in messages
         )
-
-        return generated_content
+        prompt = [
+            SystemMessage(content=(
+                "Update the summary of a conversation with the new turns below. Keep facts, names and "
+                f"identifiers the user may refer back to. Answer with the summary only, under {SESSION_SUMMARY_MAX_TOKENS} tokens."
+            )),
+            HumanMessage(content=f"Current summary:\n{summary or '(none)'}\n\nNew turns:\n{transcript}")
+        ]
+        with span("pipeline.summarize"):
+            response = await self.llm.ainvoke(prompt)
+        self._count_tokens(prompt, response.content, getattr(response, "usage_metadata", None))
+        return response.content
+
+    @staticmethod
+    def _count_tokens(messages, answer: str, usage: Optional[dict]):
+        """Add one LLM call to LLM_TOKENS, from the reported usage or else estimated."""
+        if usage:
+            tokens_in, tokens_out = usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+        else:
+            tokens_in, tokens_out = sum(count_tokens(m.content) for m in messages), count_tokens(answer)
+        LLM_TOKENS.inc(tokens_in, direction="in")
+        LLM_TOKENS.inc(tokens_out, direction="out")
+
+    def cache_stats(self) -> dict:
+        """Size and hit-rate counters of the answer and query-embedding caches."""
+        stats = {"answers": self.answer_cache.stats()}
+        query_embedding_cache = getattr(self.vectorstore_manager, "query_embedding_cache", None)
+        if isinstance(query_embedding_cache, TTLCache):
+            stats["query_embeddings"] = query_embedding_cache.stats()
+        return stats
+
+    @staticmethod
+    def _answer_cache_key(user_query: str, retrieved, chat_history) -> tuple:
+        chunk_keys = tuple(md.get("chunk_id") or compute_content_hash(text) for text, md in retrieved)
+        history_key = ""
+        if chat_history:
+            history_key = compute_content_hash("\n".join(f"{m.type}:{m.content}" for m in chat_history))
+        return normalize_query(user_query), chunk_keys, history_key, load_corpus_version()
@@ -0,0 +1,261 @@
+import os
+import json
+import asyncio
+import logging
+import zipfile
+import tempfile
+import importlib.util
+import xml.etree.ElementTree as ElementTree
+from typing import AsyncIterator, Dict, Iterator, Optional, Tuple
+
+import yaml
+
+from .processing_pool import worker_context
+
+logger = logging.getLogger(__name__)
+
+ATTACHMENTS_ENABLED = os.getenv("ATTACHMENTS_ENABLED", "false").lower() == "true"
+ATTACHMENT_MAX_BYTES = int(os.getenv("ATTACHMENT_MAX_BYTES", str(50 * 1024 * 1024)))
+ATTACHMENT_EXTRACT_TIMEOUT = float(os.getenv("ATTACHMENT_EXTRACT_TIMEOUT", "120"))
+ATTACHMENT_WORKERS = int(os.getenv("ATTACHMENT_WORKERS", "2"))
+# Downloads are spooled here (the system temp directory when unset).
+ATTACHMENT_SPOOL_DIR = os.getenv("ATTACHMENT_SPOOL_DIR") or None
+
+PDF, DOCX, STRUCTURED, PLAIN = "pdf", "docx", "structured", "plain"
+
+_KIND_BY_MEDIA_TYPE = {
+    "application/pdf": PDF,
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": DOCX,
+    "application/json": STRUCTURED,
+    "application/yaml": STRUCTURED,
+    "application/x-yaml": STRUCTURED,
+    "text/yaml": STRUCTURED,
+    "text/x-yaml": STRUCTURED,
+    "text/plain": PLAIN,
+    "text/markdown": PLAIN,
+}
+_KIND_BY_EXTENSION = {
+    ".pdf": PDF, ".docx": DOCX, ".json": STRUCTURED, ".yaml": STRUCTURED, ".yml": STRUCTURED,
+    ".txt": PLAIN, ".md": PLAIN,
+}
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_HTTP_METHODS = ("get", "put", "post", "delete", "options", "head", "patch", "trace")
+
+
+class AttachmentTooLarge(Exception):
+    """The attachment is bigger than the configured limit."""
+
+
+class ExtractionError(Exception):
+    """The attachment could not be read: corrupt, or not what its type says."""
+
+
+def attachment_kind(attachment: Dict) -> Optional[str]:
+    """
+    Which extractor reads `attachment` (a dict from
+    ConfluenceLoader.iter_attachments_in_space), or None if unsupported.
+    PDFs need the optional pypdf package.
+    """
+    media_type = (attachment.get("media_type") or "").split(";")[0].strip().lower()
+    kind = _KIND_BY_MEDIA_TYPE.get(media_type)
+    if kind is None:
+        kind = _KIND_BY_EXTENSION.get(os.path.splitext(attachment.get("title") or "")[1].lower())
+    if kind == PDF and importlib.util.find_spec("pypdf") is None:
+        return None
+    return kind
+
+
+def extract_text(path: str, kind: str) -> str:
+    """Plain text of the file at `path`, with markdown headings where the format has them."""
+    if kind == PDF:
+        return _extract_pdf(path)
+    if kind == DOCX:
+        return _extract_docx(path)
+    if kind == STRUCTURED:
+        return _extract_structured(path)
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        return f.read()
+
+
+def _extract_pdf(path: str) -> str:
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    return "\n\n".join(text.strip() for text in (page.extract_text() or "" for page in reader.pages) if text.strip())
+
+
+def _extract_docx(path: str) -> str:
+    # document.xml is parsed as a stream, one paragraph at a time.
+    lines = []
+    with zipfile.ZipFile(path) as archive, archive.open("word/document.xml") as document:
+        for _, element in ElementTree.iterparse(document):
+            if element.tag != f"{_W}p":
+                continue
+            text = "".join(_docx_runs(element)).strip()
+            if text:
+                lines.append(_docx_heading_prefix(element) + text)
+            element.clear()
+    return "\n".join(lines)
+
+
+def _docx_runs(paragraph) -> Iterator[str]:
+    for node in paragraph.iter():
+        if node.tag == f"{_W}t" and node.text:
+            yield node.text
+        elif node.tag == f"{_W}tab":
+            yield "\t"
+        elif node.tag in (f"{_W}br", f"{_W}cr"):
+            yield " "
+
+
+def _docx_heading_prefix(paragraph) -> str:
+    style = paragraph.find(f"{_W}pPr/{_W}pStyle")
+    name = (style.get(f"{_W}val") or "") if style is not None else ""
+    if name.lower().startswith("heading") and name[7:].isdigit():
+        return "#" * min(6, int(name[7:])) + " "
+    return "- " if paragraph.find(f"{_W}pPr/{_W}numPr") is not None else ""
+
+
+def _extract_structured(path: str) -> str:
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        raw = f.read()
+    try:
+        document = json.loads(raw) if raw.lstrip().startswith(("{", "[")) else yaml.safe_load(raw)
+    except (ValueError, yaml.YAMLError):
+        return raw
+    if isinstance(document, dict) and ("openapi" in document or "swagger" in document):
+        return _render_openapi(document)
+    return raw
+
+
+def _render_openapi(spec: Dict) -> str:
+    """One section per operation, so each endpoint lands in its own chunk."""
+    info = spec.get("info") or {}
+    lines = [f"# {info.get('title') or 'API'} {info.get('version') or ''}".rstrip()]
+    if info.get("description"):
+        lines.append(str(info["description"]).strip())
+    for server in spec.get("servers") or []:
+        if isinstance(server, dict) and server.get("url"):
+            lines.append(f"Server: {server['url']}")
+
+    for path, operations in (spec.get("paths") or {}).items():
+        if not isinstance(operations, dict):
+            continue
+        for method in _HTTP_METHODS:
+            operation = operations.get(method)
+            if not isinstance(operation, dict):
+                continue
+            lines.append(f"## {method.upper()} {path}")
+            for key in ("summary", "description"):
+                if operation.get(key):
+                    lines.append(str(operation[key]).strip())
+            for parameter in [*(operations.get("parameters") or []), *(operation.get("parameters") or [])]:
+                if isinstance(parameter, dict) and parameter.get("name"):
+                    required = " (required)" if parameter.get("required") else ""
+                    description = f": {parameter['description']}" if parameter.get("description") else ""
+                    lines.append(f"- {parameter.get('in', 'param')} {parameter['name']}{required}{description}")
+            for status, response in (operation.get("responses") or {}).items():
+                description = response.get("description", "") if isinstance(response, dict) else ""
+                lines.append(f"- Response {status}: {description}".rstrip(": "))
+    return "\n".join(lines)
+
+
+def _extract_to_file(path: str, kind: str, out_path: str):
+    # Runs in a child process; the parent reads the result from out_path.
+    try:
+        text = extract_text(path, kind)
+    except Exception as e:
+        with open(out_path + ".err", "w", encoding="utf-8") as f:
+            f.write(f"{type(e).__name__}: {e}")
+        os._exit(1)
+    with open(out_path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+class AttachmentExtractor:
+    """
+    Downloads attachments to a temporary spool directory and extracts their
+    text, at most `workers` at a time.
+
+    Downloads are streamed to disk and stop at `max_bytes`, so a file is
+    never held in memory. Each extraction runs in its own process and is
+    killed after `timeout` seconds, so one pathological file cannot stall
+    the run or take the event loop down with it. Spooled files are removed
+    as soon as their text has been read.
+    """
+
+    def __init__(self, workers: int = ATTACHMENT_WORKERS, max_bytes: int = ATTACHMENT_MAX_BYTES,
+                 timeout: float = ATTACHMENT_EXTRACT_TIMEOUT, spool_dir: Optional[str] = ATTACHMENT_SPOOL_DIR):
+        self.workers = max(1, workers)
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.spool_dir = spool_dir
+        self._context = worker_context()
+
+    async def extract_all(self, loader, attachments: AsyncIterator[Dict]
+                          ) -> AsyncIterator[Tuple[Dict, Optional[str], Optional[Exception]]]:
+        """
+        Yields (attachment, text, None) for each supported attachment, in
+        completion order, or (attachment, None, error) if it could not be
+        read. Unsupported attachments are skipped. `loader` is the
+        ConfluenceLoader that listed them, used for the downloads.
+        """
+        if self.spool_dir:
+            os.makedirs(self.spool_dir, exist_ok=True)
+        with tempfile.TemporaryDirectory(prefix="nymcard-attachments-", dir=self.spool_dir) as spool:
+            pending = set()
+            try:
+                async for attachment in attachments:
+                    kind = attachment_kind(attachment)
+                    if kind is None:
+                        logger.debug(f"[ATTACHMENTS] Skipping unsupported attachment {attachment['title']!r}.")
+                        continue
+                    if len(pending) >= self.workers:
+                        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                        for task in done:
+                            yield task.result()
+                    pending.add(asyncio.create_task(self._extract_one(loader, attachment, kind, spool)))
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        yield task.result()
+            finally:
+                for task in pending:
+                    task.cancel()
+
+    async def _extract_one(self, loader, attachment: Dict, kind: str, spool: str):
+        path = os.path.join(spool, attachment["id"])
+        try:
+            if (attachment.get("file_size") or 0) > self.max_bytes:
+                raise AttachmentTooLarge(f"{attachment['file_size']} bytes")
+            await loader.download_attachment(attachment, path, self.max_bytes)
+            return attachment, await self.extract_file(path, kind), None
+        except Exception as e:
+            return attachment, None, e
+        finally:
+            for leftover in (path, path + ".txt", path + ".txt.err"):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+
+    async def extract_file(self, path: str, kind: str) -> str:
+        """Text of the file at `path`, extracted in a child process within the timeout."""
+        out_path = path + ".txt"
+        process = self._context.Process(target=_extract_to_file, args=(path, kind, out_path), daemon=True)
+        process.start()
+        try:
+            await asyncio.to_thread(process.join, self.timeout)
+            if process.is_alive():
+                raise TimeoutError(f"text extraction took longer than {self.timeout:g}s")
+            if process.exitcode != 0:
+                error = f"worker exited with code {process.exitcode}"
+                if os.path.exists(out_path + ".err"):
+                    with open(out_path + ".err", "r", encoding="utf-8") as f:
+                        error = f.read()
+                raise ExtractionError(error)
+            with open(out_path, "r", encoding="utf-8") as f:
+                return f.read()
+        finally:
+            if process.is_alive():
+                process.kill()
+                await asyncio.to_thread(process.join)
@@ -0,0 +1,230 @@
+import os
+import re
+import math
+import heapq
+import sqlite3
+import logging
+import threading
+from collections import Counter
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+BM25_INDEX_PATH = os.getenv(
+    "BM25_INDEX_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "bm25_index.sqlite3")
+)
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Identifier-friendly tokens: "err_4012", "card-id" and "v2.1" stay whole.
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[_\-./][a-z0-9]+)*")
+_PART_SPLIT = re.compile(r"[_\-./]")
+
+_STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have how i if in into is it its of on or "
+    "our so than that the their then there these this to was we what when where which "
+    "who why will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lower-case word tokens for lexical matching. Compound identifiers are kept
+    whole and also contribute their parts, so "ERR_4012" matches both an
+    exact "err_4012" query and a query for "4012".
+    """
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        tokens.append(token)
+        tokens.extend(_split_parts(token))
+    return tokens
+
+
+def _split_parts(token: str) -> List[str]:
+    if token.isalnum():
+        return []
+    return [part for part in _PART_SPLIT.split(token) if part and part not in _STOPWORDS]
+
+
+class BM25Index:
+    """
+    On-disk inverted index over chunks with BM25 scoring.
+
+    Postings live in a SQLite table clustered by term, so a query only reads
+    the posting lists of its own terms. Chunks are added and removed by chunk
+    ID as ingestion stores or deletes them, keeping the index in step with the
+    vector store without ever rebuilding it.
+
+    The chunk count and total length used for IDF and length normalisation
+    are kept in a one-row `stats` table and read by every search, so an API
+    process sees the chunks another process (e.g. `--mode ingest`) indexed.
+    """
+
+    def __init__(self, path: str = BM25_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Updated from worker threads during ingest, so guard with self._lock.
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                chunk_id TEXT PRIMARY KEY,
+                page_id TEXT,
+                title TEXT,
+                text TEXT NOT NULL,
+                length INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                chunk_id TEXT NOT NULL,
+                tf INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                PRIMARY KEY (term, chunk_id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS terms (
+                term TEXT PRIMARY KEY,
+                df INTEGER NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS stats (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                doc_count INTEGER NOT NULL,
+                total_length INTEGER NOT NULL
+            );
+            """
+        )
+        # Indexes written before the stats table existed get it filled once.
+        self._conn.execute(
+            "INSERT OR IGNORE INTO stats SELECT 0, COUNT(*), COALESCE(SUM(length), 0) FROM chunks"
+        )
+        self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._stats()[0]
+
+    def _stats(self) -> Tuple[int, int]:
+        return self._conn.execute("SELECT doc_count, total_length FROM stats").fetchone()
+
+    def _update_stats(self, doc_count: int, total_length: int):
+        if doc_count or total_length:
+            self._conn.execute(
+                "UPDATE stats SET doc_count = doc_count + ?, total_length = total_length + ?",
+                (doc_count, total_length)
+            )
+
+    def add_chunks(self, chunk_ids: List[str], texts: List[str], metadatas: List[Dict] = None):
+        """Index chunks by ID, replacing any earlier version of the same IDs."""
+        metadatas = metadatas or [{} for _ in texts]
+        with self._lock:
+            self._delete_locked(chunk_ids)
+            chunk_rows = []
+            posting_rows = []
+            df_increments = Counter()
+            for chunk_id, text, meta in zip(chunk_ids, texts, metadatas):
+                term_freqs = Counter(tokenize(text))
+                length = sum(term_freqs.values())
+                chunk_rows.append((chunk_id, meta.get("page_id"), meta.get("title"), text, length))
+                posting_rows.extend((term, chunk_id, tf, length) for term, tf in term_freqs.items())
+                df_increments.update(term_freqs.keys())
+            self._conn.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?, ?)", chunk_rows)
+            self._update_stats(len(chunk_rows), sum(row[4] for row in chunk_rows))
+            # Inserting in key order keeps B-tree page writes local.
+            posting_rows.sort()
+            self._conn.executemany("INSERT INTO postings VALUES (?, ?, ?, ?)", posting_rows)
+            self._conn.executemany(
+                "INSERT INTO terms VALUES (?, ?) ON CONFLICT(term) DO UPDATE SET df = df + excluded.df",
+                df_increments.items()
+            )
+            self._conn.commit()
+
+    def remove_chunks(self, chunk_ids: List[str]):
+        """Drop chunks from the index; unknown IDs are ignored."""
+        with self._lock:
+            self._delete_locked(chunk_ids)
+            self._conn.commit()
+
+    def _delete_locked(self, chunk_ids: List[str]):
+        # Postings are clustered by term only; the stored chunk text tells
+        # which (term, chunk_id) keys to remove, so no second index is needed.
+        removed, removed_length = 0, 0
+        for chunk_id in chunk_ids:
+            row = self._conn.execute("SELECT text, length FROM chunks WHERE chunk_id = ?", (chunk_id,)).fetchone()
+            if row is None:
+                continue
+            terms = set(tokenize(row[0]))
+            self._conn.executemany(
+                "DELETE FROM postings WHERE term = ? AND chunk_id = ?", ((term, chunk_id) for term in terms)
+            )
+            self._conn.executemany("UPDATE terms SET df = df - 1 WHERE term = ?", ((term,) for term in terms))
+            # Terms no chunk holds any more would only grow the table.
+            self._conn.executemany("DELETE FROM terms WHERE term = ? AND df <= 0", ((term,) for term in terms))
+            self._conn.execute("DELETE FROM chunks WHERE chunk_id = ?", (chunk_id,))
+            removed += 1
+            removed_length += row[1]
+        self._update_stats(-removed, -removed_length)
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[str, Dict, float]]:
+        """
+        Top-k chunks for `query` by BM25, as (text, metadata, score) tuples
+        shaped like VectorStoreManager.similarity_search_with_scores results.
+        Higher scores are better.
+        """
+        with self._lock:
+            doc_count, total_length = self._stats()
+            if doc_count == 0:
+                return []
+            terms = self._query_terms(query)
+            avg_length = total_length / doc_count
+            scores: Dict[str, float] = {}
+            for term, df in terms.items():
+                idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+                rows = self._conn.execute(
+                    "SELECT chunk_id, tf, length FROM postings WHERE term = ?", (term,)
+                ).fetchall()
+                for chunk_id, tf, length in rows:
+                    norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+
+            top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            results = []
+            for chunk_id, score in top:
+                page_id, title, text = self._conn.execute(
+                    "SELECT page_id, title, text FROM chunks WHERE chunk_id = ?", (chunk_id,)
+                ).fetchone()
+                results.append((text, {"page_id": page_id, "title": title, "chunk_id": chunk_id}, score))
+        return results
+
+    def _query_terms(self, query: str) -> Dict[str, int]:
+        """
+        Indexed query terms with their document frequency. A compound
+        identifier found in the index is matched as a whole; only unknown
+        compounds fall back to their parts, which keeps "err_4012" from
+        dragging in every chunk that mentions "err".
+        """
+        terms: Dict[str, int] = {}
+        for token in _TOKEN_PATTERN.findall(query.lower()):
+            if token in _STOPWORDS or token in terms:
+                continue
+            df = self._document_frequency(token)
+            if df:
+                terms[token] = df
+                continue
+            for part in _split_parts(token):
+                part_df = self._document_frequency(part)
+                if part_df:
+                    terms[part] = part_df
+        return terms
+
+    def _document_frequency(self, term: str) -> int:
+        row = self._conn.execute("SELECT df FROM terms WHERE term = ?", (term,)).fetchone()
+        return row[0] if row else 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
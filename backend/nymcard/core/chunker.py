@@ -0,0 +1,161 @@
+import os
+import re
+from collections.abc import Sequence
+from dataclasses import dataclass
+from typing import Iterator, List, Tuple
+
+from ..utils.helpers import count_tokens
+
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "400"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "50"))
+# A heading starts a new chunk only once the current one holds this share of
+# max_tokens, so runs of very short sections are kept together.
+MIN_CHUNK_RATIO = 0.25
+
+_LINE = re.compile(r"[^\n]+")
+_HEADING = re.compile(r"(#{1,6}) +(\S.*)")
+_WORD = re.compile(r"\S+")
+_FENCE = "```"
+
+
+@dataclass(frozen=True)
+class ChunkSpan:
+    """One chunk of a page: `text[start:end]` of the cleaned text."""
+    start: int
+    end: int
+    section: str
+    tokens: int
+
+
+@dataclass
+class _Block:
+    start: int
+    end: int
+    tokens: int
+    section: str
+    heading: bool
+
+
+class PageChunks(Sequence):
+    """
+    Chunk texts of a page, sliced out of the cleaned text only when accessed,
+    so a page never holds all of its chunks as separate strings at once.
+    """
+
+    def __init__(self, text: str, spans: List[ChunkSpan]):
+        self.text = text
+        self.spans = spans
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.text[span.start:span.end] for span in self.spans[index]]
+        span = self.spans[index]
+        return self.text[span.start:span.end]
+
+    def __len__(self) -> int:
+        return len(self.spans)
+
+
+def chunk_spans(text: str, max_tokens: int = CHUNK_MAX_TOKENS,
+                overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> List[ChunkSpan]:
+    """
+    Split text produced by storage_format.extract_text() into chunks of at
+    most `max_tokens` tokens, returned as character offsets.
+
+    Chunks are built from whole lines (paragraphs, list items, table rows)
+    and whole code blocks. A heading starts a new chunk, and every chunk
+    records the path of headings it sits under ("Cards > Limits"). Chunks
+    split for size repeat up to `overlap_tokens` of trailing lines of the
+    previous one; only blocks longer than `max_tokens` are cut between words.
+    """
+    spans = []
+    current: List[_Block] = []
+    tokens = 0
+    for block in _split_blocks(text, max_tokens, overlap_tokens):
+        section_break = block.heading and tokens >= max_tokens * MIN_CHUNK_RATIO
+        if current and (section_break or tokens + block.tokens > max_tokens):
+            spans.append(_span(current, tokens))
+            current = [] if block.heading else _overlap(current, overlap_tokens, max_tokens - block.tokens)
+            tokens = sum(b.tokens for b in current)
+        current.append(block)
+        tokens += block.tokens
+    if current:
+        spans.append(_span(current, tokens))
+    return spans
+
+
+def _span(blocks: List[_Block], tokens: int) -> ChunkSpan:
+    return ChunkSpan(blocks[0].start, blocks[-1].end, blocks[0].section, tokens)
+
+
+def _overlap(blocks: List[_Block], overlap_tokens: int, room: int) -> List[_Block]:
+    """Trailing blocks worth at most `overlap_tokens`, never the whole chunk."""
+    limit = min(overlap_tokens, room)
+    carried = []
+    used = 0
+    for block in reversed(blocks[1:]):
+        if used + block.tokens > limit:
+            break
+        carried.append(block)
+        used += block.tokens
+    carried.reverse()
+    return carried
+
+
+def _split_blocks(text: str, max_tokens: int, overlap_tokens: int) -> Iterator[_Block]:
+    """Lines and code blocks of `text` with their token counts and section path."""
+    path: List[Tuple[int, str]] = []
+    section = ""
+    code_start = None
+    for line in _LINE.finditer(text):
+        start, end = line.span()
+        is_fence = end - start == len(_FENCE) and text.startswith(_FENCE, start)
+        if code_start is not None:
+            if is_fence:
+                yield from _sized(text, code_start, end, section, False, max_tokens, overlap_tokens)
+                code_start = None
+            continue
+        if is_fence:
+            code_start = start
+            continue
+
+        heading = _HEADING.match(text, start, end)
+        if heading:
+            level = len(heading.group(1))
+            while path and path[-1][0] >= level:
+                path.pop()
+            path.append((level, heading.group(2).strip()))
+            section = " > ".join(title for _, title in path)
+        yield from _sized(text, start, end, section, bool(heading), max_tokens, overlap_tokens)
+
+    if code_start is not None:
+        # Unterminated fence: keep the rest of the page as one code block.
+        yield from _sized(text, code_start, len(text), section, False, max_tokens, overlap_tokens)
+
+
+def _sized(text: str, start: int, end: int, section: str, heading: bool,
+           max_tokens: int, overlap_tokens: int) -> List[_Block]:
+    """The block as is, or cut between words into overlapping pieces if too long."""
+    tokens = count_tokens(text[start:end])
+    if tokens <= max_tokens:
+        return [_Block(start, end, tokens, section, heading)]
+
+    words = [(m.start(), m.end(), count_tokens(m.group())) for m in _WORD.finditer(text, start, end)]
+    pieces = []
+    first = 0
+    while first < len(words):
+        last = first
+        used = 0
+        while last < len(words) and (last == first or used + words[last][2] <= max_tokens):
+            used += words[last][2]
+            last += 1
+        pieces.append(_Block(words[first][0], words[last - 1][1], used, section, heading and not pieces))
+        if last == len(words):
+            break
+        back = last
+        carried = 0
+        while back - 1 > first and carried + words[back - 1][2] <= overlap_tokens:
+            back -= 1
+            carried += words[back][2]
+        first = back
+    return pieces
@@ -1,26 +1,79 @@
+import os
+import asyncio
 import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
+
 from atlassian import Confluence
 
+from .attachments import AttachmentTooLarge
+from .confluence_transport import ConfluenceTransport, CONFLUENCE_MAX_RETRIES
+
 logger = logging.getLogger(__name__)
 
+DEFAULT_MAX_CONCURRENCY = 8
+
+# Seconds to wait before the second attempt at pages whose body could not be
+# fetched during the crawl, so throttling has time to clear.
+CONFLUENCE_RETRY_QUEUE_DELAY = float(os.getenv("CONFLUENCE_RETRY_QUEUE_DELAY", "5"))
+
+# Asking the search endpoint to expand the body lets most pages arrive with
+# their storage HTML already attached, so no per-page round-trip is needed.
+# The version number is recorded in the registry.
+CQL_EXPAND = "content.body.storage,content.version"
+# With known page versions, list versions only: bodies are then fetched just
+# for pages whose version changed.
+CQL_VERSION_EXPAND = "content.version"
+# Attachments are listed with their version, owning page, media type and size.
+CQL_ATTACHMENT_EXPAND = "content.version,content.container,content.extensions"
+
+# Attachment downloads are written to disk this many bytes at a time.
+DOWNLOAD_BLOCK_SIZE = 1024 * 1024
+
+# CQL date literals have minute precision.
+CQL_DATE_FORMAT = "%Y/%m/%d %H:%M"
+
+# Listing IDs only is far cheaper than listing bodies, so use bigger pages.
+ID_LISTING_LIMIT = 200
+
+
+@dataclass
+class CrawlReport:
+    """Pages (or attachments) of a crawl that were not yielded."""
+    # Version matched the caller's known version; body not downloaded.
+    unchanged_ids: Set[str] = field(default_factory=set)
+    # Body could not be fetched, even from the retry queue.
+    failed_page_ids: Set[str] = field(default_factory=set)
+
 
 class ConfluenceLoader:
     """
     Class responsible for fetching pages, attachments, etc. from Confluence.
+
+    Every request goes through a ConfluenceTransport: a pooled keep-alive
+    session, retries with backoff, and an AIMD cap on requests in flight
+    that starts at `max_concurrency` and shrinks while Confluence throttles.
     """
 
-    def __init__(self, url: str, username: str, api_token: str):
+    def __init__(self, url: str, username: str, api_token: str,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY, max_retries: int = CONFLUENCE_MAX_RETRIES,
+                 retry_queue_delay: float = CONFLUENCE_RETRY_QUEUE_DELAY):
+        self.max_concurrency = max(1, max_concurrency)
+        self.transport = ConfluenceTransport(self.max_concurrency, max_retries=max_retries)
+        self.retry_queue_delay = retry_queue_delay
         self.confluence = Confluence(
             url=url,
             username=username,
-            password=api_token
+            password=api_token,
+            session=self.transport.session
         )
 
-    async def fetch_all_pages_in_space(self, space_key: str, limit: int = 50):
+    async def fetch_all_pages_in_space(self, space_key: str, limit: int = 50, report: Optional[CrawlReport] = None):
         """
-        Fetch all pages from a Confluence space using CQL, since 
+        Fetch all pages from a Confluence space using CQL, since
         get_all_pages_from_space() is giving 'Current user not permitted' errors.
-        
+
         Returns a list of dicts, each with:
             {
               "id": <page_id>,
@@ -29,58 +82,279 @@ class ConfluenceLoader:
                 "storage": {
                   "value": <page_body_html>
                 }
-              }
+              },
+              "version": <version number, when the search returned it>
             }
+        Pages are returned in CQL order. Prefer iter_pages_in_space() when the
+        caller can start working on pages before the whole space is fetched.
+        Pages whose body could not be fetched are left out and listed in
+        `report`, if given.
         """
-        logger.info(f"Fetching pages from space via CQL: {space_key}")
-        all_pages = []
+        indexed_pages = []
+        async for position, page in self._iter_indexed_pages(space_key, limit, report=report):
+            indexed_pages.append((position, page))
+
+        indexed_pages.sort(key=lambda item: item[0])
+        all_pages = [page for _, page in indexed_pages]
+        logger.info(f"Found {len(all_pages)} pages via CQL for space={space_key}")
+        return all_pages
+
+    async def iter_pages_in_space(self, space_key: str, limit: int = 50,
+                                  modified_since: Optional[datetime] = None,
+                                  known_versions: Optional[Callable[[List[str]], Dict[str, int]]] = None,
+                                  report: Optional[CrawlReport] = None) -> AsyncIterator[Dict]:
+        """
+        Stream the pages of a space as soon as each one is available.
+
+        Yields the same dicts as fetch_all_pages_in_space(), but in completion
+        order rather than CQL order. At most `max_concurrency` Confluence
+        requests are in flight at any time, and the next CQL result page is
+        requested while bodies of the current one are still downloading.
+
+        If `modified_since` is given, only pages last modified at or after
+        that moment are returned (CQL `lastmodified`).
+
+        If `known_versions` is given, it maps page IDs to the version already
+        ingested for each; it is called in a worker thread, so it may block on
+        a registry read. The search then lists versions only, and pages
+        still at their known version are skipped without downloading their
+        body. Skipped pages, and pages whose body could not be fetched even
+        after the retry queue, are listed in `report`, if given.
+        """
+        async for _, page in self._iter_indexed_pages(space_key, limit, modified_since, known_versions, report):
+            yield page
+
+    async def iter_attachments_in_space(self, space_key: str, limit: int = ID_LISTING_LIMIT,
+                                        modified_since: Optional[datetime] = None,
+                                        known_versions: Optional[Callable[[List[str]], Dict[str, int]]] = None,
+                                        report: Optional[CrawlReport] = None) -> AsyncIterator[Dict]:
+        """
+        Stream the attachments of a space, without downloading them. Yields
+        dicts with "id", "title" (file name), "version", "media_type",
+        "file_size", "download_url", and the owning "page_id" / "page_title".
+
+        `modified_since` and `known_versions` work as in iter_pages_in_space();
+        attachments still at their known version are listed in `report`.
+        """
+        cql_str = self._build_cql(space_key, modified_since, content_type="attachment")
+        report = report if report is not None else CrawlReport()
+        base_url = self.confluence.url.rstrip("/")
         start = 0
 
         while True:
-            # Only fetch page-type content in that space
-            cql_str = f"space='{space_key}' AND type=page"
-            logger.debug(f"Running CQL: {cql_str} start={start}, limit={limit}")
-
-            response = self.confluence.cql(cql_str, limit=limit, start=start)
+            response = await self._run_cql(cql_str, start, limit, expand=CQL_ATTACHMENT_EXPAND, excerpt="none")
             results = response.get("results", [])
-            if not results:
+            attachments = [self._attachment_from_result(r, base_url) for r in results]
+            versions = await self._known_versions(known_versions, [a["id"] for a in attachments])
+            for attachment in attachments:
+                if attachment["version"] is not None and versions.get(attachment["id"]) == attachment["version"]:
+                    report.unchanged_ids.add(attachment["id"])
+                elif attachment["download_url"]:
+                    yield attachment
+            if not results or response.get("size", 0) < limit:
                 break
+            start += limit
 
-            for r in results:
-                content = r.get("content", {})
-                page_id = content.get("id")
-                title = r.get("title")
-
-                body = self._fetch_page_body(page_id)
-
-                page_dict = {
-                    "id": page_id,
-                    "title": title,
-                    "body": {
-                        "storage": {
-                            "value": body
-                        }
-                    }
-                }
-                all_pages.append(page_dict)
+    async def download_attachment(self, attachment: Dict, path: str, max_bytes: int) -> int:
+        """
+        Stream an attachment to `path` without holding it in memory. Raises
+        AttachmentTooLarge past `max_bytes`. Returns the number of bytes.
+        """
+        return await self.transport.call(self._download, attachment["download_url"], path, max_bytes)
+
+    def _download(self, url: str, path: str, max_bytes: int) -> int:
+        with self.transport.session.get(url, stream=True, timeout=self.confluence.timeout) as response:
+            response.raise_for_status()
+            size = 0
+            with open(path, "wb") as f:
+                for block in response.iter_content(DOWNLOAD_BLOCK_SIZE):
+                    size += len(block)
+                    if size > max_bytes:
+                        raise AttachmentTooLarge(f"more than {max_bytes} bytes")
+                    f.write(block)
+        return size
+
+    async def fetch_page_ids_in_space(self, space_key: str, limit: int = ID_LISTING_LIMIT,
+                                      content_type: str = "page") -> Set[str]:
+        """
+        Return the IDs of every page currently in the space, without bodies.
+        Used by delta sync to spot deleted pages cheaply. With
+        content_type="attachment", lists attachment IDs instead.
+        """
+        cql_str = self._build_cql(space_key, content_type=content_type)
+        page_ids = set()
+        start = 0
 
-            returned_size = response.get("size", 0)
-            if returned_size < limit:
-                # No more results
+        while True:
+            response = await self._run_cql(cql_str, start, limit, expand=None, excerpt="none")
+            results = response.get("results", [])
+            for r in results:
+                page_id = r.get("content", {}).get("id")
+                if page_id:
+                    page_ids.add(page_id)
+            if not results or response.get("size", 0) < limit:
                 break
             start += limit
 
-        logger.info(f"Found {len(all_pages)} pages via CQL for space={space_key}")
-        return all_pages
+        logger.info(f"Listed {len(page_ids)} {content_type} IDs for space={space_key}")
+        return page_ids
 
-    def _fetch_page_body(self, page_id: str) -> str:
+    @staticmethod
+    def _build_cql(space_key: str, modified_since: Optional[datetime] = None, content_type: str = "page") -> str:
+        # Only fetch page-type content in that space
+        cql_str = f"space='{space_key}' AND type={content_type}"
+        if modified_since is not None:
+            cql_str += f" AND lastmodified >= \"{modified_since.strftime(CQL_DATE_FORMAT)}\""
+        return cql_str
+
+    async def _iter_indexed_pages(self, space_key: str, limit: int,
+                                  modified_since: Optional[datetime] = None,
+                                  known_versions: Optional[Callable[[List[str]], Dict[str, int]]] = None,
+                                  report: Optional[CrawlReport] = None) -> AsyncIterator[Tuple[int, Dict]]:
         """
-        Fetch the full HTML storage of a Confluence page by ID.
-        This is a synchronous call, but easy for demonstration.
+        Core crawl loop. Yields (cql_position, page_dict) tuples.
         """
+        logger.info(f"Fetching pages from space via CQL: {space_key}")
+        cql_str = self._build_cql(space_key, modified_since)
+        expand = CQL_VERSION_EXPAND if known_versions is not None else CQL_EXPAND
+        report = report if report is not None else CrawlReport()
+
+        start = 0
+        position = 0
+        next_batch = asyncio.create_task(self._run_cql(cql_str, start, limit, expand=expand))
+        pending = set()
+        retry_queue: List[Tuple[int, Dict]] = []
+
         try:
-            page = self.confluence.get_page_by_id(page_id, expand="body.storage")
-            return page.get("body", {}).get("storage", {}).get("value", "")
+            while next_batch is not None:
+                response = await next_batch
+                next_batch = None
+                results = response.get("results", [])
+                if not results:
+                    break
+
+                returned_size = response.get("size", 0)
+                if returned_size >= limit:
+                    # Prefetch the next result page while bodies are downloading.
+                    start += limit
+                    next_batch = asyncio.create_task(self._run_cql(cql_str, start, limit, expand=expand))
+
+                pages = [self._page_from_result(r) for r in results]
+                versions = await self._known_versions(known_versions, [page["id"] for page, _ in pages])
+                for page_dict, has_body in pages:
+                    version = page_dict.get("version")
+                    if version is not None and versions.get(page_dict["id"]) == version:
+                        report.unchanged_ids.add(page_dict["id"])
+                    elif has_body:
+                        yield position, page_dict
+                    else:
+                        pending.add(asyncio.create_task(self._fill_page_body(position, page_dict)))
+                    position += 1
+
+                async for item in self._drain(pending, retry_queue):
+                    yield item
+
+            if retry_queue:
+                logger.warning(f"Retrying {len(retry_queue)} pages whose body could not be fetched.")
+                await asyncio.sleep(self.retry_queue_delay)
+                failed = []
+                pending = {asyncio.create_task(self._fill_page_body(position, page_dict))
+                           for position, page_dict in retry_queue}
+                async for item in self._drain(pending, failed):
+                    yield item
+                for _, page_dict in failed:
+                    logger.error(f"Giving up on page_id={page_dict['id']}; it will be fetched again next run.")
+                    report.failed_page_ids.add(page_dict["id"])
+        finally:
+            # The consumer may stop early; never leave requests running behind it.
+            if next_batch is not None:
+                next_batch.cancel()
+            for task in pending:
+                task.cancel()
+
+    @staticmethod
+    async def _drain(pending: Set[asyncio.Task], failed: List[Tuple[int, Dict]]) -> AsyncIterator[Tuple[int, Dict]]:
+        """
+        Yield the pages of `pending` body fetches as they complete; pages
+        whose fetch failed are appended to `failed` instead.
+        """
+        for next_done in asyncio.as_completed(list(pending)):
+            position, page_dict, error = await next_done
+            if error is None:
+                yield position, page_dict
+            else:
+                logger.warning(f"Error fetching page content for page_id={page_dict['id']}: {error}")
+                failed.append((position, page_dict))
+        pending.clear()
+
+    async def _run_cql(self, cql_str: str, start: int, limit: int,
+                       expand: Optional[str] = CQL_EXPAND, excerpt: Optional[str] = None) -> Dict:
+        logger.debug(f"Running CQL: {cql_str} start={start}, limit={limit}")
+        return await self.transport.call(
+            self.confluence.cql, cql_str, limit=limit, start=start, expand=expand, excerpt=excerpt
+        )
+
+    @staticmethod
+    async def _known_versions(known_versions: Optional[Callable[[List[str]], Dict[str, int]]],
+                              ids: List[str]) -> Dict[str, int]:
+        if known_versions is None:
+            return {}
+        return await asyncio.to_thread(known_versions, ids)
+
+    async def _fill_page_body(self, position: int, page_dict: Dict) -> Tuple[int, Dict, Optional[Exception]]:
+        """Fetch the body of `page_dict` into it. Returns (position, page_dict, error or None)."""
+        try:
+            page_dict["body"]["storage"]["value"] = await self.transport.call(self._fetch_page_body, page_dict["id"])
         except Exception as e:
-            logger.error(f"Error fetching page content for page_id={page_id}: {e}")
-            return ""
+            return position, page_dict, e
+        return position, page_dict, None
+
+    @staticmethod
+    def _page_from_result(result: Dict) -> Tuple[Dict, bool]:
+        """
+        Build the page dict for one CQL search result. The second element tells
+        whether the body came back with the search (via CQL_EXPAND).
+        """
+        content = result.get("content", {})
+        storage = content.get("body", {}).get("storage")
+        has_body = storage is not None
+
+        page_dict = {
+            "id": content.get("id"),
+            "title": result.get("title"),
+            "body": {
+                "storage": {
+                    "value": storage.get("value", "") if has_body else ""
+                }
+            }
+        }
+        version = content.get("version", {}).get("number")
+        if version is not None:
+            page_dict["version"] = version
+        return page_dict, has_body
+
+    @staticmethod
+    def _attachment_from_result(result: Dict, base_url: str) -> Dict:
+        content = result.get("content", {})
+        extensions = content.get("extensions", {})
+        container = content.get("container", {})
+        download = content.get("_links", {}).get("download")
+        return {
+            "id": content.get("id"),
+            "title": content.get("title") or result.get("title"),
+            "version": content.get("version", {}).get("number"),
+            "media_type": extensions.get("mediaType") or content.get("metadata", {}).get("mediaType"),
+            "file_size": extensions.get("fileSize"),
+            "download_url": f"{base_url}{download}" if download else None,
+            "page_id": container.get("id"),
+            "page_title": container.get("title"),
+        }
+
+    def _fetch_page_body(self, page_id: str) -> str:
+        """
+        Fetch the full HTML storage of a Confluence page by ID.
+        This is a synchronous call; the crawl loop runs it in a worker thread.
+        Errors are raised, so a page is never mistaken for an empty one.
+        """
+        page = self.confluence.get_page_by_id(page_id, expand="body.storage")
+        return page.get("body", {}).get("storage", {}).get("value", "")
@@ -0,0 +1,175 @@
+import os
+import time
+import random
+import asyncio
+import logging
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional, TypeVar
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .metrics import CONFLUENCE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+CONFLUENCE_MAX_RETRIES = int(os.getenv("CONFLUENCE_MAX_RETRIES", "5"))
+CONFLUENCE_BACKOFF_SECONDS = float(os.getenv("CONFLUENCE_BACKOFF_SECONDS", "0.5"))
+CONFLUENCE_MAX_BACKOFF_SECONDS = float(os.getenv("CONFLUENCE_MAX_BACKOFF_SECONDS", "60"))
+
+# The server asks us to slow down: retried, and concurrency is cut.
+THROTTLE_STATUS_CODES = frozenset({429, 503})
+# Worth another try, but says nothing about load.
+TRANSIENT_STATUS_CODES = frozenset({500, 502, 504})
+
+T = TypeVar("T")
+
+
+def create_session(pool_size: int) -> requests.Session:
+    """
+    A requests session that keeps up to `pool_size` connections to the
+    Confluence host alive. With pool_block, a worker thread waits for a free
+    connection instead of opening one that would be thrown away afterwards.
+    Retries are left to ConfluenceTransport.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date), or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _status_of(error: Exception) -> Optional[int]:
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
+
+
+class AIMDLimiter:
+    """
+    Caps the Confluence requests in flight with additive-increase /
+    multiplicative-decrease, as TCP does for its congestion window.
+
+    Each success raises the limit by 1/limit (about one more slot per round
+    of requests), up to `max_limit`. A throttled request multiplies it by
+    `decrease_factor`, down to `min_limit`; requests that were already in
+    flight when the limit was cut do not cut it again. A Retry-After pauses
+    every new request until it has passed.
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1, decrease_factor: float = 0.5):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.decrease_factor = decrease_factor
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        self._paused_until = 0.0
+        self._last_decrease = float("-inf")
+        self._condition = None
+        self._loop = None
+
+    def _get_condition(self) -> asyncio.Condition:
+        # asyncio primitives belong to one event loop; the limits carry over.
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._condition = loop, asyncio.Condition()
+        return self._condition
+
+    async def acquire(self) -> float:
+        """Wait for a free slot. Returns the start time to hand back to release()."""
+        condition = self._get_condition()
+        async with condition:
+            while True:
+                pause = self._paused_until - time.monotonic()
+                if pause > 0:
+                    try:
+                        await asyncio.wait_for(condition.wait(), pause)
+                    except asyncio.TimeoutError:
+                        pass
+                elif self.in_flight < int(self.limit):
+                    break
+                else:
+                    await condition.wait()
+            self.in_flight += 1
+        return time.monotonic()
+
+    async def release(self, started: float, throttled: bool = False, retry_after: Optional[float] = None):
+        condition = self._get_condition()
+        async with condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if throttled:
+                if started >= self._last_decrease:
+                    self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                    self._last_decrease = now
+                    logger.info(f"[CONFLUENCE_TRANSPORT] Throttled, concurrency limit now {int(self.limit)}.")
+                if retry_after:
+                    self._paused_until = max(self._paused_until, now + retry_after)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            condition.notify_all()
+
+
+class ConfluenceTransport:
+    """
+    Runs blocking Confluence client calls in worker threads, at most as many
+    at once as the AIMDLimiter allows, over a pooled keep-alive session.
+
+    Throttled (429/503) and transient (5xx, connection, timeout) failures are
+    retried up to `max_retries` times: after the server's Retry-After when it
+    sends one, otherwise after a jittered exponential backoff. Other errors,
+    and the last failure, are raised to the caller.
+    """
+
+    def __init__(self, max_concurrency: int, max_retries: int = CONFLUENCE_MAX_RETRIES,
+                 backoff: float = CONFLUENCE_BACKOFF_SECONDS, max_backoff: float = CONFLUENCE_MAX_BACKOFF_SECONDS):
+        self.session = create_session(max(1, max_concurrency))
+        self.limiter = AIMDLimiter(max_concurrency)
+        self.max_retries = max(0, max_retries)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    async def call(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        attempt = 0
+        while True:
+            started = await self.limiter.acquire()
+            try:
+                result = await asyncio.to_thread(fn, *args, **kwargs)
+            except Exception as e:
+                status = _status_of(e)
+                throttled = status in THROTTLE_STATUS_CODES
+                retry_after = parse_retry_after(e.response.headers.get("Retry-After")) if throttled else None
+                await self.limiter.release(started, throttled=throttled, retry_after=retry_after)
+                retryable = (throttled or status in TRANSIENT_STATUS_CODES
+                             or isinstance(e, (requests.ConnectionError, requests.Timeout)))
+                CONFLUENCE_REQUESTS.inc(result="throttled" if throttled else "error")
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                if not retry_after:
+                    # With a Retry-After, the limiter already holds every request back;
+                    # "Retry-After: 0" (or a date in the past) pauses nothing, so back off.
+                    delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+                    await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+                logger.debug(f"[CONFLUENCE_TRANSPORT] Retry {attempt}/{self.max_retries} after {status or e}.")
+            except BaseException:
+                # Cancelled while the call was running; free the slot.
+                await self.limiter.release(started)
+                raise
+            else:
+                await self.limiter.release(started)
+                CONFLUENCE_REQUESTS.inc(result="ok")
+                return result
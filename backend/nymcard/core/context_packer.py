@@ -0,0 +1,172 @@
+import os
+import re
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from ..utils.helpers import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on retrieved text per prompt; the pipeline lowers it further
+# when history and the answer need the room.
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "3000"))
+# Context window of the chat model (ChatOpenAI defaults to gpt-3.5-turbo).
+LLM_CONTEXT_TOKENS = int(os.getenv("LLM_CONTEXT_TOKENS", "16385"))
+ANSWER_RESERVE_TOKENS = int(os.getenv("ANSWER_RESERVE_TOKENS", "1000"))
+
+# Longest word overlap looked for between two chunks of one page, and the
+# shortest one trusted when the chunks are not known to be neighbours.
+MAX_OVERLAP_WORDS = 200
+MIN_OVERLAP_WORDS = 8
+
+_WORD = re.compile(r"\S+")
+
+
+@dataclass
+class _Passage:
+    page_id: Optional[str]
+    chunk_index: Optional[int]
+    text: str
+    rank: int
+    last_index: Optional[int] = None
+
+    def __post_init__(self):
+        self._split()
+
+    def _split(self):
+        # Overlaps are found on words; `ends` maps them back to the text,
+        # whose line breaks, lists and tables are kept as they are.
+        matches = list(_WORD.finditer(self.text))
+        self.words = [m.group() for m in matches]
+        self.ends = [m.end() for m in matches]
+
+    def extend(self, other: "_Passage", skip_words: int):
+        """Append `other` minus its first `skip_words` words."""
+        if skip_words:
+            # Resume right after the last repeated word, keeping its whitespace.
+            self.text += other.text[other.ends[skip_words - 1]:]
+        else:
+            self.text = f"{self.text.rstrip()}\n{other.text.lstrip()}"
+        self._split()
+
+
+def context_budget(prompt_tokens: int) -> int:
+    """
+    Tokens left for retrieved context once the rest of the prompt
+    (`prompt_tokens`: instructions, history, question) and the answer are
+    accounted for, capped at CONTEXT_MAX_TOKENS.
+    """
+    return max(0, min(CONTEXT_MAX_TOKENS, LLM_CONTEXT_TOKENS - ANSWER_RESERVE_TOKENS - prompt_tokens))
+
+
+def pack_context(retrieved: List[Tuple[str, Dict]], max_tokens: int) -> str:
+    """
+    Assemble the docs section of a prompt from HybridRetriever results.
+
+    Chunks of the same page that are adjacent or overlap (the chunker repeats
+    the tail of each chunk at the head of the next) are merged into one
+    passage with the repeated words removed; the text keeps its layout.
+    Passages are then packed best
+    first, by retrieval rank, until `max_tokens` is reached; the best one is
+    truncated rather than left out if it does not fit on its own. URL/phone
+    extractions are deduplicated and packed ahead of the passages.
+    """
+    extractions = []
+    passages = []
+    for rank, (text, meta) in enumerate(retrieved):
+        if meta.get("type", "").endswith("_extraction"):
+            if text not in extractions:
+                extractions.append(text)
+        else:
+            passages.append(_Passage(meta.get("page_id"), meta.get("chunk_index"), text, rank))
+
+    passages = _merge_passages(passages)
+    passages.sort(key=lambda p: p.rank)
+
+    sections = []
+    used = 0
+    for text in extractions + [p.text.strip() for p in passages]:
+        tokens = count_tokens(text)
+        if used + tokens > max_tokens:
+            if sections:
+                continue
+            text = _truncate_to_tokens(text, max_tokens)
+            tokens = count_tokens(text)
+            if not text:
+                break
+        sections.append(text)
+        used += tokens
+
+    logger.debug(f"[CONTEXT_PACKER] Packed {len(sections)} sections, {used}/{max_tokens} tokens.")
+    return "\n\n".join(sections)
+
+
+def _merge_passages(passages: List[_Passage]) -> List[_Passage]:
+    by_page: Dict[Optional[str], List[_Passage]] = {}
+    for passage in passages:
+        by_page.setdefault(passage.page_id, []).append(passage)
+
+    merged = []
+    for page_id, page_passages in by_page.items():
+        if page_id is None:
+            merged.extend(page_passages)
+            continue
+        page_passages.sort(key=lambda p: (p.chunk_index is None, p.chunk_index or 0, p.rank))
+        current = page_passages[0]
+        current.last_index = current.chunk_index
+        for nxt in page_passages[1:]:
+            if not _merge_into(current, nxt):
+                merged.append(current)
+                current = nxt
+                current.last_index = current.chunk_index
+        merged.append(current)
+    return merged
+
+
+def _merge_into(current: _Passage, nxt: _Passage) -> bool:
+    """Append `nxt` to `current` if they are contiguous or overlap; True on success."""
+    if _contains(current.words, nxt.words):
+        current.rank = min(current.rank, nxt.rank)
+        return True
+
+    overlap = _overlap_words(current.words, nxt.words)
+    adjacent = (
+        current.last_index is not None and nxt.chunk_index is not None
+        and nxt.chunk_index == current.last_index + 1
+    )
+    if not adjacent and overlap < MIN_OVERLAP_WORDS:
+        return False
+
+    current.extend(nxt, overlap)
+    current.rank = min(current.rank, nxt.rank)
+    if nxt.chunk_index is not None:
+        current.last_index = nxt.chunk_index
+    return True
+
+
+def _overlap_words(first: List[str], second: List[str]) -> int:
+    """Length of the longest suffix of `first` that is a prefix of `second`."""
+    for size in range(min(len(first), len(second), MAX_OVERLAP_WORDS), 0, -1):
+        if first[-size:] == second[:size]:
+            return size
+    return 0
+
+
+def _contains(words: List[str], other: List[str]) -> bool:
+    if len(other) > len(words):
+        return False
+    return f" {' '.join(other)} " in f" {' '.join(words)} "
+
+
+def _truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Longest word prefix of `text` within `max_tokens` (binary search)."""
+    ends = [m.end() for m in _WORD.finditer(text)]
+    low, high = 0, len(ends)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(text[:ends[mid - 1]]) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:ends[low - 1]] if low else ""
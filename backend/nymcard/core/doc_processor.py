@@ -1,40 +1,24 @@
-import re
 import logging
-from typing import List, Dict
+from typing import Dict
+
+from .storage_format import extract_text
+from .chunker import chunk_spans, PageChunks
 
 logger = logging.getLogger(__name__)
 
 def clean_text(html_text: str) -> str:
-    """Basic HTML cleanup."""
-    text = re.sub(r"<[^>]+>", " ", html_text)
-    text = re.sub(r"\s+", " ", text)
-    return text.strip()
-
-def chunk_text(text: str, chunk_size=500, overlap=50) -> List[str]:
-    """Split text into chunks with optional overlap."""
-    words = text.split()
-    chunks = []
-    start = 0
-
-    while start < len(words):
-        end = start + chunk_size
-        chunk = words[start:end]
-        chunks.append(" ".join(chunk))
-        start = end - overlap
-        if start < 0:
-            start = 0
-        if start >= len(words):
-            break
-
-    return chunks
+    """Plain text of a page body in Confluence storage format (see storage_format)."""
+    return extract_text(html_text)
 
 def process_confluence_page(page: Dict) -> Dict:
     """
     Returns a dict with: 
       - 'page_id'
       - 'title'
+      - 'version' (Confluence version number, or None)
       - 'cleaned_text'
-      - 'chunks' (list of chunked strings)
+      - 'chunk_spans' (ChunkSpan offsets into cleaned_text, with section path)
+      - 'chunks' (chunk strings, sliced from cleaned_text on access)
     """
     page_id = page.get("id", "")
     title = page.get("title", "")
@@ -42,11 +26,36 @@ def process_confluence_page(page: Dict) -> Dict:
 
     logger.info(f"[PROCESS_PAGE] Processing page ID={page_id}, title={title}")
     cleaned = clean_text(body)
-    chunks = chunk_text(cleaned)
+    spans = chunk_spans(cleaned)
 
     return {
         "page_id": page_id,
         "title": title,
+        "version": page.get("version"),
         "cleaned_text": cleaned,
-        "chunks": chunks
+        "chunk_spans": spans,
+        "chunks": PageChunks(cleaned, spans)
+    }
+
+def process_attachment(attachment: Dict, text: str) -> Dict:
+    """
+    Same dict as process_confluence_page() for the extracted text of an
+    attachment (see attachments.AttachmentExtractor). "page_id" is the
+    attachment ID; the owning page is in "parent_page_id".
+    """
+    title = attachment.get("title", "")
+    if attachment.get("page_title"):
+        title = f"{attachment['page_title']} / {title}"
+
+    logger.info(f"[PROCESS_PAGE] Processing attachment ID={attachment.get('id')}, title={title}")
+    spans = chunk_spans(text)
+
+    return {
+        "page_id": attachment.get("id", ""),
+        "parent_page_id": attachment.get("page_id"),
+        "title": title,
+        "version": attachment.get("version"),
+        "cleaned_text": text,
+        "chunk_spans": spans,
+        "chunks": PageChunks(text, spans)
     }
@@ -1,22 +1,300 @@
 import json
 import hashlib
+import logging
 import os
+import sqlite3
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
 from ..utils.helpers import get_project_root
 
+logger = logging.getLogger(__name__)
+
+REGISTRY_PATH = os.getenv(
+    "REGISTRY_PATH", os.path.join(get_project_root(), "nymcard", "data", "doc_registry.sqlite3")
+)
+# JSON registry of earlier versions; imported into REGISTRY_PATH once, then renamed.
 REGISTRY_FILE = os.path.join(get_project_root(), "nymcard", "data", "ingested_docs.json")
+CHECKPOINT_FILE = os.path.join(get_project_root(), "nymcard", "data", "sync_checkpoints.json")
+CORPUS_VERSION_FILE = os.path.join(get_project_root(), "nymcard", "data", "corpus_version.json")
+
+# SQLite allows at most 999 parameters per statement in older builds.
+_MAX_PARAMS = 500
+
+# Guards the read-modify-write of the JSON side files within a process.
+_json_files_lock = threading.Lock()
+# (path, inode, mtime) of CORPUS_VERSION_FILE -> the version read from it.
+_corpus_version_cache: Tuple[Optional[tuple], str] = (None, "0")
+
+
+class DocRegistry:
+    """
+    Ingestion registry: page ID -> page version, content hash, chunk IDs and
+    the time the page was last recorded.
+
+    Backed by SQLite in WAL mode, so reads never block the writer and
+    several processes (concurrent /ingest calls, worker processes) can share
+    one registry. Every write touches only the pages it names, in a single
+    transaction; nothing rewrites the whole registry.
+
+    Entries read back as {"hash", "chunk_ids", "version", "updated_at"}.
+    chunk_ids is None for pages registered before chunk tracking.
+    """
+
+    def __init__(self, path: str = REGISTRY_PATH, legacy_file: Optional[str] = REGISTRY_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Transactions are opened explicitly (isolation_level=None); the
+        # timeout waits out another process holding the write lock.
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                page_id TEXT PRIMARY KEY,
+                version INTEGER,
+                hash TEXT NOT NULL,
+                chunk_ids TEXT,
+                updated_at TEXT NOT NULL
+            ) WITHOUT ROWID
+            """
+        )
+        if legacy_file and os.path.exists(legacy_file):
+            self._migrate(legacy_file)
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _migrate(self, legacy_file: str):
+        """Import the JSON registry of earlier versions; pages already in the database win."""
+        with open(legacy_file, "r", encoding="utf-8") as f:
+            legacy = json.load(f)
+        now = _now()
+        rows = [
+            (page_id, get_entry_hash(entry), _dump_chunk_ids(get_entry_chunk_ids(entry)), now)
+            for page_id, entry in legacy.items()
+        ]
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO pages (page_id, hash, chunk_ids, updated_at) VALUES (?, ?, ?, ?)", rows
+            )
+        try:
+            os.replace(legacy_file, legacy_file + ".migrated")
+        except FileNotFoundError:
+            pass  # another process migrated it at the same time
+        logger.info(f"[DOC_REGISTRY] Migrated {len(rows)} pages from {legacy_file} to {self.path}.")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def __contains__(self, page_id: str) -> bool:
+        return self.get(page_id) is not None
+
+    def get(self, page_id: str, default=None) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT page_id, version, hash, chunk_ids, updated_at FROM pages WHERE page_id = ?", (page_id,)
+            ).fetchone()
+        return _entry(row) if row else default
+
+    def get_many(self, page_ids: Iterable[str]) -> Dict[str, Dict]:
+        """Entries of the known pages among `page_ids`."""
+        page_ids = list(page_ids)
+        entries = {}
+        with self._lock:
+            for start in range(0, len(page_ids), _MAX_PARAMS):
+                batch = page_ids[start:start + _MAX_PARAMS]
+                rows = self._conn.execute(
+                    "SELECT page_id, version, hash, chunk_ids, updated_at FROM pages "
+                    f"WHERE page_id IN ({','.join('?' * len(batch))})",
+                    batch
+                ).fetchall()
+                entries.update((row[0], _entry(row)) for row in rows)
+        return entries
+
+    def list_pages(self, offset: int = 0, limit: int = 100) -> List[Tuple[str, Dict]]:
+        """(page_id, entry) pairs ordered by page ID, `limit` at a time from `offset`."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT page_id, version, hash, chunk_ids, updated_at FROM pages ORDER BY page_id LIMIT ? OFFSET ?",
+                (max(0, limit), max(0, offset))
+            ).fetchall()
+        return [(row[0], _entry(row)) for row in rows]
+
+    def upsert_many(self, entries: Dict[str, Dict]):
+        """
+        Record pages in one transaction. Each entry has "hash", "chunk_ids"
+        and optionally "version"; pages not named are left untouched.
+        """
+        now = _now()
+        rows = [
+            (page_id, entry.get("version"), entry["hash"], _dump_chunk_ids(entry.get("chunk_ids")), now)
+            for page_id, entry in entries.items()
+        ]
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT INTO pages (page_id, version, hash, chunk_ids, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (page_id) DO UPDATE SET version = excluded.version, hash = excluded.hash, "
+                "chunk_ids = excluded.chunk_ids, updated_at = excluded.updated_at",
+                rows
+            )
+
+    def delete_many(self, page_ids: Iterable[str]) -> int:
+        """Forget pages in one transaction; returns how many were registered."""
+        with self._transaction() as conn:
+            before = conn.total_changes
+            conn.executemany("DELETE FROM pages WHERE page_id = ?", ((page_id,) for page_id in page_ids))
+            return conn.total_changes - before
 
-def load_registry() -> dict:
-    """Load the ingestion registry from a JSON file."""
-    if not os.path.exists(REGISTRY_FILE):
-        return {}
-    with open(REGISTRY_FILE, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    def close(self):
+        with self._lock:
+            self._conn.close()
 
-def save_registry(registry: dict):
-    """Save the ingestion registry to a JSON file."""
-    with open(REGISTRY_FILE, 'w', encoding='utf-8') as f:
-        json.dump(registry, f, indent=2)
+
+_registries: Dict[str, DocRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def open_registry(path: str = REGISTRY_PATH) -> DocRegistry:
+    """The process-wide DocRegistry at `path`, opened (and migrated) on first use."""
+    with _registries_lock:
+        registry = _registries.get(path)
+        if registry is None:
+            registry = _registries[path] = DocRegistry(path)
+        return registry
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def _dump_chunk_ids(chunk_ids) -> Optional[str]:
+    return None if chunk_ids is None else json.dumps(chunk_ids)
+
+
+def _entry(row) -> Dict:
+    _, version, page_hash, chunk_ids, updated_at = row
+    return {
+        "hash": page_hash,
+        "chunk_ids": None if chunk_ids is None else json.loads(chunk_ids),
+        "version": version,
+        "updated_at": updated_at,
+    }
 
 def compute_content_hash(text: str) -> str:
     """Compute a simple SHA256 hash of the text content."""
     return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def compute_chunk_id(page_id: str, chunk: str) -> str:
+    """
+    Deterministic, content-addressed ID of a chunk: unchanged chunks of a page
+    keep their ID across edits, so only new or changed chunks need embedding.
+    """
+    return f"{page_id}:{compute_content_hash(chunk)[:16]}"
+
+def get_entry_hash(entry) -> str:
+    """
+    Page hash of a registry entry. Entries are {"hash": ..., "chunk_ids": [...]};
+    registries written before chunk tracking store the bare hash string.
+    """
+    return entry if isinstance(entry, str) else entry.get("hash")
+
+def get_entry_chunk_ids(entry):
+    """Chunk IDs of a registry entry, or None if the entry predates chunk tracking."""
+    return None if isinstance(entry, str) else entry.get("chunk_ids")
+
+def load_checkpoint(space_key: str):
+    """
+    Load the delta-sync checkpoint of a space, or None if it was never synced.
+    A checkpoint looks like: {"last_sync": <ISO-8601 UTC>, "page_ids": [...]}
+    """
+    if not os.path.exists(CHECKPOINT_FILE):
+        return None
+    with open(CHECKPOINT_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f).get(space_key)
+
+def save_checkpoint(space_key: str, checkpoint: dict):
+    """Store the delta-sync checkpoint of a space next to the registry."""
+    with _json_files_lock:
+        checkpoints = {}
+        if os.path.exists(CHECKPOINT_FILE):
+            with open(CHECKPOINT_FILE, 'r', encoding='utf-8') as f:
+                checkpoints = json.load(f)
+        checkpoints[space_key] = checkpoint
+        _write_json_atomically(CHECKPOINT_FILE, checkpoints, indent=2)
+
+def _write_json_atomically(path: str, data, **dump_kwargs):
+    """
+    Write `data` to a temporary file next to `path`, then rename it over
+    `path`, so readers and crashes only ever see the old or the new file.
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, **dump_kwargs)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def get_registry_chunk_ids(registry: DocRegistry, page_ids) -> dict:
+    """
+    The page_id -> chunk-ID index for `page_ids`, taken from the registry.
+    Pages that are unknown or predate chunk tracking are left out.
+    """
+    index = {}
+    for page_id, entry in registry.get_many(page_ids).items():
+        chunk_ids = get_entry_chunk_ids(entry)
+        if chunk_ids is not None:
+            index[page_id] = chunk_ids
+    return index
+
+def load_corpus_version() -> str:
+    """
+    Current version of the ingested corpus; changes whenever ingestion or a
+    deletion modifies the vector store. Used to invalidate cached answers.
+
+    Called for every query, so the file is only read again when it was
+    replaced (by this process or another one) since the last read.
+    """
+    global _corpus_version_cache
+    try:
+        stat = os.stat(CORPUS_VERSION_FILE)
+    except FileNotFoundError:
+        return "0"
+    key = (CORPUS_VERSION_FILE, stat.st_ino, stat.st_mtime_ns)
+    cached_key, version = _corpus_version_cache
+    if key != cached_key:
+        with open(CORPUS_VERSION_FILE, 'r', encoding='utf-8') as f:
+            version = json.load(f).get("version", "0")
+        _corpus_version_cache = (key, version)
+    return version
+
+def bump_corpus_version() -> str:
+    """Record that the corpus changed; returns the new version."""
+    version = uuid.uuid4().hex
+    with _json_files_lock:
+        _write_json_atomically(CORPUS_VERSION_FILE, {"version": version})
+    return version
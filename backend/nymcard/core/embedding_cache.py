@@ -0,0 +1,116 @@
+import os
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .metrics import count_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "embedding_cache.sqlite3")
+)
+
+# SQLite limits the number of bound parameters per statement.
+_LOOKUP_BATCH = 500
+
+
+class EmbeddingCache:
+    """
+    Content-addressed, on-disk store of chunk embeddings.
+
+    Vectors are keyed by SHA-256 of (namespace, text), where the namespace is
+    the embedding model, so a chunk is only ever embedded once per model no
+    matter which page or run it shows up in. Vectors are stored as float32
+    blobs in a single SQLite file shared across runs.
+    """
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Embeddings are computed in worker threads (asyncio.to_thread), so the
+        # connection is shared between threads and guarded by self._lock.
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(namespace: str, text: str) -> str:
+        return hashlib.sha256(f"{namespace}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Return the cached vectors for whichever of `keys` are present."""
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), _LOOKUP_BATCH):
+                batch = keys[i:i + _LOOKUP_BATCH]
+                placeholders = ",".join("?" for _ in batch)
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]):
+        """Store vectors by key; existing keys are left as they are."""
+        if not items:
+            return
+        rows = [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items.items()]
+        with self._lock:
+            self._conn.executemany("INSERT OR IGNORE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that serves document embeddings from an EmbeddingCache
+    and only sends cache misses to the underlying provider. Query embeddings
+    are passed straight through.
+    """
+
+    def __init__(self, underlying: Embeddings, cache: EmbeddingCache, namespace: Optional[str] = None):
+        self.underlying = underlying
+        self.cache = cache
+        self.namespace = namespace or getattr(underlying, "model", type(underlying).__name__)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [EmbeddingCache.make_key(self.namespace, text) for text in texts]
+        cached = self.cache.get_many(list(set(keys)))
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        self.cache.hits += len(texts) - len(missing)
+        self.cache.misses += len(missing)
+        count_cache_lookup("chunk_embeddings", True, len(texts) - len(missing))
+        count_cache_lookup("chunk_embeddings", False, len(missing))
+        if missing:
+            logger.info(f"[EMBED_CACHE] {len(texts) - len(missing)} cached, embedding {len(missing)} new chunks.")
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            fresh = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(fresh)
+            cached.update(fresh)
+
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.underlying.embed_query(text)
@@ -0,0 +1,184 @@
+import os
+import json
+import math
+import hashlib
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .bm25_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+# "openai" (default), "local" (CPU model via onnxruntime) or "hashing".
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "openai").lower()
+OPENAI_EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-ada-002")
+HASHING_EMBEDDING_DIMENSION = int(os.getenv("HASHING_EMBEDDING_DIMENSION", "384"))
+LOCAL_EMBEDDING_BATCH_SIZE = int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", "32"))
+LOCAL_EMBEDDING_THREADS = int(os.getenv("LOCAL_EMBEDDING_THREADS", "2"))
+
+# Output size of OpenAI embedding models at their default dimensions.
+OPENAI_EMBEDDING_DIMENSIONS = {
+    "text-embedding-ada-002": 1536,
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+}
+
+# Written next to the vector store the first time it is opened.
+EMBEDDING_INFO_FILE = "embedding_info.json"
+
+
+@dataclass(frozen=True)
+class EmbeddingSignature:
+    """Which embeddings a vector store holds; None when the dimension is not known up front."""
+    provider: str
+    model: str
+    dimension: Optional[int]
+
+
+class EmbeddingMismatchError(RuntimeError):
+    """The vector store was built with different embeddings than the configured provider."""
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic bag-of-words embeddings. Each token and each pair of
+    adjacent tokens is hashed (BLAKE2b, so stable across processes) to one
+    of `dimension` signed buckets, weighted by 1 + log(tf); the vector is
+    L2-normalized. Texts sharing words land close together. No model and no
+    network, for tests, benchmarks and air-gapped runs.
+    """
+
+    def __init__(self, dimension: int = HASHING_EMBEDDING_DIMENSION):
+        self.dimension = dimension
+        self.model = f"hashing-{dimension}"
+
+    @property
+    def signature(self) -> EmbeddingSignature:
+        return EmbeddingSignature("hashing", self.model, self.dimension)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+    def _embed(self, text: str) -> List[float]:
+        tokens = tokenize(text)
+        features = Counter(tokens)
+        features.update(f"{first} {second}" for first, second in zip(tokens, tokens[1:]))
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for feature, count in features.items():
+            digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+            sign = 1.0 if digest >> 63 else -1.0
+            vector[digest % self.dimension] += sign * (1.0 + math.log(count))
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+
+class LocalEmbeddings(Embeddings):
+    """
+    CPU embeddings from all-MiniLM-L6-v2 (384 dimensions) run by
+    onnxruntime, using the ONNX export chromadb ships. The model is
+    downloaded once to ~/.cache/chroma/onnx_models; copy that directory to
+    run on an air-gapped host.
+
+    Documents are split into micro-batches of `batch_size` that run on a
+    pool of `threads` threads (onnxruntime releases the GIL).
+
+    embed_query() never waits for company: a query arriving while no other
+    is being encoded is encoded at once. Queries arriving while one is
+    encoded queue up, and are encoded together (up to `batch_size`) as soon
+    as it is done, by the thread that encoded it.
+    """
+
+    model = "all-MiniLM-L6-v2"
+    dimension = 384
+
+    def __init__(self, batch_size: int = LOCAL_EMBEDDING_BATCH_SIZE, threads: int = LOCAL_EMBEDDING_THREADS):
+        from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2
+
+        self.batch_size = max(1, batch_size)
+        self._model = ONNXMiniLM_L6_V2()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix="local-embed")
+        self._queries: List[Tuple[str, Future]] = []
+        self._queries_lock = threading.Lock()
+        self._encoding_queries = False
+
+    @property
+    def signature(self) -> EmbeddingSignature:
+        return EmbeddingSignature("local", self.model, self.dimension)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) <= 1:
+            return self._encode(texts)
+        return [vector for batch in self._pool.map(self._encode, batches) for vector in batch]
+
+    def embed_query(self, text: str) -> List[float]:
+        future: Future = Future()
+        with self._queries_lock:
+            self._queries.append((text, future))
+            leader = not self._encoding_queries
+            self._encoding_queries = True
+        if leader:
+            self._drain_queries()
+        return future.result()
+
+    def _drain_queries(self):
+        # Encodes queued queries until none are left; others queue meanwhile.
+        while True:
+            with self._queries_lock:
+                batch, self._queries = self._queries[:self.batch_size], self._queries[self.batch_size:]
+                if not batch:
+                    self._encoding_queries = False
+                    return
+            try:
+                for (_, waiting), vector in zip(batch, self._encode([query for query, _ in batch])):
+                    waiting.set_result(vector)
+            except Exception as e:
+                for _, waiting in batch:
+                    if not waiting.done():
+                        waiting.set_exception(e)
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return np.asarray(self._model(texts), dtype=np.float32).tolist()
+
+
+def check_embedding_signature(directory: str, signature: EmbeddingSignature) -> EmbeddingSignature:
+    """
+    Compare the embeddings configured now with those recorded for the
+    vector store in `directory`, and record them if the store has no record
+    yet (new stores, and stores created before records were kept). Raises
+    EmbeddingMismatchError on a different provider, model or dimension.
+    """
+    path = os.path.join(directory, EMBEDDING_INFO_FILE)
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(asdict(signature), f, indent=2)
+        logger.info(f"[EMBEDDINGS] Recorded {signature} for the vector store at {directory}.")
+        return signature
+
+    with open(path, "r", encoding="utf-8") as f:
+        recorded = EmbeddingSignature(**json.load(f))
+    dimensions_differ = (
+        recorded.dimension is not None and signature.dimension is not None
+        and recorded.dimension != signature.dimension
+    )
+    if (recorded.provider, recorded.model) != (signature.provider, signature.model) or dimensions_differ:
+        raise EmbeddingMismatchError(
+            f"The vector store at {directory} holds {recorded.provider}/{recorded.model} embeddings "
+            f"({recorded.dimension} dims), but {signature.provider}/{signature.model} "
+            f"({signature.dimension} dims) is configured. Restore the original embedding settings, "
+            f"or ingest into a new vector store directory."
+        )
+    return recorded
@@ -0,0 +1,169 @@
+import os
+import re
+import sqlite3
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+from ..utils.helpers import extract_urls, extract_phone_numbers
+
+logger = logging.getLogger(__name__)
+
+ENTITY_INDEX_PATH = os.getenv(
+    "ENTITY_INDEX_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "entity_index.sqlite3")
+)
+
+URL = "url"
+PHONE = "phone"
+
+# Sentence punctuation that ends up glued to URLs in running text.
+_URL_TRAILING = ".,;:!?)]}>'\""
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+_NON_DIGIT = re.compile(r"\D")
+
+
+def normalize_url(url: str) -> Optional[str]:
+    """
+    Lookup form of a URL: lower-case scheme and host, no default port, no
+    trailing slash or fragment. None if it has no host.
+    """
+    try:
+        parts = urlsplit(url.rstrip(_URL_TRAILING))
+        port = parts.port
+    except ValueError:
+        return None
+    if not parts.hostname:
+        return None
+    scheme = parts.scheme.lower()
+    netloc = parts.hostname.lower()
+    if port and port != _DEFAULT_PORTS.get(scheme):
+        netloc = f"{netloc}:{port}"
+    return urlunsplit((scheme, netloc, parts.path.rstrip("/"), parts.query, ""))
+
+
+def normalize_phone(phone: str) -> Optional[str]:
+    """
+    Lookup form of a phone number: its digits, with a leading '+' kept.
+    None unless it has 7 to 15 digits (E.164 allows at most 15), which
+    weeds out dates and short IDs the extraction regex also matches.
+    """
+    digits = _NON_DIGIT.sub("", phone)
+    if not 7 <= len(digits) <= 15:
+        return None
+    return f"+{digits}" if phone.lstrip().startswith("+") else digits
+
+
+def extract_entities(text: str) -> List[Tuple[str, str, str]]:
+    """(type, normalized value, value as written) for each URL and phone number in `text`."""
+    entities = []
+    for url in extract_urls(text):
+        value = normalize_url(url)
+        if value:
+            entities.append((URL, value, url.rstrip(_URL_TRAILING)))
+    for phone in extract_phone_numbers(text):
+        value = normalize_phone(phone)
+        if value:
+            entities.append((PHONE, value, phone.strip()))
+    return entities
+
+
+class EntityIndex:
+    """
+    On-disk index of the URLs and phone numbers found in stored chunks:
+    entity type -> normalized value -> chunk and page IDs.
+
+    Entities are extracted once, when ingestion stores a chunk, and removed
+    with it, like the BM25 index. Answering a URL or phone question is then a
+    lookup over the whole corpus instead of a regex scan of the retrieved
+    chunks.
+    """
+
+    def __init__(self, path: str = ENTITY_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Updated from worker threads during ingest, so guard with self._lock.
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS entities (
+                type TEXT NOT NULL,
+                value TEXT NOT NULL,
+                chunk_id TEXT NOT NULL,
+                page_id TEXT,
+                display TEXT NOT NULL,
+                PRIMARY KEY (type, value, chunk_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS entities_by_chunk ON entities (chunk_id);
+            CREATE INDEX IF NOT EXISTS entities_by_page ON entities (page_id, type);
+            """
+        )
+        self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(DISTINCT type || ' ' || value) FROM entities").fetchone()[0]
+
+    def add_chunks(self, chunk_ids: List[str], texts: List[str], metadatas: List[Dict] = None):
+        """Index the entities of chunks by ID, replacing any earlier version of the same IDs."""
+        metadatas = metadatas or [{} for _ in texts]
+        rows = []
+        for chunk_id, text, meta in zip(chunk_ids, texts, metadatas):
+            for entity_type, value, display in extract_entities(text):
+                rows.append((entity_type, value, chunk_id, meta.get("page_id"), display))
+        rows.sort()
+        with self._lock:
+            self._delete_locked(chunk_ids)
+            self._conn.executemany("INSERT OR IGNORE INTO entities VALUES (?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+        logger.debug(f"[ENTITY_INDEX] Indexed {len(rows)} entities from {len(chunk_ids)} chunks.")
+
+    def remove_chunks(self, chunk_ids: List[str]):
+        """Drop the entities of chunks; unknown IDs are ignored."""
+        with self._lock:
+            self._delete_locked(chunk_ids)
+            self._conn.commit()
+
+    def _delete_locked(self, chunk_ids: Iterable[str]):
+        self._conn.executemany("DELETE FROM entities WHERE chunk_id = ?", ((chunk_id,) for chunk_id in chunk_ids))
+
+    def lookup(self, entity_type: str, page_ids: List[str] = (), terms: List[str] = (),
+               limit: int = 20) -> List[Tuple[str, Dict]]:
+        """
+        Entities of `entity_type` as (text as written, metadata) pairs, each
+        value once: first those on `page_ids` (in the given order, e.g. the
+        pages of the best retrieval hits), then any in the corpus whose
+        normalized value contains one of `terms` ("sandbox" finds
+        https://sandbox.example.com).
+        """
+        found: Dict[str, Tuple[str, Dict]] = {}
+        with self._lock:
+            for page_id in page_ids:
+                rows = self._conn.execute(
+                    "SELECT value, display, page_id FROM entities WHERE page_id = ? AND type = ? ORDER BY value",
+                    (page_id, entity_type)
+                ).fetchall()
+                self._collect(found, entity_type, rows, limit)
+            for term in terms:
+                rows = self._conn.execute(
+                    "SELECT value, display, page_id FROM entities WHERE type = ? AND instr(lower(value), ?) > 0 "
+                    "ORDER BY value",
+                    (entity_type, term.lower())
+                ).fetchall()
+                self._collect(found, entity_type, rows, limit)
+        return list(found.values())
+
+    @staticmethod
+    def _collect(found: Dict[str, Tuple[str, Dict]], entity_type: str, rows, limit: int):
+        for value, display, page_id in rows:
+            if len(found) >= limit:
+                return
+            if value not in found:
+                found[value] = (display, {"type": f"{entity_type}_extraction", "value": value, "page_id": page_id})
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,49 +1,85 @@
-
+import re
+import asyncio
 import logging
-from typing import List, Tuple, Dict
+from typing import List, Optional, Tuple, Dict
 
 from .vectorstore_manager import VectorStoreManager
+from .bm25_index import BM25Index, tokenize
+from .entity_index import EntityIndex, URL, PHONE
+from .reranker import Reranker, RERANK_CANDIDATES
+from .metrics import span
 from ..utils.helpers import extract_urls, extract_phone_numbers
 
 logger = logging.getLogger(__name__)
 
+# Reciprocal rank fusion constant (Cormack et al.); dampens the weight of top ranks.
+RRF_K = 60
+# Queries this short that name an identifier are answered from the BM25 index alone.
+LEXICAL_QUERY_MAX_WORDS = 4
+# Error codes, BINs, API fields: anything with a digit, an underscore or a dot
+# inside a word, or an all-caps code.
+_IDENTIFIER_PATTERN = re.compile(r"\b(?:\w*\d\w*|\w+_\w+|\w+\.\w+|[A-Z]{2,}[A-Z0-9]*)\b")
+
+_URL_KEYWORDS = ['url', 'link', 'website', 'endpoint']
+_PHONE_KEYWORDS = ['phone', 'contact number', 'telephone', 'contact']
+# Query words that only say which kind of entity is wanted; the remaining
+# words are matched against entity values ("sandbox url" -> "sandbox").
+_ENTITY_QUERY_WORDS = frozenset(
+    " ".join(_URL_KEYWORDS + _PHONE_KEYWORDS).split() + "urls links websites endpoints number numbers".split()
+)
+_MIN_ENTITY_TERM_LENGTH = 3
+# Most entities of one kind added to the context.
+ENTITY_LOOKUP_LIMIT = 20
+
 
 class HybridRetriever:
-    def __init__(self, vectorstore_manager: VectorStoreManager, all_docs_text: List[str] = None):
+    def __init__(self, vectorstore_manager: VectorStoreManager, lexical_index: BM25Index = None,
+                 entity_index: EntityIndex = None, k: int = 5, reranker: Optional[Reranker] = None,
+                 candidates: int = RERANK_CANDIDATES):
         self.vs_manager = vectorstore_manager
-        self.all_docs_text = all_docs_text or []
+        self.lexical_index = lexical_index
+        self.entity_index = entity_index
+        self.k = k
+        self.reranker = reranker
+        # With a reranker, each retriever fetches `candidates` results for it to choose from.
+        self.first_stage_k = max(k, candidates) if reranker is not None else k
 
     async def retrieve(self, query: str) -> List[Tuple[str, Dict]]:
         """
-        Always runs embedding-based doc retrieval,
-        then specialized extraction (URL/phone) if the query indicates so.
+        Runs embedding-based and (if an index is configured) BM25 retrieval and
+        fuses both rankings with reciprocal rank fusion, then specialized
+        extraction (URL/phone) if the query indicates so. Short identifier
+        queries that BM25 can answer skip the embedding call entirely.
+        URLs and phone numbers come from the entity index when one is
+        configured, otherwise from scanning the retrieved chunks.
+
+        With a reranker, both retrievers cast a wider net and the reranker
+        keeps the few fused results that really match the query.
         """
         logger.info(f"[HybridRetriever] Processing query: {query}")
 
-        # 1) Embedding-based doc retrieval
-        embed_results = await self.embedding_search(query)
-        logger.info(f"[HybridRetriever] Found {len(embed_results)} embed-based docs.")
+        # 1) Lexical + embedding-based doc retrieval
+        with span("retriever.lexical"):
+            lexical_results = await asyncio.to_thread(self.lexical_search, query)
+        if lexical_results and self.is_lexical_query(query):
+            embed_results = lexical_results
+            logger.info(f"[HybridRetriever] Lexical query, {len(embed_results)} BM25 docs, no embedding call.")
+        else:
+            with span("retriever.embedding"):
+                embed_results = await self.embedding_search(query)
+            logger.info(f"[HybridRetriever] Found {len(embed_results)} embed-based docs.")
+            if lexical_results:
+                embed_results = self.reciprocal_rank_fusion([embed_results, lexical_results])[:self.first_stage_k]
+                logger.info(f"[HybridRetriever] Fused with {len(lexical_results)} BM25 docs.")
+        if self.reranker is not None:
+            with span("retriever.rerank"):
+                candidate_count = len(embed_results)
+                embed_results = await asyncio.to_thread(self.reranker.rerank, query, embed_results)
+            logger.info(f"[HybridRetriever] Reranked {candidate_count} candidates, kept {len(embed_results)}.")
 
         # 2) Specialized extractions based on query
-        specialized_extractions: List[Tuple[str, Dict]] = []
-
-        if self.is_url_query(query):
-            urls = []
-            for doc_text, _, _ in embed_results:
-                extracted = extract_urls(doc_text)
-                for url in extracted:
-                    urls.append((url, {"type": "url_extraction"}))
-            specialized_extractions.extend(urls)
-            logger.info(f"[HybridRetriever] Extracted {len(urls)} URLs.")
-
-        if self.is_phone_query(query):
-            phones = []
-            for doc_text, _, _ in embed_results:
-                extracted = extract_phone_numbers(doc_text)
-                for phone in extracted:
-                    phones.append((phone, {"type": "phone_extraction"}))
-            specialized_extractions.extend(phones)
-            logger.info(f"[HybridRetriever] Extracted {len(phones)} phone numbers.")
+        with span("retriever.entities"):
+            specialized_extractions = await self._extract_entities(query, embed_results)
 
         # 3) Combine embedding results with specialized extractions
         unified_results: List[Tuple[str, Dict]] = []
@@ -58,29 +94,116 @@ class HybridRetriever:
 
         return unified_results
 
+    async def _extract_entities(self, query: str, embed_results: List[Tuple[str, Dict, float]]) -> List[Tuple[str, Dict]]:
+        """
+        URLs and/or phone numbers for the context, if the query asks for them.
+        The retrieved chunks are scanned when there is no entity index, or
+        when it has none to offer (e.g. a store ingested before it existed).
+        """
+        specialized_extractions: List[Tuple[str, Dict]] = []
+
+        if self.is_url_query(query):
+            urls = await self._entity_lookup(URL, query, embed_results)
+            if not urls:
+                urls = self._scan_results(extract_urls, "url_extraction", embed_results)
+            specialized_extractions.extend(urls)
+            logger.info(f"[HybridRetriever] Extracted {len(urls)} URLs.")
+
+        if self.is_phone_query(query):
+            phones = await self._entity_lookup(PHONE, query, embed_results)
+            if not phones:
+                phones = self._scan_results(extract_phone_numbers, "phone_extraction", embed_results)
+            specialized_extractions.extend(phones)
+            logger.info(f"[HybridRetriever] Extracted {len(phones)} phone numbers.")
+
+        return specialized_extractions
+
+    async def _entity_lookup(self, entity_type: str, query: str,
+                             results: List[Tuple[str, Dict, float]]) -> List[Tuple[str, Dict]]:
+        # The lookup scans SQLite under the index lock; keep it off the event loop.
+        if self.entity_index is None:
+            return []
+        return await asyncio.to_thread(self.entity_lookup, entity_type, query, results)
+
+    @staticmethod
+    def _scan_results(extract, extraction_type: str,
+                      results: List[Tuple[str, Dict, float]]) -> List[Tuple[str, Dict]]:
+        return [
+            (value, {"type": extraction_type})
+            for doc_text, _, _ in results
+            for value in extract(doc_text)
+        ]
+
     async def embedding_search(self, query: str) -> List[Tuple[str, Dict, float]]:
         """
         Perform embedding-based similarity search.
         Returns list of (doc_text, metadata, score)
         """
         logger.info(f"[HybridRetriever] Doing embedding search for: {query}")
-        search_results = await self.vs_manager.similarity_search_with_scores(query, k=5)
+        search_results = await self.vs_manager.similarity_search_with_scores(query, k=self.first_stage_k)
         if search_results:
             # search_results is a list of (doc_text, metadata, score)
             return search_results
         else:
             return []
 
+    def lexical_search(self, query: str) -> List[Tuple[str, Dict, float]]:
+        """
+        BM25 search over the on-disk inverted index.
+        Returns list of (doc_text, metadata, score), or [] without an index.
+        """
+        if self.lexical_index is None:
+            return []
+        return self.lexical_index.search(query, k=self.first_stage_k)
+
+    def entity_lookup(self, entity_type: str, query: str,
+                      results: List[Tuple[str, Dict, float]]) -> List[Tuple[str, Dict]]:
+        """
+        Entities from the index: those on the pages of `results` (best hit
+        first), then any in the corpus matching the other words of the query.
+        """
+        page_ids = []
+        for _, md, _ in results:
+            page_id = md.get("page_id")
+            if page_id and page_id not in page_ids:
+                page_ids.append(page_id)
+        terms = [
+            term for term in dict.fromkeys(tokenize(query))
+            if term not in _ENTITY_QUERY_WORDS and len(term) >= _MIN_ENTITY_TERM_LENGTH
+        ]
+        return self.entity_index.lookup(entity_type, page_ids=page_ids, terms=terms, limit=ENTITY_LOOKUP_LIMIT)
+
+    @staticmethod
+    def reciprocal_rank_fusion(rankings: List[List[Tuple[str, Dict, float]]]) -> List[Tuple[str, Dict, float]]:
+        """
+        Merge several ranked lists into one; each result scores
+        sum(1 / (RRF_K + rank)) over the lists it appears in. Results are
+        matched by chunk_id, or by text for chunks stored without one.
+        """
+        fused: Dict[str, List] = {}
+        for ranking in rankings:
+            for rank, (doc_text, md, _) in enumerate(ranking, start=1):
+                key = md.get("chunk_id") or doc_text
+                if key not in fused:
+                    fused[key] = [doc_text, md, 0.0]
+                fused[key][2] += 1.0 / (RRF_K + rank)
+        return sorted((tuple(item) for item in fused.values()), key=lambda item: item[2], reverse=True)
+
+    def is_lexical_query(self, query: str) -> bool:
+        """
+        Determine if the query is a short lookup of an exact identifier
+        (error code, BIN, API field name).
+        """
+        return len(query.split()) <= LEXICAL_QUERY_MAX_WORDS and bool(_IDENTIFIER_PATTERN.search(query))
+
     def is_url_query(self, query: str) -> bool:
         """
         Determine if the query is about URLs.
         """
-        keywords = ['url', 'link', 'website', 'endpoint']
-        return any(keyword in query.lower() for keyword in keywords)
+        return any(keyword in query.lower() for keyword in _URL_KEYWORDS)
 
     def is_phone_query(self, query: str) -> bool:
         """
         Determine if the query is about phone numbers.
         """
-        keywords = ['phone', 'contact number', 'telephone', 'contact']
-        return any(keyword in query.lower() for keyword in keywords)
\ No newline at end of file
+        return any(keyword in query.lower() for keyword in _PHONE_KEYWORDS)
\ No newline at end of file
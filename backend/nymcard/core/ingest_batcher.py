@@ -0,0 +1,203 @@
+import os
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from .metrics import span
+from ..utils.helpers import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# OpenAI caps an embeddings request at 2048 inputs and 300k tokens in total;
+# stay comfortably below both by default.
+EMBED_BATCH_MAX_TOKENS = int(os.getenv("EMBED_BATCH_MAX_TOKENS", "100000"))
+EMBED_BATCH_MAX_TEXTS = int(os.getenv("EMBED_BATCH_MAX_TEXTS", "1000"))
+EMBED_MAX_CONCURRENCY = int(os.getenv("EMBED_MAX_CONCURRENCY", "4"))
+EMBED_PERSIST_EVERY = int(os.getenv("EMBED_PERSIST_EVERY", "16"))
+
+
+@dataclass
+class BatchFailure:
+    """One embedding batch that could not be stored."""
+    batch_index: int
+    page_ids: List[str]
+    chunk_count: int
+    error: str
+
+
+@dataclass
+class IngestReport:
+    """Outcome of an IngestBatcher run."""
+    embedded_pages: Set[str] = field(default_factory=set)
+    failed_pages: Set[str] = field(default_factory=set)
+    batch_count: int = 0
+    chunk_count: int = 0
+    failures: List[BatchFailure] = field(default_factory=list)
+
+
+class IngestBatcher:
+    """
+    Collects chunks across pages into token-aware embedding batches.
+
+    Pages are added one by one; whenever the pending chunks reach the token or
+    text limit they are sent to the vector store as a single batch. At most
+    `max_concurrency` batches are in flight, and add_page() waits for a free
+    slot, which throttles the fetch side of the pipeline. The store is
+    persisted once every `persist_every` completed batches and once more on
+    close(). A page counts as embedded only when every batch holding one of
+    its chunks succeeded.
+
+    If `on_pages_stored` is given, it is awaited after each persist with the
+    pages that became fully embedded since the previous one, so they can be
+    recorded while the run is still going.
+    """
+
+    def __init__(self, vs_manager, max_batch_tokens: int = EMBED_BATCH_MAX_TOKENS,
+                 max_batch_texts: int = EMBED_BATCH_MAX_TEXTS,
+                 max_concurrency: int = EMBED_MAX_CONCURRENCY,
+                 persist_every: int = EMBED_PERSIST_EVERY,
+                 on_pages_stored: Optional[Callable[[List[str]], Awaitable[None]]] = None):
+        self.vs_manager = vs_manager
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_texts = max_batch_texts
+        self.persist_every = max(1, persist_every)
+        self.on_pages_stored = on_pages_stored
+
+        self._slots = asyncio.Semaphore(max(1, max_concurrency))
+        self._persist_lock = asyncio.Lock()
+        self._tasks: Set[asyncio.Task] = set()
+
+        self._texts: List[str] = []
+        self._metadatas: List[Dict] = []
+        self._page_ids: List[str] = []
+        self._ids: List[str] = []
+        self._tokens = 0
+
+        self._pages_added: Set[str] = set()
+        self._batches_since_persist = 0
+        self.report = IngestReport()
+
+        # Page completion tracking for on_pages_stored: batches in flight per
+        # page, pages with chunks in the unsent batch, and the page being added.
+        self._outstanding: Dict[str, int] = {}
+        self._buffered_pages: Set[str] = set()
+        self._adding_page: Optional[str] = None
+        self._stored_pages: List[str] = []
+
+    async def add_page(self, page_id: str, texts: List[str], metadatas: List[Dict], ids: List[str] = None):
+        """
+        Queue all chunks of one page, optionally under explicit chunk IDs.
+        May dispatch one or more full batches.
+        """
+        self._pages_added.add(page_id)
+        self._adding_page = page_id
+        if ids is None:
+            ids = [None] * len(texts)
+        for text, meta, chunk_id in zip(texts, metadatas, ids):
+            tokens = count_tokens(text)
+            if self._texts and (
+                self._tokens + tokens > self.max_batch_tokens
+                or len(self._texts) >= self.max_batch_texts
+            ):
+                await self._dispatch()
+            self._texts.append(text)
+            self._metadatas.append(meta)
+            self._page_ids.append(page_id)
+            self._ids.append(chunk_id)
+            self._tokens += tokens
+            self._buffered_pages.add(page_id)
+        self._adding_page = None
+        self._maybe_stored(page_id)
+
+    async def close(self) -> IngestReport:
+        """
+        Send the last partial batch, wait for every batch, persist, and return
+        the run report.
+        """
+        if self._texts:
+            await self._dispatch()
+        if self._tasks:
+            await asyncio.gather(*self._tasks)
+        if self._batches_since_persist:
+            await self._persist()
+        else:
+            await self._flush_stored_pages()
+
+        self.report.embedded_pages = self._pages_added - self.report.failed_pages
+        for failure in self.report.failures:
+            logger.error(
+                f"[INGEST_BATCHER] Batch {failure.batch_index} failed "
+                f"({failure.chunk_count} chunks, pages={failure.page_ids}): {failure.error}"
+            )
+        logger.info(
+            f"[INGEST_BATCHER] {self.report.batch_count} batches, {self.report.chunk_count} chunks, "
+            f"{len(self.report.embedded_pages)} pages embedded, {len(self.report.failed_pages)} failed."
+        )
+        return self.report
+
+    async def _dispatch(self):
+        texts, metadatas, page_ids, ids = self._texts, self._metadatas, self._page_ids, self._ids
+        self._texts, self._metadatas, self._page_ids, self._ids = [], [], [], []
+        self._tokens = 0
+        for page_id in self._buffered_pages:
+            self._outstanding[page_id] = self._outstanding.get(page_id, 0) + 1
+        self._buffered_pages = set()
+        # Chroma needs either an ID for every text or none at all.
+        if any(chunk_id is None for chunk_id in ids):
+            ids = None
+
+        batch_index = self.report.batch_count
+        self.report.batch_count += 1
+        self.report.chunk_count += len(texts)
+
+        await self._slots.acquire()
+        task = asyncio.create_task(self._run_batch(batch_index, texts, metadatas, page_ids, ids))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch_index: int, texts: List[str], metadatas: List[Dict],
+                         page_ids: List[str], ids: List[str] = None):
+        try:
+            with span("ingest.embed_batch"):
+                await self.vs_manager.add_text_batch(texts, metadatas, ids=ids)
+        except Exception as e:
+            batch_pages = sorted(set(page_ids))
+            self.report.failed_pages.update(batch_pages)
+            self.report.failures.append(BatchFailure(
+                batch_index=batch_index,
+                page_ids=batch_pages,
+                chunk_count=len(texts),
+                error=str(e)
+            ))
+            return
+        finally:
+            self._slots.release()
+            for page_id in set(page_ids):
+                self._outstanding[page_id] -= 1
+                if not self._outstanding[page_id]:
+                    del self._outstanding[page_id]
+                self._maybe_stored(page_id)
+
+        self._batches_since_persist += 1
+        if self._batches_since_persist >= self.persist_every:
+            await self._persist()
+
+    async def _persist(self):
+        async with self._persist_lock:
+            self._batches_since_persist = 0
+            with span("ingest.persist"):
+                await self.vs_manager.persist()
+            await self._flush_stored_pages()
+
+    def _maybe_stored(self, page_id: str):
+        """Note a page as stored once none of its chunks are pending, queued or still being added."""
+        if (self.on_pages_stored is not None and page_id != self._adding_page
+                and page_id not in self._buffered_pages and page_id not in self._outstanding
+                and page_id not in self.report.failed_pages):
+            self._stored_pages.append(page_id)
+
+    async def _flush_stored_pages(self):
+        if self._stored_pages:
+            pages, self._stored_pages = self._stored_pages, []
+            await self.on_pages_stored(pages)
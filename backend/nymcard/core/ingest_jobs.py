@@ -0,0 +1,209 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field, asdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .metrics import INGEST_JOBS
+
+logger = logging.getLogger(__name__)
+
+# Spaces ingested at the same time; further jobs wait in the queue.
+INGEST_MAX_CONCURRENT_JOBS = int(os.getenv("INGEST_MAX_CONCURRENT_JOBS", "2"))
+# Finished jobs kept for GET /ingest/jobs.
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", "100"))
+# Periodic delta refresh, e.g. "TD=3600,OPS=86400" (space key = seconds).
+INGEST_SCHEDULE = os.getenv("INGEST_SCHEDULE", "")
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+# Messages kept per job; the counters still count every error.
+MAX_JOB_ERRORS = 20
+
+
+def parse_schedule(value: str) -> Dict[str, float]:
+    """Space key -> refresh interval in seconds, from "TD=3600,OPS=86400"."""
+    schedule = {}
+    for item in value.split(","):
+        space_key, _, seconds = item.partition("=")
+        if not space_key.strip():
+            continue
+        try:
+            schedule[space_key.strip()] = float(seconds)
+        except ValueError:
+            logger.warning(f"[INGEST_JOBS] Ignoring bad INGEST_SCHEDULE entry {item!r}.")
+    return {space_key: seconds for space_key, seconds in schedule.items() if seconds > 0}
+
+
+@dataclass
+class IngestProgress:
+    """Running counts of one ingestion, updated by fetch_and_ingest_pages."""
+    fetched: int = 0
+    processed: int = 0
+    embedded: int = 0
+    unchanged: int = 0
+    deleted: int = 0
+    failed: int = 0
+    errors: List[str] = field(default_factory=list)
+
+    def add_error(self, message: str):
+        if len(self.errors) < MAX_JOB_ERRORS:
+            self.errors.append(message)
+
+
+@dataclass
+class IngestJob:
+    """One ingestion of a space, as reported by the status endpoint."""
+    id: str
+    space_key: str
+    delta: bool
+    trigger: str
+    status: str = QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    requests: int = 1
+    updated_count: Optional[int] = None
+    error: Optional[str] = None
+    progress: IngestProgress = field(default_factory=IngestProgress)
+
+    @property
+    def done(self) -> bool:
+        return self.status in (SUCCEEDED, FAILED)
+
+    def to_dict(self) -> Dict[str, Any]:
+        job = asdict(self)
+        job["progress"]["errors"] = list(self.progress.errors)
+        return job
+
+
+class IngestScheduler:
+    """
+    Runs ingestion jobs in the background, on an event loop of its own in a
+    daemon thread, so an HTTP request only has to submit one and return.
+
+    `run` is awaited as run(space_key, delta, progress) and returns the
+    number of pages embedded. At most `max_concurrent` jobs run at once;
+    the rest wait in order of submission. A space has at most one queued
+    and one running job: a request for a space that already has a job
+    joins it instead of starting a second ingestion. A full request joins
+    a queued delta job by turning it into a full one, but not a running
+    delta job, which has already chosen what to fetch.
+
+    schedule() submits a delta job for a space every `interval` seconds,
+    through the same path, so a refresh never overlaps another ingestion
+    of that space.
+    """
+
+    def __init__(self, run: Callable[[str, bool, IngestProgress], Awaitable[int]],
+                 max_concurrent: int = INGEST_MAX_CONCURRENT_JOBS, history: int = INGEST_JOB_HISTORY):
+        self.run = run
+        self.max_concurrent = max(1, max_concurrent)
+        self.history = max(0, history)
+        self._jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._queued: Dict[str, IngestJob] = {}
+        self._running: Dict[str, IngestJob] = {}
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        # Created on the scheduler loop, and only used there.
+        self._slots = None
+        self._space_locks: Dict[str, asyncio.Lock] = {}
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        # Called with self._lock held.
+        if self._loop is None:
+            loop = asyncio.new_event_loop()
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+            self._space_locks = {}
+            self._thread = threading.Thread(target=loop.run_forever, name="ingest-scheduler", daemon=True)
+            self._thread.start()
+            self._loop = loop
+        return self._loop
+
+    def submit(self, space_key: str, delta: bool = False, trigger: str = "api") -> IngestJob:
+        """Queue an ingestion of `space_key`, or join the one already waiting or running."""
+        with self._lock:
+            job = self._queued.get(space_key)
+            if job is None and space_key in self._running and (delta or not self._running[space_key].delta):
+                job = self._running[space_key]
+            if job is not None:
+                job.requests += 1
+                job.delta = job.delta and delta
+                logger.info(f"[INGEST_JOBS] Request for '{space_key}' joined job {job.id} ({job.status}).")
+                return job
+
+            job = IngestJob(id=uuid.uuid4().hex, space_key=space_key, delta=delta, trigger=trigger)
+            self._queued[space_key] = job
+            self._jobs[job.id] = job
+            self._forget_finished()
+            loop = self._ensure_started()
+        logger.info(f"[INGEST_JOBS] Queued job {job.id} for '{space_key}' (delta={delta}, trigger={trigger}).")
+        asyncio.run_coroutine_threadsafe(self._run_job(job), loop)
+        return job
+
+    def schedule(self, space_key: str, interval: float):
+        """Refresh `space_key` with a delta job every `interval` seconds."""
+        with self._lock:
+            loop = self._ensure_started()
+        logger.info(f"[INGEST_JOBS] Refreshing '{space_key}' every {interval:g}s.")
+        asyncio.run_coroutine_threadsafe(self._refresh_periodically(space_key, interval), loop)
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self) -> List[IngestJob]:
+        """Known jobs, most recent first."""
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+
+    def stop(self):
+        """Stop the scheduler thread; running jobs are abandoned."""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.stop)
+            self._thread.join()
+
+    async def _run_job(self, job: IngestJob):
+        # A job queued behind a running one for the same space waits for it
+        # before taking one of the global slots.
+        space_lock = self._space_locks.setdefault(job.space_key, asyncio.Lock())
+        async with space_lock, self._slots:
+            with self._lock:
+                del self._queued[job.space_key]
+                self._running[job.space_key] = job
+                job.status, job.started_at = RUNNING, time.time()
+                delta = job.delta
+            logger.info(f"[INGEST_JOBS] Starting job {job.id} for '{job.space_key}'.")
+            try:
+                job.updated_count = await self.run(job.space_key, delta, job.progress)
+                job.status = SUCCEEDED
+            except Exception as e:
+                logger.error(f"[INGEST_JOBS] Job {job.id} for '{job.space_key}' failed: {e}", exc_info=True)
+                job.error = f"{type(e).__name__}: {e}"
+                job.status = FAILED
+            finally:
+                with self._lock:
+                    del self._running[job.space_key]
+                    job.finished_at = time.time()
+                    self._forget_finished()
+        INGEST_JOBS.inc(result=job.status)
+        logger.info(f"[INGEST_JOBS] Job {job.id} for '{job.space_key}' {job.status} "
+                    f"in {job.finished_at - job.started_at:.1f}s.")
+
+    async def _refresh_periodically(self, space_key: str, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            self.submit(space_key, delta=True, trigger="schedule")
+
+    def _forget_finished(self):
+        # Called with self._lock held; unfinished jobs are always kept.
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[job_id]
@@ -0,0 +1,190 @@
+import time
+import bisect
+import threading
+from typing import Dict, List, Sequence, Tuple
+
+# Content type of the Prometheus text exposition format served at /metrics.
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds, in seconds, of the latency histogram buckets: from a cache
+# lookup to a slow LLM call or a full ingestion run.
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """Monotonic count per combination of label values."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(tuple(labels[name] for name in self.labelnames), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values]
+
+
+class Histogram:
+    """Observations per combination of label values, counted into fixed buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [count per bucket (last is +Inf), sum, count]
+        self._values: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            entry = self._values.get(tuple(labels[name] for name in self.labelnames))
+            return entry[2] if entry else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, ([*counts], total, count)) for key, (counts, total, count) in self._values.items())
+        lines = []
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                le = 'le="{}"'.format(bound if bound == "+Inf" else _format_value(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """The metrics of the process, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {_escape(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "nymcard_stage_seconds", "Time spent in each stage of querying and ingestion.", ["stage"]
+)
+STAGE_ERRORS = REGISTRY.counter("nymcard_stage_errors_total", "Stages that ended with an exception.", ["stage"])
+LLM_TOKENS = REGISTRY.counter(
+    "nymcard_llm_tokens_total", "Tokens sent to (in) and generated by (out) the chat model.", ["direction"]
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    "nymcard_cache_requests_total", "Cache lookups by cache and result (hit or miss).", ["cache", "result"]
+)
+INGEST_PAGES = REGISTRY.counter(
+    "nymcard_ingest_pages_total", "Pages seen by ingestion, by outcome.", ["result"]
+)
+INGEST_ATTACHMENTS = REGISTRY.counter(
+    "nymcard_ingest_attachments_total", "Attachments seen by ingestion, by outcome.", ["result"]
+)
+CONFLUENCE_REQUESTS = REGISTRY.counter(
+    "nymcard_confluence_requests_total", "Confluence requests by result (ok, throttled or error).", ["result"]
+)
+INGEST_JOBS = REGISTRY.counter(
+    "nymcard_ingest_jobs_total", "Ingestion jobs by outcome (succeeded or failed).", ["result"]
+)
+
+
+class span:
+    """
+    Times a block into STAGE_SECONDS under `stage`, and counts it in
+    STAGE_ERRORS if it raises an Exception, which is not suppressed. Works
+    in both sync and async code:
+
+        with span("pipeline.llm"):
+            response = await ...
+    """
+
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        STAGE_SECONDS.observe(time.perf_counter() - self.start, stage=self.stage)
+        # GeneratorExit and CancelledError mean the caller went away, not a failure.
+        if exc_type is not None and issubclass(exc_type, Exception):
+            STAGE_ERRORS.inc(stage=self.stage)
+        return False
+
+
+def count_cache_lookup(cache: str, hit: bool, amount: int = 1):
+    CACHE_REQUESTS.inc(amount, cache=cache, result="hit" if hit else "miss")
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
@@ -0,0 +1,432 @@
+import os
+import json
+import uuid
+import sqlite3
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain.schema import Document
+
+logger = logging.getLogger(__name__)
+
+# 0 searches every vector; otherwise the number of IVF lists (k-means cells).
+NUMPY_IVF_LISTS = int(os.getenv("NUMPY_IVF_LISTS", "0"))
+# Lists scanned per query in IVF mode; more lists, better recall, slower.
+NUMPY_IVF_PROBE = int(os.getenv("NUMPY_IVF_PROBE", "8"))
+
+_INITIAL_CAPACITY = 1024
+# k-means needs enough points per cell to be meaningful (FAISS warns below 39).
+_MIN_POINTS_PER_LIST = 39
+_KMEANS_SAMPLE_PER_LIST = 256
+_KMEANS_ITERATIONS = 10
+# Rows copied or scored at a time when rewriting or assigning the whole file.
+_BLOCK_ROWS = 65536
+# Tombstoned rows are reclaimed once they outnumber the live ones.
+_COMPACT_MIN_TOMBSTONES = 1024
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class NumpyVectorIndex:
+    """
+    In-process vector index for VectorStoreManager.
+
+    Embeddings are L2-normalized and stored as float32 rows of a
+    memory-mapped .npy file, so the OS pages them in on demand instead of
+    the process holding them on its heap. Chunk text and metadata live in a
+    SQLite table next to it. A query is one matrix-vector product over the
+    file and an argpartition for the top k. With `ivf_lists` > 0, the
+    vectors are also clustered with k-means once there are enough of them,
+    and a query only scores the rows of the `ivf_probe` nearest clusters.
+
+    New chunks are appended; deleted or overwritten chunks are tombstoned
+    and reclaimed by compact(), which runs on its own once tombstones
+    outnumber live rows. Rewrites go to a new file whose name is committed
+    in SQLite together with the row numbers, so a crash never pairs rows
+    with the wrong file.
+
+    Every write also bumps a generation counter in SQLite. Before each
+    search or write, an index whose generation is behind reloads its state,
+    so an API process sees what a separate `--mode ingest` run stored. Two
+    processes writing at the same moment are not coordinated.
+
+    Implements the part of the langchain Chroma API that VectorStoreManager
+    uses, with the same scores for normalized embeddings (squared L2
+    distance, lower is closer).
+    """
+
+    def __init__(self, directory: str, embedding_function, ivf_lists: int = NUMPY_IVF_LISTS,
+                 ivf_probe: int = NUMPY_IVF_PROBE):
+        self.directory = directory
+        self.embedding_function = embedding_function
+        self.ivf_lists = max(0, ivf_lists)
+        self.ivf_probe = max(1, ivf_probe)
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        # Searches and ingest batches run in worker threads, so guard with self._lock.
+        self._conn = sqlite3.connect(os.path.join(directory, "chunks.sqlite3"), check_same_thread=False)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                chunk_id TEXT PRIMARY KEY,
+                row INTEGER NOT NULL,
+                page_id TEXT,
+                text TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS chunks_by_page ON chunks (page_id);
+            CREATE TABLE IF NOT EXISTS state (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            """
+        )
+        self._conn.execute("INSERT OR IGNORE INTO state VALUES ('generation', '0')")
+        self._conn.commit()
+        self._load()
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh_locked()
+            return len(self._row_of)
+
+    def _generation_in_store(self) -> int:
+        return int(self._conn.execute("SELECT value FROM state WHERE key = 'generation'").fetchone()[0])
+
+    def _bump_generation_locked(self):
+        # Part of the caller's transaction; committed with its changes.
+        self._conn.execute("UPDATE state SET value = CAST(value AS INTEGER) + 1 WHERE key = 'generation'")
+        self._generation += 1
+
+    def _refresh_locked(self):
+        """Reload if another process (or another instance) wrote since the last load."""
+        if self._generation_in_store() != self._generation:
+            self._load()
+
+    def _load(self):
+        # One read transaction, so the file name, rows and generation match.
+        self._conn.execute("BEGIN")
+        try:
+            self._load_state()
+        finally:
+            self._conn.commit()
+
+    def _load_state(self):
+        self._generation = self._generation_in_store()
+        self._vectors: Optional[np.memmap] = None
+        self._ids: List[Optional[str]] = []
+        self._row_of: Dict[str, int] = {}
+        self._live = np.zeros(0, dtype=bool)
+        self._count = 0
+        self._centroids: Optional[np.ndarray] = None
+        self._lists: Optional[List[np.ndarray]] = None
+        self._trained_size = 0
+
+        row = self._conn.execute("SELECT value FROM state WHERE key = 'vectors_file'").fetchone()
+        if row is None:
+            return
+        self._vectors = np.load(os.path.join(self.directory, row[0]), mmap_mode="r+")
+        rows = self._conn.execute("SELECT chunk_id, row FROM chunks").fetchall()
+        self._count = max((r for _, r in rows), default=-1) + 1
+        self._ids = [None] * self._count
+        self._live = np.zeros(self._vectors.shape[0], dtype=bool)
+        for chunk_id, r in rows:
+            self._ids[r] = chunk_id
+            self._row_of[chunk_id] = r
+            self._live[r] = True
+
+        centroids_path = os.path.join(self.directory, "ivf_centroids.npy")
+        if self.ivf_lists and os.path.exists(centroids_path):
+            centroids = np.load(centroids_path)
+            if centroids.shape == (self.ivf_lists, self._vectors.shape[1]):
+                self._centroids = centroids
+                self._trained_size = len(self._row_of)
+                self._assign_all_locked()
+        logger.info(f"[NUMPY_INDEX] Loaded {len(self._row_of)} vectors from {self.directory}.")
+
+    # ----- writes -----
+
+    def add_texts(self, texts: List[str], metadatas: List[Dict] = None, ids: List[str] = None, **kwargs) -> List[str]:
+        """Embed and store texts. Texts stored under existing `ids` are overwritten."""
+        texts = list(texts)
+        if not texts:
+            return []
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        embeddings = self.embedding_function.embed_documents(texts)
+        self.add_embeddings(texts, embeddings, metadatas, ids)
+        return ids
+
+    def add_embeddings(self, texts: List[str], embeddings: List[List[float]], metadatas: List[Dict] = None,
+                       ids: List[str] = None):
+        """Store already computed embeddings; same semantics as add_texts()."""
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32).reshape(len(texts), -1))
+        metadatas = metadatas or [{} for _ in texts]
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+
+        with self._lock:
+            self._refresh_locked()
+            self._tombstone_locked(ids)
+            start = self._count
+            end = start + len(vectors)
+            self._reserve_locked(end, vectors.shape[1])
+            self._vectors[start:end] = vectors
+            self._vectors.flush()
+
+            self._ids.extend(ids)
+            self._live[start:end] = True
+            for offset, chunk_id in enumerate(ids):
+                self._row_of[chunk_id] = start + offset
+            self._count = end
+            if self._centroids is not None:
+                self._add_to_lists_locked(np.arange(start, end), vectors)
+
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?, ?)",
+                [
+                    (chunk_id, start + offset, meta.get("page_id"), text, json.dumps(meta))
+                    for offset, (chunk_id, text, meta) in enumerate(zip(ids, texts, metadatas))
+                ]
+            )
+            self._bump_generation_locked()
+            self._conn.commit()
+            self._maybe_train_locked()
+            self._maybe_compact_locked()
+
+    def delete(self, ids: List[str] = None, **kwargs):
+        """Tombstone chunks by ID; unknown IDs are ignored."""
+        if not ids:
+            return
+        with self._lock:
+            self._refresh_locked()
+            self._tombstone_locked(ids)
+            self._conn.executemany("DELETE FROM chunks WHERE chunk_id = ?", ((chunk_id,) for chunk_id in ids))
+            self._bump_generation_locked()
+            self._conn.commit()
+            self._maybe_compact_locked()
+
+    def _tombstone_locked(self, ids: List[str]):
+        for chunk_id in ids:
+            row = self._row_of.pop(chunk_id, None)
+            if row is not None:
+                self._live[row] = False
+                self._ids[row] = None
+
+    def _reserve_locked(self, rows: int, dim: int):
+        if self._vectors is None:
+            self._replace_vectors_locked(max(_INITIAL_CAPACITY, rows), dim, np.arange(0))
+            return
+        if self._vectors.shape[1] != dim:
+            raise ValueError(f"Embedding dimension {dim} does not match the index ({self._vectors.shape[1]}).")
+        capacity = self._vectors.shape[0]
+        if rows > capacity:
+            self._replace_vectors_locked(max(rows, 2 * capacity), dim, np.arange(self._count))
+
+    def _replace_vectors_locked(self, capacity: int, dim: int, keep_rows: np.ndarray,
+                                new_ids: List[str] = None):
+        """
+        Copy `keep_rows` into a new file of `capacity` rows (row i of the new
+        file is keep_rows[i]) and switch to it. The file name and, when rows
+        move (`new_ids` in their new order), the row numbers are committed in
+        one transaction.
+        """
+        name = f"vectors-{uuid.uuid4().hex[:12]}.npy"
+        new_vectors = np.lib.format.open_memmap(
+            os.path.join(self.directory, name), mode="w+", dtype=np.float32, shape=(capacity, dim)
+        )
+        for start in range(0, len(keep_rows), _BLOCK_ROWS):
+            block = keep_rows[start:start + _BLOCK_ROWS]
+            new_vectors[start:start + len(block)] = self._vectors[block]
+        new_vectors.flush()
+        live = np.zeros(capacity, dtype=bool)
+        if len(keep_rows):
+            live[:len(keep_rows)] = self._live[keep_rows]
+
+        old_name = self._conn.execute("SELECT value FROM state WHERE key = 'vectors_file'").fetchone()
+        self._conn.execute(
+            "INSERT INTO state VALUES ('vectors_file', ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (name,)
+        )
+        if new_ids is not None:
+            self._conn.executemany(
+                "UPDATE chunks SET row = ? WHERE chunk_id = ?", ((row, chunk_id) for row, chunk_id in enumerate(new_ids))
+            )
+        self._bump_generation_locked()
+        self._conn.commit()
+
+        self._vectors = new_vectors
+        self._live = live
+        if old_name:
+            # Searches still holding the old mapping keep reading it until they finish.
+            os.remove(os.path.join(self.directory, old_name[0]))
+
+    def _maybe_compact_locked(self):
+        tombstones = self._count - len(self._row_of)
+        if tombstones >= _COMPACT_MIN_TOMBSTONES and tombstones > len(self._row_of):
+            self._compact_locked()
+
+    def compact(self):
+        """Drop tombstoned rows from the vector file."""
+        with self._lock:
+            self._refresh_locked()
+            if self._vectors is not None and self._count > len(self._row_of):
+                self._compact_locked()
+
+    def _compact_locked(self):
+        keep_rows = np.flatnonzero(self._live[:self._count])
+        logger.info(f"[NUMPY_INDEX] Compacting {self._count} rows to {len(keep_rows)}.")
+        ids = [self._ids[row] for row in keep_rows]
+        capacity = max(_INITIAL_CAPACITY, 2 * len(keep_rows))
+        self._replace_vectors_locked(capacity, self._vectors.shape[1], keep_rows, new_ids=ids)
+        # New objects rather than in-place edits: running searches keep their snapshot.
+        self._ids = ids
+        self._row_of = {chunk_id: row for row, chunk_id in enumerate(ids)}
+        self._count = len(ids)
+        if self._centroids is not None:
+            self._assign_all_locked()
+
+    # ----- IVF -----
+
+    def _maybe_train_locked(self):
+        live_count = len(self._row_of)
+        if not self.ivf_lists or live_count < self.ivf_lists * _MIN_POINTS_PER_LIST:
+            return
+        if self._centroids is not None and live_count < 2 * self._trained_size:
+            return
+        self._train_locked()
+
+    def _train_locked(self):
+        """Spherical k-means over a sample of the live vectors."""
+        rng = np.random.default_rng(0)
+        live_rows = np.flatnonzero(self._live[:self._count])
+        sample_size = min(len(live_rows), self.ivf_lists * _KMEANS_SAMPLE_PER_LIST)
+        sample = np.asarray(self._vectors[np.sort(rng.choice(live_rows, sample_size, replace=False))])
+        centroids = sample[rng.choice(sample_size, self.ivf_lists, replace=False)].copy()
+        for _ in range(_KMEANS_ITERATIONS):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            filled = np.bincount(assignment, minlength=self.ivf_lists) > 0
+            centroids[filled] = _normalize(sums[filled])
+
+        logger.info(f"[NUMPY_INDEX] Trained {self.ivf_lists} IVF lists on {sample_size} vectors.")
+        tmp_path = os.path.join(self.directory, "ivf_centroids.tmp.npy")
+        np.save(tmp_path, centroids)
+        os.replace(tmp_path, os.path.join(self.directory, "ivf_centroids.npy"))
+        # Other processes pick up the new centroids on their next reload.
+        self._bump_generation_locked()
+        self._conn.commit()
+        self._centroids = centroids
+        self._trained_size = len(live_rows)
+        self._assign_all_locked()
+
+    def _assign_all_locked(self):
+        rows = np.flatnonzero(self._live[:self._count])
+        assignment = np.empty(len(rows), dtype=np.int64)
+        for start in range(0, len(rows), _BLOCK_ROWS):
+            block = rows[start:start + _BLOCK_ROWS]
+            assignment[start:start + len(block)] = np.argmax(self._vectors[block] @ self._centroids.T, axis=1)
+        order = np.argsort(assignment, kind="stable")
+        bounds = np.cumsum(np.bincount(assignment, minlength=self.ivf_lists))[:-1]
+        self._lists = np.split(rows[order], bounds)
+
+    def _add_to_lists_locked(self, rows: np.ndarray, vectors: np.ndarray):
+        assignment = np.argmax(vectors @ self._centroids.T, axis=1)
+        lists = list(self._lists)
+        for cell in np.unique(assignment):
+            lists[cell] = np.concatenate([lists[cell], rows[assignment == cell]])
+        self._lists = lists
+
+    # ----- reads -----
+
+    def similarity_search_by_vector_with_relevance_scores(self, embedding: List[float], k: int = 4,
+                                                           **kwargs) -> List[Tuple[Document, float]]:
+        """Top-k chunks for a query vector as (Document, squared L2 distance), closest first."""
+        query = _normalize(np.asarray(embedding, dtype=np.float32).reshape(1, -1))[0]
+        with self._lock:
+            self._refresh_locked()
+            vectors, count, ids = self._vectors, self._count, self._ids
+            live = self._live[:count].copy()
+            centroids, lists = self._centroids, self._lists
+        if vectors is None or k <= 0 or not live.any():
+            return []
+
+        candidates = None
+        if centroids is not None:
+            probe = min(self.ivf_probe, len(centroids))
+            cells = np.argpartition(-(centroids @ query), probe - 1)[:probe]
+            candidates = np.sort(np.concatenate([lists[cell] for cell in cells]))
+            candidates = candidates[candidates < count]
+            candidates = candidates[live[candidates]]
+        if candidates is not None and len(candidates):
+            scores = vectors[candidates] @ query
+        else:
+            candidates = None
+            scores = vectors[:count] @ query
+            scores[~live] = -np.inf
+
+        k = min(k, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        rows = candidates[top] if candidates is not None else top
+
+        results = []
+        with self._lock:
+            for row, score in zip(rows, scores[top]):
+                chunk_id = ids[row] if row < len(ids) else None
+                found = chunk_id and self._conn.execute(
+                    "SELECT text, metadata FROM chunks WHERE chunk_id = ?", (chunk_id,)
+                ).fetchone()
+                if found:
+                    # Deleted since the snapshot otherwise.
+                    results.append((Document(page_content=found[0], metadata=json.loads(found[1])),
+                                    float(2.0 - 2.0 * score)))
+        return results
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_relevance_scores(
+            self.embedding_function.embed_query(query), k=k
+        )
+
+    def get(self, ids: List[str] = None, where: Dict = None, include: List[str] = None, **kwargs) -> Dict:
+        """
+        Stored chunks by ID and/or page, in the shape of Chroma's get(). Only
+        `page_id` filters are supported: {"page_id": x} or
+        {"page_id": {"$in": [...]}}.
+        """
+        clauses, params = [], []
+        if ids is not None:
+            clauses.append(f"chunk_id IN ({','.join('?' * len(ids))})")
+            params.extend(ids)
+        if where:
+            if set(where) != {"page_id"}:
+                raise ValueError(f"Unsupported filter for the numpy index: {where}")
+            page_filter = where["page_id"]
+            page_ids = page_filter["$in"] if isinstance(page_filter, dict) else [page_filter]
+            clauses.append(f"page_id IN ({','.join('?' * len(page_ids))})")
+            params.extend(page_ids)
+        sql = "SELECT chunk_id, text, metadata FROM chunks"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+
+        include = ["documents", "metadatas"] if include is None else include
+        result = {"ids": [row[0] for row in rows]}
+        if "documents" in include:
+            result["documents"] = [row[1] for row in rows]
+        if "metadatas" in include:
+            result["metadatas"] = [json.loads(row[2]) for row in rows]
+        return result
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
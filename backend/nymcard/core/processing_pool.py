@@ -0,0 +1,99 @@
+import os
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+# 0 processes pages on the event loop thread, as they arrive.
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "0"))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "8"))
+
+
+def worker_context():
+    """
+    Start method for worker processes. Not fork: the parent runs thread
+    pools and the ingest scheduler's loop thread, whose locks a forked
+    child would inherit in whatever state they were in.
+    """
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(method)
+
+
+def _process_batch(process_fn: Callable[[Dict], Dict], pages: List[Dict]) -> List[Dict]:
+    # Runs in a worker process.
+    return [process_fn(page) for page in pages]
+
+
+class PageProcessingPool:
+    """
+    Runs `process_fn` (cleaning and chunking) over a stream of fetched pages.
+
+    With `workers` > 0, pages are grouped into batches of `batch_size` and
+    processed in a pool of worker processes, so the CPU-bound work neither
+    blocks the event loop nor competes with it for the GIL. Processed pages
+    are yielded as soon as their batch completes, in completion order, even
+    while the next page is still being fetched. At most two batches per
+    worker are in flight; beyond that the pool stops pulling pages until
+    one finishes. With `workers` <= 0, pages are processed in order on the
+    calling thread.
+
+    `process_fn` must be a module-level function so it can be sent to the
+    worker processes.
+    """
+
+    def __init__(self, process_fn: Callable[[Dict], Dict], workers: int = INGEST_WORKERS,
+                 batch_size: int = INGEST_BATCH_SIZE):
+        self.process_fn = process_fn
+        self.workers = workers
+        self.batch_size = max(1, batch_size)
+
+    async def process(self, pages: AsyncIterator[Dict]) -> AsyncIterator[Dict]:
+        if self.workers <= 0:
+            async for page in pages:
+                yield self.process_fn(page)
+            return
+
+        logger.info(f"[PROCESSING_POOL] Processing pages in {self.workers} workers, batches of {self.batch_size}.")
+        loop = asyncio.get_running_loop()
+        executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=worker_context())
+        max_pending = 2 * self.workers
+        pending = set()
+        batch = []
+        # The next page is awaited alongside the batches in flight, so a
+        # finished batch is handed on at once, not when the crawl next yields.
+        next_page = None
+        exhausted = False
+        try:
+            while True:
+                if next_page is None and not exhausted and len(pending) < max_pending:
+                    next_page = asyncio.ensure_future(pages.__anext__())
+                waiting = pending | ({next_page} if next_page is not None else set())
+                if not waiting:
+                    break
+                done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+
+                if next_page in done:
+                    try:
+                        batch.append(next_page.result())
+                    except StopAsyncIteration:
+                        exhausted = True
+                    next_page = None
+                    if batch and (exhausted or len(batch) >= self.batch_size):
+                        pending.add(loop.run_in_executor(executor, _process_batch, self.process_fn, batch))
+                        batch = []
+
+                for future in done & pending:
+                    pending.discard(future)
+                    for processed in future.result():
+                        yield processed
+        finally:
+            if next_page is not None:
+                next_page.cancel()
+                await asyncio.gather(next_page, return_exceptions=True)
+            for future in pending:
+                future.cancel()
+            # Do not block the event loop on workers that are still busy.
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,172 @@
+import os
+import time
+import logging
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .bm25_index import tokenize, BM25_K1, BM25_B
+
+logger = logging.getLogger(__name__)
+
+# "none" (default: one-stage retrieval), "lexical" or "cross-encoder".
+RERANKER = os.getenv("RERANKER", "none").lower()
+# First-stage results fetched from each retriever for the reranker.
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "50"))
+# Chunks kept for the prompt: at most RERANK_TOP_K scoring RERANK_MIN_SCORE or more.
+RERANK_TOP_K = int(os.getenv("RERANK_TOP_K", "4"))
+RERANK_MIN_SCORE = float(os.getenv("RERANK_MIN_SCORE", "0.2"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+# No further batches are scored once a query's reranking has taken this long.
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "200"))
+# Directory with an ONNX cross-encoder export: model.onnx and tokenizer.json.
+RERANKER_MODEL_DIR = os.getenv("RERANKER_MODEL_DIR", "")
+RERANKER_MAX_LENGTH = int(os.getenv("RERANKER_MAX_LENGTH", "256"))
+RERANKER_THREADS = int(os.getenv("RERANKER_THREADS", "2"))
+
+
+class Reranker:
+    """
+    Second retrieval stage: scores (query, chunk) pairs and keeps the best.
+
+    rerank() scores the candidates `batch_size` at a time, best first-stage
+    rank first, and stops starting new batches once `budget_ms` has passed.
+    Candidates left unscored keep their first-stage order behind the scored
+    ones, so a slow reranker degrades to first-stage retrieval instead of
+    holding the query up. Of the scored candidates, only those scoring at
+    least `min_score` are kept. Subclasses implement score_batch(), which
+    returns one score in [0, 1] per text.
+    """
+
+    name = "reranker"
+
+    def __init__(self, top_k: int = RERANK_TOP_K, min_score: float = RERANK_MIN_SCORE,
+                 batch_size: Optional[int] = RERANK_BATCH_SIZE, budget_ms: float = RERANK_BUDGET_MS):
+        self.top_k = max(1, top_k)
+        self.min_score = min_score
+        self.batch_size = max(1, batch_size) if batch_size else None
+        self.budget = max(0.0, budget_ms) / 1000
+
+    def score_batch(self, query: str, texts: List[str]) -> np.ndarray:
+        raise NotImplementedError
+
+    def rerank(self, query: str, candidates: List[Tuple[str, Dict, float]]) -> List[Tuple[str, Dict, float]]:
+        """
+        At most top_k of `candidates` ((text, metadata, score), best first),
+        best reranker score first; the score is replaced by the reranker's.
+        """
+        if not candidates:
+            return []
+        started = time.perf_counter()
+        batch_size = self.batch_size or len(candidates)
+        scores = []
+        for start in range(0, len(candidates), batch_size):
+            if scores and time.perf_counter() - started > self.budget:
+                logger.info(f"[RERANKER] Budget spent after {len(scores)}/{len(candidates)} candidates.")
+                break
+            batch = candidates[start:start + batch_size]
+            scores.extend(self.score_batch(query, [text for text, _, _ in batch]).tolist())
+
+        scored = [(text, meta, score) for (text, meta, _), score in zip(candidates, scores) if score >= self.min_score]
+        # sorted() is stable: ties keep their first-stage order.
+        ranked = sorted(scored, key=lambda item: item[2], reverse=True) + candidates[len(scores):]
+        return ranked[:self.top_k]
+
+
+class LexicalReranker(Reranker):
+    """
+    Model-free reranker: the share of the query's terms a chunk covers,
+    with BM25 term-frequency saturation and length normalisation, and terms
+    weighted by their inverse document frequency among the candidates.
+    Only terms found in some candidate count. A chunk holding them all,
+    repeatedly, approaches 1; one holding none scores 0. All candidates are
+    scored as one matrix (they share the term weights), so there is a
+    single batch.
+
+    Cheap and deterministic, for tests, benchmarks and hosts without a
+    model; it cannot tell paraphrases apart the way a cross-encoder does.
+    """
+
+    name = "lexical"
+
+    def __init__(self, top_k: int = RERANK_TOP_K, min_score: float = RERANK_MIN_SCORE,
+                 budget_ms: float = RERANK_BUDGET_MS):
+        super().__init__(top_k=top_k, min_score=min_score, batch_size=None, budget_ms=budget_ms)
+
+    def score_batch(self, query: str, texts: List[str]) -> np.ndarray:
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not texts:
+            # Nothing to compare on: keep every candidate in its first-stage order.
+            return np.ones(len(texts), dtype=np.float32)
+
+        term_index = {term: j for j, term in enumerate(terms)}
+        tf = np.zeros((len(texts), len(terms)), dtype=np.float32)
+        lengths = np.empty(len(texts), dtype=np.float32)
+        for i, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths[i] = len(tokens)
+            for term, count in Counter(token for token in tokens if token in term_index).items():
+                tf[i, term_index[term]] = count
+
+        df = np.count_nonzero(tf, axis=0)
+        if not df.any():
+            # Not one term matches (a paraphrase, say): no grounds to drop anything.
+            return np.ones(len(texts), dtype=np.float32)
+        # Terms no candidate holds cannot tell the candidates apart; leave them out.
+        idf = np.where(df > 0, np.log1p((len(texts) - df + 0.5) / (df + 0.5)), 0.0)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(float(lengths.mean()), 1.0))
+        # BM25's tf * (k1 + 1) / (tf + norm), divided by its limit k1 + 1.
+        saturation = tf / (tf + norm[:, None])
+        return (saturation @ idf / idf.sum()).astype(np.float32)
+
+
+class CrossEncoderReranker(Reranker):
+    """
+    Cross-encoder run by onnxruntime on the CPU, e.g. an ONNX export of
+    cross-encoder/ms-marco-MiniLM-L-6-v2. `model_dir` holds model.onnx and
+    the matching tokenizer.json. Each batch of (query, chunk) pairs is
+    padded to its longest pair (at most `max_length` tokens) and scored in
+    one session run; logits are squashed to [0, 1] with a sigmoid.
+    """
+
+    name = "cross-encoder"
+
+    def __init__(self, model_dir: str = RERANKER_MODEL_DIR, max_length: int = RERANKER_MAX_LENGTH,
+                 threads: int = RERANKER_THREADS, **kwargs):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        super().__init__(**kwargs)
+        if not model_dir:
+            raise ValueError("RERANKER=cross-encoder needs RERANKER_MODEL_DIR (model.onnx and tokenizer.json).")
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = max(1, threads)
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, "model.onnx"), options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    def score_batch(self, query: str, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch([(query, text) for text in texts])
+        inputs = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        logits = self.session.run(None, {name: value for name, value in inputs.items() if name in self._input_names})[0]
+        return 1 / (1 + np.exp(-logits.reshape(len(texts), -1)[:, 0]))
+
+
+def create_reranker(name: str = RERANKER) -> Optional[Reranker]:
+    """Reranker selected by RERANKER, or None for one-stage retrieval."""
+    if name == "none":
+        return None
+    if name == "lexical":
+        return LexicalReranker()
+    if name == "cross-encoder":
+        return CrossEncoderReranker()
+    raise ValueError(f"Unknown RERANKER '{name}', expected 'none', 'lexical' or 'cross-encoder'.")
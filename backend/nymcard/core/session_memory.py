@@ -0,0 +1,176 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Deque, List, Optional, Tuple
+
+from langchain.schema import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from ..utils.helpers import count_tokens
+
+logger = logging.getLogger(__name__)
+
+SESSION_HISTORY_MAX_TOKENS = int(os.getenv("SESSION_HISTORY_MAX_TOKENS", "2000"))
+SESSION_SUMMARY_MAX_TOKENS = int(os.getenv("SESSION_SUMMARY_MAX_TOKENS", "300"))
+SESSION_IDLE_TTL = int(os.getenv("SESSION_IDLE_TTL", "1800"))
+SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", "1000"))
+
+# Used by the CLI and by callers that do not track sessions.
+DEFAULT_SESSION_ID = "default"
+
+# (previous summary, turns dropped from the window) -> new summary
+Summarizer = Callable[[str, List[BaseMessage]], Awaitable[str]]
+
+
+@dataclass
+class ConversationSession:
+    """History of one session: a sliding window of recent messages plus an
+    optional rolling summary of the turns that fell out of it."""
+    messages: Deque[Tuple[BaseMessage, int]] = field(default_factory=deque)
+    tokens: int = 0
+    summary: str = ""
+    last_used: float = 0.0
+    # Turns out of the window but not yet in the summary, and whether a
+    # save_turn() is folding them in.
+    unsummarized: List[BaseMessage] = field(default_factory=list)
+    summarizing: bool = False
+
+
+class SessionMemoryStore:
+    """
+    Conversation memory keyed by session ID.
+
+    Each session keeps its most recent turns within `max_history_tokens`;
+    older turns are dropped from the window and, if a `summarizer` is given,
+    folded into a rolling summary capped at `max_summary_tokens`. Sessions
+    idle for longer than `idle_ttl_seconds` are evicted, and so is the least
+    recently used one whenever there are more than `max_sessions`, so memory
+    and prompt size stay bounded however long the server runs.
+
+    A session is summarized by one save_turn() at a time: turns dropped
+    while a summary is being written are queued, and folded in by that same
+    call once it is done, so concurrent turns never overwrite each other's
+    summary.
+    """
+
+    def __init__(self, max_history_tokens: int = SESSION_HISTORY_MAX_TOKENS,
+                 max_summary_tokens: int = SESSION_SUMMARY_MAX_TOKENS,
+                 idle_ttl_seconds: float = SESSION_IDLE_TTL,
+                 max_sessions: int = SESSION_MAX_COUNT,
+                 summarizer: Optional[Summarizer] = None):
+        self.max_history_tokens = max_history_tokens
+        self.max_summary_tokens = max_summary_tokens
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.max_sessions = max(1, max_sessions)
+        self.summarizer = summarizer
+        self.evicted = 0
+        # Least recently used first.
+        self._sessions: "OrderedDict[str, ConversationSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def load_history(self, session_id: str) -> List[BaseMessage]:
+        """
+        Messages to put in front of the next prompt: the summary (as a system
+        message) followed by the turns still inside the window.
+        """
+        with self._lock:
+            session = self._touch_locked(session_id, create=False)
+            if session is None:
+                return []
+            history = [message for message, _ in session.messages]
+            if session.summary:
+                history.insert(0, SystemMessage(content=f"Summary of the earlier conversation: {session.summary}"))
+            return history
+
+    async def save_turn(self, session_id: str, user_text: str, ai_text: str):
+        """
+        Append one question/answer turn, then slide the window back under the
+        token budget. Turns pushed out are summarized when a summarizer is set.
+        """
+        with self._lock:
+            session = self._touch_locked(session_id, create=True)
+            for message in (HumanMessage(content=user_text), AIMessage(content=ai_text)):
+                tokens = count_tokens(message.content)
+                session.messages.append((message, tokens))
+                session.tokens += tokens
+
+            while session.messages and session.tokens > self.max_history_tokens:
+                message, tokens = session.messages.popleft()
+                session.tokens -= tokens
+                if self.summarizer is not None:
+                    session.unsummarized.append(message)
+            if not session.unsummarized or session.summarizing:
+                return
+            session.summarizing = True
+
+        try:
+            await self._summarize(session_id, session)
+        finally:
+            with self._lock:
+                session.summarizing = False
+
+    async def _summarize(self, session_id: str, session: ConversationSession):
+        # Runs in one save_turn() per session at a time (session.summarizing).
+        while True:
+            with self._lock:
+                if self._sessions.get(session_id) is not session:
+                    return  # Evicted meanwhile; nothing will read the summary.
+                dropped, session.unsummarized = session.unsummarized, []
+                previous_summary = session.summary
+            if not dropped:
+                return
+            try:
+                summary = await self.summarizer(previous_summary, dropped)
+            except Exception as e:
+                logger.error(f"[SESSION_MEMORY] Summarizing session {session_id} failed: {e}", exc_info=True)
+                return
+            with self._lock:
+                session.summary = self._cap_summary(summary.strip())
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "evicted": self.evicted,
+                "history_tokens": sum(s.tokens for s in self._sessions.values()),
+            }
+
+    def _touch_locked(self, session_id: str, create: bool) -> Optional[ConversationSession]:
+        now = time.monotonic()
+        self._evict_idle_locked(now)
+        session = self._sessions.get(session_id)
+        if session is None:
+            if not create:
+                return None
+            session = self._sessions[session_id] = ConversationSession()
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evicted += 1
+        session.last_used = now
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def _evict_idle_locked(self, now: float):
+        # Sessions are ordered by last use, so idle ones are all at the front.
+        while self._sessions:
+            oldest_id, oldest = next(iter(self._sessions.items()))
+            if now - oldest.last_used < self.idle_ttl_seconds:
+                break
+            del self._sessions[oldest_id]
+            self.evicted += 1
+            logger.debug(f"[SESSION_MEMORY] Evicted idle session {oldest_id}.")
+
+    def _cap_summary(self, summary: str) -> str:
+        if count_tokens(summary) <= self.max_summary_tokens:
+            return summary
+        # Keep roughly the first max_summary_tokens tokens (~4 characters each).
+        return summary[:self.max_summary_tokens * 4].rsplit(" ", 1)[0]
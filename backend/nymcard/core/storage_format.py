@@ -0,0 +1,182 @@
+import re
+from html import unescape
+from typing import Dict, List, Optional, Tuple
+
+# Splits a page into alternating text / markup pieces in one C-level pass.
+# CDATA and comments come first so a '>' inside them does not end the tag.
+_MARKUP_SPLIT = re.compile(r"(<!\[CDATA\[.*?\]\]>|<!--.*?-->|<[^>]*>)", re.S)
+_TAG_PATTERN = re.compile(r"<(/?)([A-Za-z][^\s/>]*)(.*?)(/?)>", re.S)
+_ATTRIBUTE_PATTERN = re.compile(r"([\w:\-]+)\s*=\s*(?:\"([^\"]*)\"|'([^']*)')")
+
+# Output markers resolved by _finish(): a line break, and the delimiter of a
+# placeholder for verbatim code that whitespace normalization must not touch.
+_BREAK = "\x00"
+_CODE = "\x02"
+# Lines left with nothing but a list or heading prefix are dropped.
+_EMPTY_PREFIX_LINES = frozenset(["-"] + ["#" * level for level in range(1, 7)])
+_CODE_PLACEHOLDER = re.compile(r"\x02(\d+)\x02")
+
+# Tag kinds; the three line-starting kinds come first, so `kind <= _LIST_ITEM` tests for them.
+_BLOCK, _HEADING, _LIST_ITEM, _INLINE, _ROW, _CELL, _SKIP, _MACRO, _LINK, _RESOURCE, _OTHER = range(11)
+
+_KINDS: Dict[str, int] = {
+    **{tag: _BLOCK for tag in (
+        "p", "div", "br", "hr", "ul", "ol", "table", "thead", "tbody", "tfoot",
+        "blockquote", "pre", "section", "article", "header", "footer", "dl", "dt", "dd",
+        "ac:layout", "ac:layout-section", "ac:layout-cell", "ac:rich-text-body", "ac:task", "ac:task-list",
+    )},
+    **{f"h{level}": _HEADING for level in range(1, 7)},
+    "li": _LIST_ITEM,
+    "tr": _ROW,
+    "td": _CELL,
+    "th": _CELL,
+    # Elements whose content is never shown on the page.
+    **{tag: _SKIP for tag in ("ac:parameter", "script", "style", "ac:task-id", "ac:task-status", "ac:image")},
+    "ac:structured-macro": _MACRO,
+    "ac:link": _LINK,
+}
+# Line prefixes of headings and list items.
+_PREFIXES = {**{f"h{level}": f"{_BREAK}{'#' * level} " for level in range(1, 7)}, "li": f"{_BREAK}- "}
+# Macros whose plain-text body is source code.
+_CODE_MACROS = frozenset({"code", "noformat"})
+
+# Parsed tags without attributes ("<p>", "</td>") are shared across pages.
+_TAG_CACHE: Dict[str, Tuple[int, str, bool, bool, str]] = {}
+
+
+def extract_text(storage: str) -> str:
+    """
+    Plain text of a page body in Confluence storage format (XHTML with `ac:`
+    and `ri:` elements), produced in a single pass over the input.
+
+    - Entities are decoded (`&amp;`, `&nbsp;`, numeric references).
+    - Headings, paragraphs, list items and table rows end up on their own
+      lines; headings are prefixed with '#' per level, list items with '- ',
+      and table cells are separated by ' | '.
+    - Code and noformat macros keep their CDATA body verbatim between ```
+      fences; macro parameters (language, title, ...) are dropped.
+    - Links without a body fall back to the linked page title or file name.
+    """
+    parts = _MARKUP_SPLIT.split(storage)
+    out: List[str] = [parts[0]]
+    code_blocks: List[str] = []
+    append = out.append
+    tag_cache = _TAG_CACHE
+    skip_depth = 0
+    cell_depth = 0
+    cell_index = 0
+    macros: List[str] = []
+    link_mark = None
+    link_title = None
+    prefix_open = False
+
+    for markup, text in zip(parts[1::2], parts[2::2]):
+        if markup[1] == "!":
+            if markup.startswith("<![CDATA[") and not skip_depth:
+                cdata = markup[9:-3]
+                if macros and macros[-1] in _CODE_MACROS:
+                    code = cdata.strip("\n")
+                    if code:
+                        out.append(f"{_BREAK}{_CODE}{len(code_blocks)}{_CODE}{_BREAK}")
+                        code_blocks.append(f"```\n{code}\n```")
+                else:
+                    # Plain-text link bodies and the like: literal, not markup.
+                    out.append(cdata.replace("&", "&amp;"))
+        else:
+            kind, name, closing, self_closing, attrs = tag_cache.get(markup) or _parse_tag(markup)
+            if kind == _INLINE:
+                pass
+            elif kind == _SKIP:
+                if closing:
+                    skip_depth = max(0, skip_depth - 1)
+                elif not self_closing:
+                    skip_depth += 1
+            elif skip_depth:
+                pass
+            elif kind <= _LIST_ITEM:
+                if cell_depth and name != "table":
+                    # Paragraphs inside a table cell would split the row over
+                    # several lines; keep a row on one line instead.
+                    append(" ")
+                elif prefix_open and not closing:
+                    # "<li><p>..." : the list item's line is already open.
+                    pass
+                elif closing or kind == _BLOCK:
+                    append(_BREAK)
+                    prefix_open = False
+                else:
+                    append(_PREFIXES[name])
+                    prefix_open = True
+            elif kind == _CELL:
+                if closing:
+                    cell_depth = max(0, cell_depth - 1)
+                else:
+                    if cell_index:
+                        append(" | ")
+                    cell_index += 1
+                    cell_depth += not self_closing
+            elif kind == _ROW:
+                append(_BREAK)
+                cell_index = 0
+            elif kind == _MACRO:
+                out.append(_BREAK)
+                if closing:
+                    if macros:
+                        macros.pop()
+                elif not self_closing:
+                    macros.append(_attribute(attrs, "ac:name") or "")
+            elif kind == _LINK:
+                if not closing:
+                    link_mark, link_title = len(out), None
+                elif link_mark is not None:
+                    if link_title and not "".join(out[link_mark:]).strip():
+                        out.append(link_title)
+                    link_mark = None
+            elif kind == _RESOURCE and link_mark is not None:
+                link_title = (
+                    _attribute(attrs, "ri:content-title") or _attribute(attrs, "ri:filename") or link_title
+                )
+
+        if text and not skip_depth:
+            append(text)
+            if prefix_open and not text.isspace():
+                prefix_open = False
+
+    return _finish("".join(out), code_blocks)
+
+
+def _parse_tag(markup: str) -> Tuple[int, str, bool, bool, str]:
+    match = _TAG_PATTERN.match(markup)
+    if match is None:
+        return _OTHER, "", False, False, ""
+    closing, name, attrs, self_closing = match.groups()
+    name = name.lower()
+    kind = _KINDS.get(name)
+    if kind is None:
+        kind = _RESOURCE if name.startswith("ri:") else _INLINE
+    parsed = (kind, name, bool(closing), bool(self_closing), attrs)
+    if not attrs.strip():
+        _TAG_CACHE[markup] = parsed
+    return parsed
+
+
+def _finish(text: str, code_blocks: List[str]) -> str:
+    """Decode entities, normalize whitespace and line breaks, restore code."""
+    if "&" in text:
+        text = unescape(text)
+    # str.split() collapses whitespace runs in C; a regex scan of every
+    # character for them cost more than the rest of the extraction.
+    text = " ".join(text.split())
+    lines = (line.strip(" ") for line in text.split(_BREAK))
+    text = "\n".join(line for line in lines if line and line not in _EMPTY_PREFIX_LINES)
+    if code_blocks:
+        text = _CODE_PLACEHOLDER.sub(lambda m: code_blocks[int(m.group(1))], text)
+    return text
+
+
+def _attribute(attrs: str, name: str) -> Optional[str]:
+    # Values are returned still escaped; _finish() decodes them with the text.
+    for match in _ATTRIBUTE_PATTERN.finditer(attrs):
+        if match.group(1).lower() == name:
+            return match.group(2) if match.group(2) is not None else match.group(3)
+    return None
@@ -1,12 +1,22 @@
 import os
 import logging
 import asyncio
-from typing import List, Dict, Tuple
-from langchain_openai import OpenAIEmbeddings
-from langchain_chroma import Chroma
+from typing import List, Dict, Tuple, Protocol
+from langchain_core.embeddings import Embeddings
 from langchain.schema import Document
 from dotenv import load_dotenv
 
+from .embedding_cache import EmbeddingCache, CachedEmbeddings
+from .bm25_index import BM25Index
+from .entity_index import EntityIndex
+from .query_cache import TTLCache, normalize_query
+from .metrics import span, count_cache_lookup
+from .numpy_vector_index import NumpyVectorIndex
+from .embedding_providers import (
+    EMBEDDING_PROVIDER, OPENAI_EMBEDDING_MODEL, OPENAI_EMBEDDING_DIMENSIONS,
+    EmbeddingSignature, HashingEmbeddings, LocalEmbeddings, check_embedding_signature
+)
+
 load_dotenv()
 
 logger = logging.getLogger(__name__)
@@ -14,38 +24,201 @@ logging.basicConfig(level=logging.INFO)
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 VECTORSTORE_DIRECTORY = os.getenv("VECTORSTORE_DIRECTORY", "./chroma_db")
+# "chroma" (default) or "numpy" (memory-mapped in-process index).
+VECTORSTORE_BACKEND = os.getenv("VECTORSTORE_BACKEND", "chroma").lower()
+NUMPY_INDEX_DIRECTORY = os.getenv("NUMPY_INDEX_DIRECTORY", os.path.join(VECTORSTORE_DIRECTORY, "numpy_index"))
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+BM25_ENABLED = os.getenv("BM25_ENABLED", "true").lower() == "true"
+ENTITY_INDEX_ENABLED = os.getenv("ENTITY_INDEX_ENABLED", "true").lower() == "true"
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "2048"))
+QUERY_EMBEDDING_CACHE_TTL = int(os.getenv("QUERY_EMBEDDING_CACHE_TTL", "86400"))
+
+
+class VectorBackend(Protocol):
+    """
+    What VectorStoreManager needs from a vector store: the subset of the
+    langchain Chroma API below. Chroma and NumpyVectorIndex implement it.
+    """
+
+    def add_texts(self, texts: List[str], metadatas: List[Dict] = None, ids: List[str] = None, **kwargs) -> List[str]:
+        ...
+
+    def get(self, ids: List[str] = None, where: Dict = None, include: List[str] = None, **kwargs) -> Dict:
+        ...
+
+    def delete(self, ids: List[str] = None, **kwargs):
+        ...
+
+    def similarity_search_by_vector_with_relevance_scores(self, embedding: List[float], k: int = 4,
+                                                           **kwargs) -> List[Tuple[Document, float]]:
+        ...
+
+
+def create_vector_backend(backend: str, embedding_function) -> VectorBackend:
+    """Vector store selected by VECTORSTORE_BACKEND."""
+    if backend == "chroma":
+        # Imported on use: chromadb is slow to import, and the numpy backend does without it.
+        from langchain_chroma import Chroma
+
+        return Chroma(
+            collection_name="confluence_docs",
+            embedding_function=embedding_function,
+            persist_directory=VECTORSTORE_DIRECTORY
+        )
+    if backend == "numpy":
+        return NumpyVectorIndex(NUMPY_INDEX_DIRECTORY, embedding_function)
+    raise ValueError(f"Unknown VECTORSTORE_BACKEND '{backend}', expected 'chroma' or 'numpy'.")
+
+
+def create_embedding_provider(provider: str) -> Tuple[Embeddings, EmbeddingSignature]:
+    """Embeddings selected by EMBEDDING_PROVIDER, and the signature recorded for the vector store."""
+    if provider == "openai":
+        from langchain_openai import OpenAIEmbeddings
+
+        embeddings = OpenAIEmbeddings(model=OPENAI_EMBEDDING_MODEL, openai_api_key=OPENAI_API_KEY)
+        return embeddings, EmbeddingSignature(
+            "openai", OPENAI_EMBEDDING_MODEL, OPENAI_EMBEDDING_DIMENSIONS.get(OPENAI_EMBEDDING_MODEL)
+        )
+    if provider == "local":
+        embeddings = LocalEmbeddings()
+        return embeddings, embeddings.signature
+    if provider == "hashing":
+        embeddings = HashingEmbeddings()
+        return embeddings, embeddings.signature
+    raise ValueError(f"Unknown EMBEDDING_PROVIDER '{provider}', expected 'openai', 'local' or 'hashing'.")
+
+
+def vector_backend_directory(backend: str) -> str:
+    return NUMPY_INDEX_DIRECTORY if backend == "numpy" else VECTORSTORE_DIRECTORY
 
 
 class VectorStoreManager:
     def __init__(self):
         """
-        Initialize embeddings and vectorstore (Chroma).
+        Initialize embeddings (OpenAI by default) and the vector store backend (Chroma by default).
+        Raises EmbeddingMismatchError if the store was built with other embeddings.
         """
-        logger.info("[INIT_VECTORSTORE] Initializing VectorStore with Chroma + OpenAI embeddings.")
-        self.embedding_fn = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
-
-        self.vstore = Chroma(
-            collection_name="confluence_docs",
-            embedding_function=self.embedding_fn,
-            persist_directory=VECTORSTORE_DIRECTORY
+        logger.info(
+            f"[INIT_VECTORSTORE] Initializing VectorStore with {VECTORSTORE_BACKEND} + {EMBEDDING_PROVIDER} embeddings."
         )
+        self.embedding_fn, self.embedding_signature = create_embedding_provider(EMBEDDING_PROVIDER)
+        # Vectors from different models are not comparable; refuse to mix them in one store.
+        check_embedding_signature(vector_backend_directory(VECTORSTORE_BACKEND), self.embedding_signature)
+
+        # Chunks already embedded once (in any run, for any page) are served
+        # from the on-disk cache instead of the embeddings API.
+        self.embedding_cache = EmbeddingCache() if EMBEDDING_CACHE_ENABLED else None
+        store_embedding_fn = self.embedding_fn
+        if self.embedding_cache is not None:
+            store_embedding_fn = CachedEmbeddings(self.embedding_fn, self.embedding_cache)
+
+        self.vstore = create_vector_backend(VECTORSTORE_BACKEND, store_embedding_fn)
+
+        # Lexical (BM25) index over the same chunks, kept in step with the
+        # vector store by add_text_batch() and delete_chunks().
+        self.lexical_index = BM25Index() if BM25_ENABLED else None
+        # URLs and phone numbers of the same chunks, extracted once at ingest.
+        self.entity_index = EntityIndex() if ENTITY_INDEX_ENABLED else None
+
+        # Query vectors depend only on the query text and the model, so
+        # repeated questions skip the embeddings round-trip.
+        self.query_embedding_cache = TTLCache(QUERY_EMBEDDING_CACHE_SIZE, QUERY_EMBEDDING_CACHE_TTL)
 
     async def add_texts(self, texts: List[str], metadatas: List[Dict] = None):
         """
         Async wrapper for adding a list of text documents to the Chroma store with optional metadata.
+        Embeds, stores and persists in one go; errors are logged, not raised.
+        Bulk ingestion should go through IngestBatcher instead.
+        """
+        try:
+            await self.add_text_batch(texts, metadatas)
+            await self.persist()
+        except Exception as e:
+            logger.error(f"[ADD_TEXTS] Error adding texts to vector store: {e}")
+
+    async def add_text_batch(self, texts: List[str], metadatas: List[Dict] = None, ids: List[str] = None):
+        """
+        Embed and store one batch of texts without persisting.
+        Texts stored under existing `ids` are overwritten.
+        Raises on failure so the caller can decide what to retry.
         """
         if not metadatas:
             metadatas = [{} for _ in texts]
 
+        logger.info(f"[ADD_TEXTS] Adding {len(texts)} documents to VectorStore.")
+        # Wrap synchronous add_texts in asyncio.to_thread
+        await asyncio.to_thread(self.vstore.add_texts, texts, metadatas, ids=ids)
+        if self.lexical_index is not None and ids:
+            await asyncio.to_thread(self.lexical_index.add_chunks, ids, texts, metadatas)
+        if self.entity_index is not None and ids:
+            await asyncio.to_thread(self.entity_index.add_chunks, ids, texts, metadatas)
+
+    async def get_chunk_ids(self, page_id: str) -> List[str]:
+        """
+        IDs of every chunk stored for a page, looked up by metadata.
+        """
+        result = await asyncio.to_thread(self.vstore.get, where={"page_id": page_id}, include=[])
+        return result.get("ids", [])
+
+    async def delete_chunks(self, ids: List[str]):
+        """
+        Delete chunks by ID. Raises on failure.
+        """
+        if not ids:
+            return
+        logger.info(f"[DELETE_CHUNKS] Deleting {len(ids)} chunks from VectorStore.")
+        await asyncio.to_thread(self.vstore.delete, ids=ids)
+        if self.lexical_index is not None:
+            await asyncio.to_thread(self.lexical_index.remove_chunks, ids)
+        if self.entity_index is not None:
+            await asyncio.to_thread(self.entity_index.remove_chunks, ids)
+
+    async def persist(self):
+        """
+        Flush the store to disk. Chroma >= 0.4 persists on every write and has
+        no persist() anymore, in which case this is a no-op.
+        """
+        persist_fn = getattr(self.vstore, "persist", None)
+        if persist_fn is None:
+            return
+        # Wrap synchronous persist in asyncio.to_thread
+        await asyncio.to_thread(persist_fn)
+        logger.info("[ADD_TEXTS] Done persisting data.")
+
+    async def embed_query(self, query: str) -> List[float]:
+        """
+        Embedding of a query, served from the query-embedding cache when the
+        same (normalized) question was embedded before. The question is
+        embedded as asked; only the cache key is normalized.
+        """
+        normalized = normalize_query(query)
+        vector = self.query_embedding_cache.get(normalized)
+        count_cache_lookup("query_embeddings", vector is not None)
+        if vector is None:
+            with span("vectorstore.embed_query"):
+                vector = await asyncio.to_thread(self.embedding_fn.embed_query, query)
+            self.query_embedding_cache.put(normalized, vector)
+        return vector
+
+    async def warm_up(self):
+        """
+        Load what the first query would otherwise wait for: a local embedding
+        model, and the vector index, through one throwaway search. OpenAI
+        embeddings are not called, as that would cost a request; a zero
+        vector of the known dimension searches the index instead. Failures
+        are logged, not raised: the first query will simply be slower.
+        """
         try:
-            logger.info(f"[ADD_TEXTS] Adding {len(texts)} documents to VectorStore.")
-            # Wrap synchronous add_texts in asyncio.to_thread
-            await asyncio.to_thread(self.vstore.add_texts, texts, metadatas)
-            # Wrap synchronous persist in asyncio.to_thread
-            await asyncio.to_thread(self.vstore.persist)
-            logger.info("[ADD_TEXTS] Done persisting data.")
+            with span("vectorstore.warm_up"):
+                if self.embedding_signature.provider != "openai":
+                    vector = await asyncio.to_thread(self.embedding_fn.embed_query, "warm up")
+                elif self.embedding_signature.dimension:
+                    vector = [0.0] * self.embedding_signature.dimension
+                else:
+                    return
+                await asyncio.to_thread(self.vstore.similarity_search_by_vector_with_relevance_scores, vector, k=1)
         except Exception as e:
-            logger.error(f"[ADD_TEXTS] Error adding texts to vector store: {e}")
+            logger.warning(f"[INIT_VECTORSTORE] Warm-up search failed: {e}")
 
     async def similarity_search_with_scores(
         self, query: str, k: int = 3
@@ -56,8 +229,12 @@ class VectorStoreManager:
         logger.info(f"[SIMILARITY_SEARCH] Query='{query}', top_k={k}")
         results_with_scores = []
         try:
-            # Wrap synchronous similarity_search_with_score in asyncio.to_thread
-            results = await asyncio.to_thread(self.vstore.similarity_search_with_score, query, k=k)
+            query_vector = await self.embed_query(query)
+            # Same distance scores as similarity_search_with_score, minus the embedding call
+            with span("vectorstore.search"):
+                results = await asyncio.to_thread(
+                    self.vstore.similarity_search_by_vector_with_relevance_scores, query_vector, k=k
+                )
             # results is typically List[Tuple[Document, float]]
             for doc, score in results:
                 doc_text = doc.page_content
@@ -69,27 +246,37 @@ class VectorStoreManager:
 
         return results_with_scores
 
-    async def delete_document(self, page_id: str):
+    async def delete_document(self, page_id: str, chunk_ids: List[str] = None) -> int:
         """
         Delete a document from the vector store based on page_id.
+        Only that page's chunks are touched. Pass the page's `chunk_ids` (from
+        the registry) to skip the metadata lookup. Returns the number of chunks
+        deleted; raises on failure.
         """
-        try:
-            logger.info(f"[DELETE_DOCUMENT] Deleting document with page_id={page_id}")
-            # Chroma doesn't support deletion by metadata directly.
-            # Workaround: Retrieve all documents, filter out the one with page_id, and recreate the collection.
-            # This is not efficient for large datasets. Consider using a more suitable vector store if deletion is frequent.
-
-            all_docs = await asyncio.to_thread(self.vstore.get, where={}, limit=-1)
-            docs_to_keep = [doc for doc in all_docs.documents if doc.metadata.get("page_id") != page_id]
+        return await self.delete_documents([page_id], {page_id: chunk_ids} if chunk_ids is not None else None)
 
-            # Clear existing collection
-            await asyncio.to_thread(self.vstore.delete_collection)
+    async def delete_documents(self, page_ids: List[str], chunk_ids_by_page: Dict[str, List[str]] = None) -> int:
+        """
+        Bulk-delete many pages with a single lookup and a single delete call.
+        `chunk_ids_by_page` maps page_id -> known chunk IDs; pages missing from
+        it are resolved through their `page_id` metadata. Returns the number of
+        chunks deleted; raises on failure.
+        """
+        chunk_ids_by_page = chunk_ids_by_page or {}
+        ids = []
+        unresolved = []
+        for page_id in page_ids:
+            known = chunk_ids_by_page.get(page_id)
+            if known is None:
+                unresolved.append(page_id)
+            else:
+                ids.extend(known)
 
-            # Re-add the filtered documents
-            texts = [doc.page_content for doc in docs_to_keep]
-            metadatas = [doc.metadata for doc in docs_to_keep]
-            await self.add_texts(texts, metadatas)
+        if unresolved:
+            where = {"page_id": unresolved[0]} if len(unresolved) == 1 else {"page_id": {"$in": unresolved}}
+            result = await asyncio.to_thread(self.vstore.get, where=where, include=[])
+            ids.extend(result.get("ids", []))
 
-            logger.info(f"[DELETE_DOCUMENT] Document with page_id={page_id} deleted successfully.")
-        except Exception as e:
-            logger.error(f"[DELETE_DOCUMENT] Error deleting document: {e}", exc_info=True)
+        logger.info(f"[DELETE_DOCUMENT] Deleting {len(page_ids)} pages ({len(ids)} chunks).")
+        await self.delete_chunks(ids)
+        return len(ids)
@@ -5,16 +5,26 @@ import sys
 import asyncio
 import logging
 import argparse
+from datetime import datetime, timedelta, timezone
+from functools import partial
 
 from dotenv import load_dotenv
 
-from .core.confluence_loader import ConfluenceLoader
-from .core.doc_processor import process_confluence_page
-from .core.doc_registry import load_registry, save_registry, compute_content_hash
+from .core.confluence_loader import ConfluenceLoader, CrawlReport
+from .core.doc_processor import process_confluence_page, process_attachment
+from .core.doc_registry import (
+    open_registry, DocRegistry, compute_content_hash, compute_chunk_id,
+    get_entry_hash, get_entry_chunk_ids, get_registry_chunk_ids, load_checkpoint, save_checkpoint,
+    bump_corpus_version
+)
 from .core.vectorstore_manager import VectorStoreManager
-
-from .core.advanced_rag_pipeline import CustomConversationalRAGPipeline
-from .API import app 
+from .core.ingest_batcher import IngestBatcher
+from .core.processing_pool import PageProcessingPool, INGEST_WORKERS, INGEST_BATCH_SIZE
+from .core.attachments import (
+    AttachmentExtractor, AttachmentTooLarge, ExtractionError, ATTACHMENTS_ENABLED
+)
+from .core.ingest_jobs import IngestProgress
+from .core.metrics import span, INGEST_PAGES, INGEST_ATTACHMENTS
 
 load_dotenv()
 
@@ -25,107 +35,405 @@ CONFLUENCE_URL = os.getenv("CONFLUENCE_URL")
 CONFLUENCE_USERNAME = os.getenv("CONFLUENCE_USERNAME")
 CONFLUENCE_API_TOKEN = os.getenv("CONFLUENCE_API_TOKEN")
 CONFLUENCE_SPACE_KEY = os.getenv("CONFLUENCE_SPACE_KEY", "TD")
+CONFLUENCE_MAX_CONCURRENCY = int(os.getenv("CONFLUENCE_MAX_CONCURRENCY", "8"))
+DELTA_SYNC_OVERLAP_MINUTES = int(os.getenv("DELTA_SYNC_OVERLAP_MINUTES", "1440"))
+# A delta run refuses to delete more than this share of the checkpointed
+# pages: a listing that small is more likely broken than true.
+DELTA_MAX_DELETE_FRACTION = float(os.getenv("DELTA_MAX_DELETE_FRACTION", "0.5"))
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+API_HOST = os.getenv("API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("API_PORT", "5000"))
+
 
+class DeltaSyncAborted(RuntimeError):
+    """A delta run's ID listing would delete too much of the space."""
 
-async def fetch_and_ingest_pages(space_key: str, vectorstore_manager: VectorStoreManager):
+
+async def fetch_and_ingest_pages(space_key: str, vectorstore_manager: VectorStoreManager, delta: bool = False,
+                                 workers: int = INGEST_WORKERS, batch_size: int = INGEST_BATCH_SIZE,
+                                 attachments: bool = ATTACHMENTS_ENABLED, progress: IngestProgress = None):
     """
-    1) Fetch pages from Confluence (async).
-    2) Process them (clean, chunk).
-    3) Embed them if new or changed (using doc_registry).
+    Streaming ingest pipeline:
+    1) Fetch pages from Confluence concurrently (async).
+    2) Process each page (clean, chunk) as soon as it arrives, in a pool of
+       `workers` processes fed `batch_size` pages at a time when workers > 0.
+    3) Queue it for embedding right away if new or changed (using doc_registry).
+       Chunks of many pages are embedded together in token-aware batches
+       while the remaining pages are still being fetched.
     4) Collect the raw text for fallback retrieval (URL/phone/keyword).
+    5) With attachments=True, do the same for the supported attachments of
+       the space (see AttachmentExtractor), keyed by attachment ID and version.
+
+    With delta=True and a checkpoint from a previous run, only pages modified
+    since that checkpoint are downloaded, and pages that disappeared from the
+    space (found via a cheap ID-only listing) are removed from the vector store
+    and registry. Without a checkpoint, a delta run falls back to a full crawl.
+    Every successful run records a fresh checkpoint for the space.
+    If the listing is empty, or would remove more than
+    DELTA_MAX_DELETE_FRACTION of the checkpointed pages, nothing is deleted
+    and DeltaSyncAborted is raised; a full run resets the checkpoint.
+
+    If `progress` is given, its counts are kept up to date while the run
+    goes, for the ingestion job status endpoint.
+
+    Pages whose Confluence version matches the registry are skipped without
+    downloading their body. Pages whose body cannot be fetched count as
+    failed: they are not recorded, and the checkpoint is not advanced.
     Returns:
       updated_count: int - number of new or updated pages embedded.
-      all_docs_text: list[str] - all "cleaned_text" from each page for the HybridRetriever.
+      all_docs_text: list[str] - "cleaned_text" of each fetched page.
+        Pages skipped as unchanged, and in delta mode pages not modified, are not included.
     """
-    registry = load_registry()
+    with span("ingest.total"):
+        return await _fetch_and_ingest_pages(space_key, vectorstore_manager, delta, workers, batch_size, attachments,
+                                             progress or IngestProgress())
+
+
+async def _fetch_and_ingest_pages(space_key: str, vectorstore_manager: VectorStoreManager, delta: bool,
+                                  workers: int, batch_size: int, attachments: bool, progress: IngestProgress):
+    registry = open_registry()
     loader = ConfluenceLoader(
         url=CONFLUENCE_URL,
         username=CONFLUENCE_USERNAME,
-        api_token=CONFLUENCE_API_TOKEN
+        api_token=CONFLUENCE_API_TOKEN,
+        max_concurrency=CONFLUENCE_MAX_CONCURRENCY
     )
 
+    sync_started = datetime.now(timezone.utc)
+    checkpoint = load_checkpoint(space_key) if delta else None
+    modified_since = None
+    current_page_ids = None
+    current_attachment_ids = None
+    deleted_count = 0
+
+    if checkpoint:
+        # Confluence evaluates CQL dates in its own timezone, so look back a
+        # little further than the checkpoint. Unchanged pages are still
+        # filtered out by their content hash.
+        modified_since = (
+            datetime.fromisoformat(checkpoint["last_sync"])
+            - timedelta(minutes=DELTA_SYNC_OVERLAP_MINUTES)
+        )
+        with span("ingest.list_page_ids"):
+            current_page_ids = await loader.fetch_page_ids_in_space(space_key)
+            deleted_page_ids = _checked_deletions(space_key, "pages", checkpoint.get("page_ids", []),
+                                                  current_page_ids)
+            deleted_attachment_ids = set()
+            if attachments and "attachment_ids" in checkpoint:
+                current_attachment_ids = await loader.fetch_page_ids_in_space(space_key, content_type="attachment")
+                deleted_attachment_ids = _checked_deletions(space_key, "attachments", checkpoint["attachment_ids"],
+                                                            current_attachment_ids)
+        with span("ingest.remove_deleted"):
+            deleted_count = await _remove_deleted_pages(deleted_page_ids, registry, vectorstore_manager)
+            deleted_count += await _remove_deleted_pages(deleted_attachment_ids, registry, vectorstore_manager)
+        progress.deleted = deleted_count
+        logger.info(f"[INGEST] Delta sync for '{space_key}' since {modified_since.isoformat()}.")
+
     logger.info(f"[INGEST] Fetching pages from space '{space_key}'...")
-    pages = await loader.fetch_all_pages_in_space(space_key)
-    if not pages:
+    queued_pages = {}
+
+    async def record_pages(page_ids):
+        # Called by the batcher as pages become fully stored, so progress
+        # survives an interrupted run. Only such pages are recorded; failed
+        # pages are picked up again by the next run. queued_pages is always
+        # filled first: nothing awaits between add_page() and that assignment.
+        await _record_stored_pages([(page_id, queued_pages[page_id]) for page_id in page_ids],
+                                   registry, vectorstore_manager)
+        progress.embedded += len(page_ids)
+
+    batcher = IngestBatcher(vectorstore_manager, on_pages_stored=record_pages)
+    all_docs_text = []
+    seen_page_ids = set()
+    crawl = CrawlReport()
+
+    # An empty registry has nothing to compare; let bodies come with the search.
+    registered_pages = await asyncio.to_thread(len, registry)
+    pages = _counted(loader.iter_pages_in_space(
+        space_key, modified_since=modified_since, report=crawl,
+        known_versions=partial(_known_versions, registry) if registered_pages else None
+    ), progress)
+    processing_pool = PageProcessingPool(process_confluence_page, workers=workers, batch_size=batch_size)
+    # Fetching, processing and embedding overlap; this covers the first two
+    # and whatever embedding finishes before the last page arrives.
+    with span("ingest.crawl"):
+        async for processed in processing_pool.process(pages):
+            seen_page_ids.add(processed["page_id"])
+            all_docs_text.append(processed["cleaned_text"])
+            progress.processed += 1
+            queued = await _maybe_embed_page(processed, registry, batcher, vectorstore_manager)
+            if queued is not None:
+                queued_pages[processed["page_id"]] = queued
+    INGEST_PAGES.inc(len(seen_page_ids), result="fetched")
+    INGEST_PAGES.inc(len(crawl.unchanged_ids), result="unchanged")
+    progress.unchanged = len(crawl.unchanged_ids)
+    if crawl.failed_page_ids:
+        progress.add_error(f"{len(crawl.failed_page_ids)} pages could not be fetched.")
+    listed_page_ids = seen_page_ids | crawl.unchanged_ids | crawl.failed_page_ids
+
+    if not listed_page_ids and modified_since is None:
+        # Nothing was queued yet, so there is nothing for the batcher to flush.
         logger.warning("[INGEST] No pages found. Check space key or permissions.")
         return 0, []
 
-    tasks = []
-    all_docs_text = []
-
-    for page in pages:
-        processed = process_confluence_page(page)
-        all_docs_text.append(processed["cleaned_text"])
-        tasks.append(_maybe_embed_page(processed, registry, vectorstore_manager))
-
-    results = await asyncio.gather(*tasks, return_exceptions=True)
-    updated_count = sum(r for r in results if isinstance(r, int))
-
-    if updated_count > 0:
-        save_registry(registry)
-        logger.info(f"[INGEST] {updated_count} pages embedded/updated.")
+    listed_attachment_ids, failed_attachment_ids = set(), set()
+    if attachments:
+        with span("ingest.attachments"):
+            listed_attachment_ids, failed_attachment_ids = await _ingest_attachments(
+                space_key, loader, registry, batcher, vectorstore_manager, modified_since, queued_pages, progress
+            )
+
+    with span("ingest.embed_flush"):
+        report = await batcher.close()
+
+    updated_count = len(report.embedded_pages)
+    failed_count = len(report.failed_pages | crawl.failed_page_ids | failed_attachment_ids)
+    INGEST_PAGES.inc(updated_count, result="embedded")
+    INGEST_PAGES.inc(failed_count, result="failed")
+    INGEST_PAGES.inc(deleted_count, result="deleted")
+    progress.failed = failed_count
+    for failure in report.failures:
+        progress.add_error(f"Embedding batch {failure.batch_index} ({len(failure.page_ids)} pages) failed: "
+                           f"{failure.error}")
+
+    if updated_count > 0 or deleted_count > 0:
+        # Cached answers were built from the old corpus.
+        await asyncio.to_thread(bump_corpus_version)
+        logger.info(f"[INGEST] {updated_count} pages embedded/updated, {deleted_count} removed.")
     else:
         logger.info("[INGEST] No new or updated pages found.")
 
+    if failed_count:
+        # A failed page will not look modified to the next delta run, so the
+        # checkpoint only moves forward once a run gets through cleanly.
+        logger.warning(f"[INGEST] {failed_count} pages failed; checkpoint for '{space_key}' not advanced.")
+    else:
+        checkpoint = {
+            "last_sync": sync_started.isoformat(),
+            "page_ids": sorted(current_page_ids if current_page_ids is not None else listed_page_ids),
+        }
+        if attachments:
+            checkpoint["attachment_ids"] = sorted(
+                current_attachment_ids if current_attachment_ids is not None else listed_attachment_ids
+            )
+        await asyncio.to_thread(save_checkpoint, space_key, checkpoint)
+
     return updated_count, all_docs_text
 
 
-async def _maybe_embed_page(processed_page: dict, registry: dict, vs_manager: VectorStoreManager) -> int:
+def _checked_deletions(space_key: str, kind: str, checkpointed_ids, current_ids: set) -> set:
     """
-    Checks if page is new or updated. If so, embed in vector store.
-    Returns 1 if embedded, else 0.
+    IDs of the checkpoint missing from `current_ids`, the fresh listing.
+    Raises DeltaSyncAborted if the listing is empty or lost more than
+    DELTA_MAX_DELETE_FRACTION of the checkpoint: a renamed space, a token
+    that lost read access or a rebuilding search index look just like
+    that, and must not wipe the space.
     """
-    try:
-        page_id = processed_page["page_id"]
-        cleaned_text = processed_page["cleaned_text"]
-        current_hash = compute_content_hash(cleaned_text)
-
-        if page_id not in registry:
-            logger.info(f"[INGEST] New page_id={page_id}, embedding.")
-            await embed_page(vs_manager, processed_page)
-            registry[page_id] = current_hash
-            return 1
+    checkpointed_ids = set(checkpointed_ids)
+    missing = checkpointed_ids - current_ids
+    if checkpointed_ids and (not current_ids or len(missing) > DELTA_MAX_DELETE_FRACTION * len(checkpointed_ids)):
+        message = (f"Listing of '{space_key}' is missing {len(missing)} of {len(checkpointed_ids)} checkpointed "
+                   f"{kind}; nothing deleted. Run a full ingestion if they were really removed.")
+        logger.error(f"[INGEST] {message}")
+        raise DeltaSyncAborted(message)
+    return missing
+
+
+async def _ingest_attachments(space_key: str, loader: ConfluenceLoader, registry: DocRegistry,
+                              batcher: IngestBatcher, vs_manager: VectorStoreManager, modified_since, queued_pages,
+                              progress: IngestProgress):
+    """
+    Download, extract and queue for embedding the new or changed attachments
+    of the space, like pages; their entries go to `queued_pages`.
+    Returns (IDs of all attachments listed, IDs of those that failed).
+    """
+    crawl = CrawlReport()
+    listed, failed = set(), set()
+    attachments = loader.iter_attachments_in_space(
+        space_key, modified_since=modified_since, known_versions=partial(_known_versions, registry), report=crawl
+    )
+    async for attachment, text, error in AttachmentExtractor().extract_all(loader, attachments):
+        attachment_id = attachment["id"]
+        listed.add(attachment_id)
+        if isinstance(error, (AttachmentTooLarge, ExtractionError, TimeoutError)):
+            # Trying again will not help until the file changes: record this
+            # version with no text, so later runs skip it.
+            logger.warning(f"[INGEST] Skipping attachment {attachment['title']!r} ({attachment_id}): {error}")
+            INGEST_ATTACHMENTS.inc(result="skipped")
+            text = ""
+        elif error is not None:
+            logger.error(f"[INGEST] Error fetching attachment {attachment['title']!r} ({attachment_id}): {error}")
+            INGEST_ATTACHMENTS.inc(result="failed")
+            progress.add_error(f"Attachment {attachment['title']!r} ({attachment_id}): {error}")
+            failed.add(attachment_id)
+            continue
         else:
-            old_hash = registry[page_id]
-            if current_hash != old_hash:
-                logger.info(f"[INGEST] Updated page_id={page_id}, re-embedding.")
-                await embed_page(vs_manager, processed_page)
-                registry[page_id] = current_hash
-                return 1
-            else:
-                logger.debug(f"[INGEST] No change for page_id={page_id}. Skipped.")
-                return 0
-    except Exception as e:
-        logger.error(f"[INGEST] Error embedding page: {e}", exc_info=True)
+            INGEST_ATTACHMENTS.inc(result="extracted")
+
+        queued = await _maybe_embed_page(process_attachment(attachment, text), registry, batcher, vs_manager)
+        if queued is not None:
+            queued_pages[attachment_id] = queued
+    INGEST_ATTACHMENTS.inc(len(crawl.unchanged_ids), result="unchanged")
+    return listed | crawl.unchanged_ids, failed
+
+
+async def _counted(pages, progress: IngestProgress):
+    async for page in pages:
+        progress.fetched += 1
+        yield page
+
+
+def _known_versions(registry: DocRegistry, page_ids) -> dict:
+    """
+    Registered Confluence versions of `page_ids`, for ConfluenceLoader,
+    which calls it in a worker thread.
+    """
+    return {page_id: entry["version"] for page_id, entry in registry.get_many(page_ids).items()
+            if entry["version"] is not None}
+
+
+async def _record_stored_pages(stored, registry: DocRegistry, vs_manager: VectorStoreManager):
+    """
+    Remove the stale chunks of fully stored pages, then record the pages in
+    the registry, in one transaction. `stored` holds (page_id, queued) pairs
+    as returned by _maybe_embed_page().
+    """
+    # Old chunks are removed only after their replacements are stored, so a
+    # page never disappears from search while it is being updated. They go
+    # before the registry entry that stops listing them.
+    stale_chunk_ids = [chunk_id for _, queued in stored for chunk_id in queued["stale_chunk_ids"]]
+    if stale_chunk_ids:
+        try:
+            with span("ingest.delete_stale"):
+                await vs_manager.delete_chunks(stale_chunk_ids)
+        except Exception as e:
+            logger.error(f"[INGEST] Error removing {len(stale_chunk_ids)} stale chunks: {e}", exc_info=True)
+
+    with span("ingest.record_pages"):
+        await asyncio.to_thread(registry.upsert_many, {
+            page_id: {"hash": queued["hash"], "chunk_ids": queued["chunk_ids"], "version": queued["version"]}
+            for page_id, queued in stored
+        })
+
+
+async def delete_pages(page_ids, vectorstore_manager: VectorStoreManager) -> int:
+    """
+    Remove pages from the vector store and the registry. Only the chunks of
+    those pages are touched, found through the registry's chunk IDs.
+    Returns the number of chunks deleted.
+    """
+    registry = open_registry()
+    # Registry reads and writes are blocking SQLite calls; keep them off the event loop.
+    chunk_ids_by_page = await asyncio.to_thread(get_registry_chunk_ids, registry, page_ids)
+    deleted_chunks = await vectorstore_manager.delete_documents(list(page_ids), chunk_ids_by_page=chunk_ids_by_page)
+    await asyncio.to_thread(registry.delete_many, page_ids)
+    if deleted_chunks:
+        await asyncio.to_thread(bump_corpus_version)
+    return deleted_chunks
+
+
+async def _remove_deleted_pages(deleted_page_ids: set, registry: DocRegistry,
+                                vs_manager: VectorStoreManager) -> int:
+    """
+    Drop pages that no longer exist in Confluence from the vector store and registry.
+    Returns the number of pages removed.
+    """
+    if not deleted_page_ids:
         return 0
+    logger.info(f"[INGEST] {len(deleted_page_ids)} pages were deleted in Confluence, removing.")
+    chunk_ids_by_page = await asyncio.to_thread(get_registry_chunk_ids, registry, deleted_page_ids)
+    await vs_manager.delete_documents(sorted(deleted_page_ids), chunk_ids_by_page=chunk_ids_by_page)
+    await asyncio.to_thread(registry.delete_many, deleted_page_ids)
+    return len(deleted_page_ids)
 
 
-async def embed_page(vs_manager: VectorStoreManager, processed_page: dict):
+async def _maybe_embed_page(processed_page: dict, registry: DocRegistry, batcher: IngestBatcher,
+                            vs_manager: VectorStoreManager):
     """
-    Actually adds the chunked text to the vector store.
+    Checks if page is new or updated. If so, queue its new or changed chunks
+    for embedding; chunks whose content-addressed ID is already stored for
+    the page are left alone.
+    Returns None if the page is unchanged, else a dict with the page "hash",
+    "version", its current "chunk_ids" and the "stale_chunk_ids" to delete
+    once the new chunks are stored. The registry itself is only updated once
+    the batcher reports the page stored.
     """
     page_id = processed_page["page_id"]
-    chunks = processed_page["chunks"]
-    title = processed_page["title"]
+    cleaned_text = processed_page["cleaned_text"]
+    current_hash = compute_content_hash(cleaned_text)
+    entry = await asyncio.to_thread(registry.get, page_id)
+
+    if entry is None:
+        logger.info(f"[INGEST] New page_id={page_id}, embedding.")
+        old_chunk_ids = []
+    elif current_hash != get_entry_hash(entry):
+        logger.info(f"[INGEST] Updated page_id={page_id}, re-embedding changed chunks.")
+        old_chunk_ids = get_entry_chunk_ids(entry)
+        if old_chunk_ids is None:
+            # Registered before chunk IDs were tracked: ask the store instead.
+            old_chunk_ids = await vs_manager.get_chunk_ids(page_id)
+    else:
+        logger.debug(f"[INGEST] No change for page_id={page_id}. Skipped.")
+        return None
 
-    metas = [{"page_id": page_id, "title": title} for _ in chunks]
-    logger.debug(f"[EMBED_PAGE] Embedding {len(chunks)} chunks for page_id={page_id}")
-    await vs_manager.add_texts(chunks, metas)
+    chunk_ids = await embed_page(batcher, processed_page, existing_chunk_ids=set(old_chunk_ids))
+    return {
+        "hash": current_hash,
+        "version": processed_page.get("version"),
+        "chunk_ids": chunk_ids,
+        "stale_chunk_ids": sorted(set(old_chunk_ids) - set(chunk_ids)),
+    }
 
 
-async def interactive_query_loop(all_docs_text=None):
+async def embed_page(batcher: IngestBatcher, processed_page: dict, existing_chunk_ids: set = frozenset()):
+    """
+    Hands the chunked text to the ingest batcher, which embeds it together
+    with chunks of other pages. Chunks listed in `existing_chunk_ids` are
+    already stored and are skipped.
+    Returns the page's chunk IDs in chunk order.
+    """
+    page_id = processed_page["page_id"]
+    chunks = processed_page["chunks"]
+    spans = processed_page.get("chunk_spans")
+    title = processed_page["title"]
+
+    chunk_ids = []
+    new_chunks, new_ids, new_metas = [], [], []
+    for chunk_index, chunk in enumerate(chunks):
+        chunk_id = compute_chunk_id(page_id, chunk)
+        if chunk_id in chunk_ids:
+            # Identical text twice on one page: one stored copy is enough.
+            continue
+        chunk_ids.append(chunk_id)
+        if chunk_id not in existing_chunk_ids:
+            new_chunks.append(chunk)
+            new_ids.append(chunk_id)
+            meta = {"page_id": page_id, "title": title, "chunk_id": chunk_id, "chunk_index": chunk_index}
+            if processed_page.get("parent_page_id"):
+                meta["parent_page_id"] = processed_page["parent_page_id"]
+            if spans:
+                chunk_span = spans[chunk_index]
+                meta.update(section=chunk_span.section, start=chunk_span.start, end=chunk_span.end)
+            new_metas.append(meta)
+
+    logger.debug(f"[EMBED_PAGE] Queueing {len(new_chunks)}/{len(chunk_ids)} chunks for page_id={page_id}")
+    await batcher.add_page(page_id, new_chunks, new_metas, new_ids)
+    return chunk_ids
+
+
+async def interactive_query_loop():
     """
     1) Create the VectorStoreManager.
-    2) Create the CustomConversationalRAGPipeline with all_docs_text for HybridRetriever.
+    2) Create the CustomConversationalRAGPipeline.
     3) Enter an interactive user loop.
     """
+    # Imported here so that ingest-only runs do not load the chat model client.
+    from .core.advanced_rag_pipeline import CustomConversationalRAGPipeline
+
     vs_manager = VectorStoreManager()
     pipeline = CustomConversationalRAGPipeline(
         vectorstore_manager=vs_manager,
-        openai_api_key=OPENAI_API_KEY,
-        all_docs_text=all_docs_text or []
+        openai_api_key=OPENAI_API_KEY
     )
 
     print("\n=== Confluence Knowledge Assistant (Hybrid + Conversational) ===")
@@ -143,36 +451,37 @@ async def interactive_query_loop(all_docs_text=None):
         print(f"\nAnswer: {answer}\n")
 
 
-async def run_ingestion_only():
+async def run_ingestion_only(delta: bool = False, workers: int = INGEST_WORKERS, batch_size: int = INGEST_BATCH_SIZE):
     """
     Just ingest docs and exit.
     """
     vs_manager = VectorStoreManager()
-    updated_count, _ = await fetch_and_ingest_pages(CONFLUENCE_SPACE_KEY, vs_manager)
+    updated_count, _ = await fetch_and_ingest_pages(
+        CONFLUENCE_SPACE_KEY, vs_manager, delta=delta, workers=workers, batch_size=batch_size
+    )
     logger.info(f"[MAIN] Ingestion complete. {updated_count} new/updated pages.")
 
 
 async def run_query_only():
     """
-    If user runs only 'query' mode, we won't have doc_text for fallback logic
-    unless we store it somewhere. We'll pass an empty list here,
-    meaning phone/URL fallback won't function. But embedding-based queries
-    still work if you've ingested previously.
+    Query what a previous ingestion stored, without ingesting first.
     """
-    await interactive_query_loop(all_docs_text=None)
+    await interactive_query_loop()
 
 
-async def run_all():
+async def run_all(delta: bool = False, workers: int = INGEST_WORKERS, batch_size: int = INGEST_BATCH_SIZE):
     """
-    1) Ingest docs from Confluence (and gather doc_text for fallback).
+    1) Ingest docs from Confluence.
     2) Start interactive Q&A loop with HybridRetriever + memory.
     """
     vs_manager = VectorStoreManager()
-    updated_count, all_docs_text = await fetch_and_ingest_pages(CONFLUENCE_SPACE_KEY, vs_manager)
+    updated_count, _ = await fetch_and_ingest_pages(
+        CONFLUENCE_SPACE_KEY, vs_manager, delta=delta, workers=workers, batch_size=batch_size
+    )
     logger.info(f"[MAIN] Ingestion done, {updated_count} new/updated pages.")
 
-    # Now run queries. We pass 'all_docs_text' so fallback logic for URLs, phones, etc. works.
-    await interactive_query_loop(all_docs_text)
+    # Now run queries.
+    await interactive_query_loop()
 
 
 def parse_args():
@@ -181,7 +490,23 @@ def parse_args():
     )
     parser.add_argument(
         "--mode", default="all", choices=["all", "ingest", "query", "api"],
-        help="Which mode to run: 'ingest' only, 'query' only, 'all' (both), or 'api' to run the Flask API."
+        help="Which mode to run: 'ingest' only, 'query' only, 'all' (both), or 'api' to run the API server."
+    )
+    parser.add_argument(
+        "--server", default="asgi", choices=["asgi", "flask"],
+        help="API server for --mode api: 'asgi' (uvicorn, one event loop, concurrency-limited) or the legacy 'flask' app."
+    )
+    parser.add_argument(
+        "--delta", action="store_true",
+        help="Only fetch pages modified since the last sync of the space (and drop deleted pages)."
+    )
+    parser.add_argument(
+        "--workers", type=int, default=INGEST_WORKERS,
+        help="Worker processes that clean and chunk pages during ingestion (0 processes them on the main thread)."
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=INGEST_BATCH_SIZE,
+        help="Pages sent to a worker process at a time."
     )
     return parser.parse_args()
 
@@ -189,14 +514,22 @@ def parse_args():
 def main():
     args = parse_args()
     if args.mode == "ingest":
-        asyncio.run(run_ingestion_only())
+        asyncio.run(run_ingestion_only(delta=args.delta, workers=args.workers, batch_size=args.batch_size))
     elif args.mode == "query":
         asyncio.run(run_query_only())
     elif args.mode == "api":
-        # Run the Flask API
-        app.run(host='0.0.0.0', port=5000)
+        if args.server == "flask":
+            # Run the Flask API
+            from .API.routes import app, warm_up, start_ingest_schedules
+            asyncio.run(warm_up())
+            start_ingest_schedules()
+            app.run(host=API_HOST, port=API_PORT)
+        else:
+            import uvicorn
+            from .API.asgi import app as asgi_app
+            uvicorn.run(asgi_app, host=API_HOST, port=API_PORT)
     else:
-        asyncio.run(run_all())
+        asyncio.run(run_all(delta=args.delta, workers=args.workers, batch_size=args.batch_size))
 
 
 if __name__ == "__main__":
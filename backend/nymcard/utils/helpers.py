@@ -5,17 +5,21 @@ import asyncio
 
 logger = logging.getLogger(__name__)
 
+# Lazily loaded tiktoken encoding; False once loading has failed (e.g. offline).
+_TOKEN_ENCODING = None
+
+_URL_PATTERN = re.compile(r'https?://\S+', re.IGNORECASE)
+_PHONE_PATTERN = re.compile(r'(\+?\d{1,3}[-.\s]?(\d{2,4}[-.\s]?){1,3}\d{3,4})')
+
 def extract_urls(text: str) -> list:
     """Extract URLs from the given text."""
-    url_pattern = re.compile(r'https?://\S+', re.IGNORECASE)
-    urls = url_pattern.findall(text)
+    urls = _URL_PATTERN.findall(text)
     logger.debug(f"Extracted URLs: {urls}")
     return urls
 
 def extract_phone_numbers(text: str) -> list:
     """Extract phone numbers from the given text."""
-    phone_pattern = re.compile(r'(\+?\d{1,3}[-.\s]?(\d{2,4}[-.\s]?){1,3}\d{3,4})')
-    phones = phone_pattern.findall(text)
+    phones = _PHONE_PATTERN.findall(text)
     extracted_phones = [ph[0] for ph in phones]
     logger.debug(f"Extracted Phone Numbers: {extracted_phones}")
     return extracted_phones
@@ -29,11 +33,23 @@ def run_async(coro):
         asyncio.set_event_loop(loop)
     return loop.run_until_complete(coro)
 
-def clean_text(html_text: str) -> str:
-    """Basic HTML cleanup."""
-    text = re.sub(r"<[^>]+>", " ", html_text)
-    text = re.sub(r"\s+", " ", text)
-    return text.strip()
+def count_tokens(text: str) -> int:
+    """
+    Count tokens with tiktoken's cl100k_base encoding (used by OpenAI's chat
+    and embedding models). Falls back to a ~4 characters/token estimate when
+    tiktoken or its encoding file is unavailable.
+    """
+    global _TOKEN_ENCODING
+    if _TOKEN_ENCODING is None:
+        try:
+            import tiktoken
+            _TOKEN_ENCODING = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            logger.warning(f"tiktoken unavailable, estimating token counts: {e}")
+            _TOKEN_ENCODING = False
+    if _TOKEN_ENCODING:
+        return len(_TOKEN_ENCODING.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
 
 def get_project_root() -> str:
     """Returns the absolute path to the project root directory."""
@@ -10,11 +10,12 @@ import os
 class TestAdvancedRAGPipeline(unittest.TestCase):
 
     @patch("core.advanced_rag_pipeline.HybridRetriever")
-    @patch("core.advanced_rag_pipeline.ConversationBufferMemory")
+    @patch("core.advanced_rag_pipeline.SessionMemoryStore")
     @patch("core.advanced_rag_pipeline.ChatOpenAI")
     def setUp(self, MockChatOpenAI, MockMemory, MockRetriever):
         self.mock_memory = MockMemory.return_value
-        self.mock_memory.load_memory_variables.return_value = {"chat_history": []}
+        self.mock_memory.load_history.return_value = []
+        self.mock_memory.save_turn = AsyncMock()
         
         self.mock_retriever = MockRetriever.return_value
         self.mock_retriever.retrieve = AsyncMock(return_value=[])
@@ -24,8 +25,7 @@ class TestAdvancedRAGPipeline(unittest.TestCase):
         
         self.pipeline = CustomConversationalRAGPipeline(
             vectorstore_manager=self.mock_retriever,
-            openai_api_key=os.getenv("OPENAI_API_KEY"),
-            all_docs_text=["Document 1 content", "Document 2 content"]
+            openai_api_key=os.getenv("OPENAI_API_KEY")
         )
 
     def run_async(self, coro):
@@ -50,5 +50,67 @@ class TestAdvancedRAGPipeline(unittest.TestCase):
         self.mock_llm.assert_called_once()
 
 
+class TestAnswerCache(unittest.IsolatedAsyncioTestCase):
+
+    @patch("core.advanced_rag_pipeline.HybridRetriever")
+    @patch("core.advanced_rag_pipeline.ChatOpenAI")
+    def setUp(self, MockChatOpenAI, MockRetriever):
+        self.mock_retriever = MockRetriever.return_value
+        self.mock_retriever.retrieve = AsyncMock(return_value=[("Chunk text", {"chunk_id": "1:a"})])
+        self.mock_llm = MockChatOpenAI.return_value
+        self.mock_llm.ainvoke = AsyncMock(return_value=MagicMock(content="Cached Answer", usage_metadata=None))
+        self.pipeline = CustomConversationalRAGPipeline(vectorstore_manager=MagicMock(), openai_api_key="key")
+
+    @patch("core.advanced_rag_pipeline.load_corpus_version")
+    async def test_repeated_query_served_from_cache_until_corpus_changes(self, mock_corpus_version):
+        mock_corpus_version.return_value = "v1"
+        self.assertEqual(await self.pipeline.query("What is a BIN?", session_id="a"), "Cached Answer")
+        self.assertEqual(await self.pipeline.query("what is a bin", session_id="b"), "Cached Answer")
+        self.assertEqual(self.mock_llm.ainvoke.await_count, 1)
+
+        # Same question later in a conversation: the history differs, so no reuse.
+        await self.pipeline.query("What is a BIN?", session_id="a")
+        self.assertEqual(self.mock_llm.ainvoke.await_count, 2)
+
+        mock_corpus_version.return_value = "v2"
+        await self.pipeline.query("What is a BIN?", session_id="c")
+        self.assertEqual(self.mock_llm.ainvoke.await_count, 3)
+        self.assertEqual(self.pipeline.cache_stats()["answers"]["hits"], 1)
+
+
+class TestQueryStream(unittest.IsolatedAsyncioTestCase):
+
+    @patch("core.advanced_rag_pipeline.HybridRetriever")
+    @patch("core.advanced_rag_pipeline.ChatOpenAI")
+    def setUp(self, MockChatOpenAI, MockRetriever):
+        MockRetriever.return_value.retrieve = AsyncMock(return_value=[("Chunk text", {"chunk_id": "1:a"})])
+
+        async def astream(messages):
+            for token in ["A BIN ", "is the ", "first digits."]:
+                yield MagicMock(content=token)
+
+        self.mock_llm = MockChatOpenAI.return_value
+        self.mock_llm.astream = astream
+        self.pipeline = CustomConversationalRAGPipeline(vectorstore_manager=MagicMock(), openai_api_key="key")
+
+    @patch("core.advanced_rag_pipeline.load_corpus_version", return_value="v1")
+    async def test_tokens_streamed_then_saved(self, _):
+        tokens = [token async for token in self.pipeline.query_stream("What is a BIN?", session_id="s1")]
+
+        self.assertEqual(tokens, ["A BIN ", "is the ", "first digits."])
+        history = self.pipeline.memory.load_history("s1")
+        self.assertEqual([m.content for m in history], ["What is a BIN?", "A BIN is the first digits."])
+        self.mock_llm.assert_not_called()
+
+    @patch("core.advanced_rag_pipeline.load_corpus_version", return_value="v1")
+    async def test_abandoned_stream_is_not_saved(self, _):
+        stream = self.pipeline.query_stream("What is a BIN?", session_id="s1")
+        self.assertEqual(await stream.__anext__(), "A BIN ")
+        await stream.aclose()
+
+        self.assertEqual(self.pipeline.memory.load_history("s1"), [])
+        self.assertEqual(len(self.pipeline.answer_cache), 0)
+
+
 if __name__ == "__main__":
     unittest.main()
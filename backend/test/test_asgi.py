@@ -0,0 +1,153 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest.mock import patch, AsyncMock
+
+from fastapi.testclient import TestClient
+
+import API.routes as routes
+from API.asgi import app, ConcurrencyLimiter
+from core.ingest_jobs import IngestJob
+from core.doc_registry import DocRegistry
+
+
+class TestConcurrencyLimiter(unittest.IsolatedAsyncioTestCase):
+
+    async def test_rejects_when_slots_and_queue_are_full(self):
+        limiter = ConcurrencyLimiter(max_concurrency=1, max_queue=1)
+        self.assertTrue(await limiter.acquire())
+
+        queued = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        self.assertEqual(limiter.waiting, 1)
+        self.assertFalse(await limiter.acquire())
+        self.assertEqual(limiter.rejected, 1)
+
+        limiter.release()
+        self.assertTrue(await queued)
+        self.assertEqual(limiter.active, 1)
+
+
+class TestSharedServices(unittest.IsolatedAsyncioTestCase):
+
+    @patch('API.routes.count_tokens')
+    @patch('API.routes.CustomConversationalRAGPipeline')
+    @patch('API.routes.VectorStoreManager')
+    async def test_services_are_built_once_by_warm_up(self, MockManager, MockPipeline, mock_count_tokens):
+        MockManager.return_value.warm_up = AsyncMock()
+        with patch.object(routes, '_vs_manager', None), patch.object(routes, '_pipeline', None):
+            await routes.warm_up()
+
+            self.assertIs(routes.get_pipeline(), MockPipeline.return_value)
+            self.assertIs(routes.get_vs_manager(), MockManager.return_value)
+        MockManager.assert_called_once()
+        MockPipeline.assert_called_once()
+        MockManager.return_value.warm_up.assert_awaited_once()
+
+
+class TestAsgiApp(unittest.TestCase):
+
+    def setUp(self):
+        self.client = TestClient(app)
+
+    @patch('API.asgi.start_ingest_schedules')
+    @patch('API.asgi.warm_up', new_callable=AsyncMock)
+    def test_startup_warms_up_before_serving(self, mock_warm_up, mock_start_schedules):
+        with TestClient(app) as client:
+            mock_warm_up.assert_awaited_once()
+            mock_start_schedules.assert_called_once()
+            self.assertEqual(client.get("/health").status_code, 200)
+
+    def test_health(self):
+        response = self.client.get("/health")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"status": "OK"})
+
+    def test_metrics_are_served_as_prometheus_text(self):
+        response = self.client.get("/metrics")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/plain; version=0.0.4"))
+        self.assertIn("# TYPE nymcard_stage_seconds histogram", response.text)
+
+    @patch('API.asgi.get_pipeline')
+    def test_query(self, mock_get_pipeline):
+        mock_pipeline = mock_get_pipeline.return_value
+        mock_pipeline.query = AsyncMock(return_value="An answer")
+
+        response = self.client.post("/query", json={"question": "What is a BIN?", "session_id": "s1"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"answer": "An answer", "session_id": "s1"})
+        mock_pipeline.query.assert_awaited_once_with("What is a BIN?", session_id="s1")
+
+    @patch('API.asgi.get_pipeline')
+    def test_query_stream_emits_sse_events(self, mock_get_pipeline):
+        mock_pipeline = mock_get_pipeline.return_value
+        async def query_stream(question, session_id):
+            for token in ["Hello", " there"]:
+                yield token
+        mock_pipeline.query_stream = query_stream
+
+        response = self.client.post("/query/stream", json={"question": "Hi"}, headers={"X-Session-ID": "s1"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/event-stream"))
+        self.assertEqual(response.text, (
+            'data: {"token": "Hello"}\n\n'
+            'data: {"token": " there"}\n\n'
+            'event: done\ndata: {"answer": "Hello there", "session_id": "s1"}\n\n'
+        ))
+
+    def test_query_requires_question(self):
+        response = self.client.post("/query", json={})
+        self.assertEqual(response.status_code, 400)
+
+    @patch('API.asgi.ingest_scheduler')
+    def test_ingest_returns_job_and_reports_its_status(self, mock_scheduler):
+        job = IngestJob(id="job1", space_key="OPS", delta=True, trigger="api")
+        mock_scheduler.submit.return_value = job
+        mock_scheduler.get.side_effect = lambda job_id: job if job_id == "job1" else None
+
+        response = self.client.post("/ingest", json={"space_key": "OPS", "delta": True})
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()["job"]["id"], "job1")
+        mock_scheduler.submit.assert_called_once_with("OPS", delta=True)
+
+        job.progress.fetched = 5
+        status = self.client.get("/ingest/jobs/job1")
+        self.assertEqual(status.status_code, 200)
+        self.assertEqual((status.json()["status"], status.json()["progress"]["fetched"]), ("queued", 5))
+        self.assertEqual(self.client.get("/ingest/jobs/nope").status_code, 404)
+
+    def test_both_servers_list_documents_alike(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            registry = DocRegistry(os.path.join(tmp_dir, "registry.sqlite3"), legacy_file=None)
+            registry.upsert_many({
+                "1": {"hash": "h1", "chunk_ids": ["1:a"], "version": 2},
+                "2": {"hash": "h2", "chunk_ids": ["2:a"]},
+            })
+            with patch('API.routes.open_registry', return_value=registry):
+                response = self.client.get("/documents", params={"offset": 1, "limit": 5})
+                flask_response = routes.app.test_client().get("/documents?offset=1&limit=5")
+            registry.close()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.json()["documents"]), ["2"])
+        self.assertEqual((response.json()["total"], response.json()["offset"]), (2, 1))
+        self.assertEqual(flask_response.get_json(), response.json())
+
+    @patch('API.asgi.limiter.acquire', new_callable=AsyncMock)
+    def test_saturated_server_returns_429(self, mock_acquire):
+        mock_acquire.return_value = False
+
+        response = self.client.post("/query", json={"question": "What is a BIN?"})
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers["Retry-After"], "1")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+import os
+import time
+import multiprocessing
+import tempfile
+import unittest
+import zipfile
+from unittest.mock import patch
+
+from core.attachments import (
+    AttachmentExtractor, AttachmentTooLarge, attachment_kind, extract_text, DOCX, PLAIN, STRUCTURED
+)
+
+_DOCUMENT_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>
+<w:p><w:pPr><w:pStyle w:val="Heading1"/></w:pPr><w:r><w:t>Card limits</w:t></w:r></w:p>
+<w:p><w:r><w:t xml:space="preserve">Daily limit is </w:t></w:r><w:r><w:t>5000 AED.</w:t></w:r></w:p>
+<w:p><w:pPr><w:numPr><w:ilvl w:val="0"/></w:numPr></w:pPr><w:r><w:t>Applies to ATM</w:t></w:r></w:p>
+<w:p></w:p>
+</w:body></w:document>"""
+
+_OPENAPI_YAML = """openapi: 3.0.0
+info:
+  title: Cards API
+  version: "2.1"
+paths:
+  /cards/{id}/freeze:
+    parameters:
+      - name: id
+        in: path
+        required: true
+    post:
+      summary: Freeze a card
+      responses:
+        "204":
+          description: Frozen
+"""
+
+
+class _FakeLoader:
+    """Stand-in for ConfluenceLoader: 'downloads' from a dict of contents."""
+
+    def __init__(self, contents):
+        self.contents = contents
+        self.downloads = []
+
+    async def download_attachment(self, attachment, path, max_bytes):
+        self.downloads.append(attachment["id"])
+        with open(path, "wb") as f:
+            f.write(self.contents[attachment["id"]])
+
+
+async def _listed(attachments):
+    for attachment in attachments:
+        yield attachment
+
+
+def _slow_extract(path, kind):
+    time.sleep(5)
+    return ""
+
+
+class TestAttachmentExtraction(unittest.TestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.tmpdir = tmpdir.name
+
+    def _write(self, name, data):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(data)
+        return path
+
+    def test_attachment_kind(self):
+        self.assertEqual(attachment_kind({"media_type": "text/plain", "title": "notes"}), PLAIN)
+        self.assertEqual(attachment_kind({"media_type": "application/octet-stream", "title": "spec.YAML"}),
+                         STRUCTURED)
+        self.assertIsNone(attachment_kind({"media_type": "image/png", "title": "diagram.png"}))
+
+    def test_docx_paragraphs_headings_and_list_items(self):
+        path = os.path.join(self.tmpdir, "limits.docx")
+        with zipfile.ZipFile(path, "w") as archive:
+            archive.writestr("word/document.xml", _DOCUMENT_XML)
+
+        self.assertEqual(extract_text(path, DOCX),
+                         "# Card limits\nDaily limit is 5000 AED.\n- Applies to ATM")
+
+    def test_openapi_spec_becomes_one_section_per_operation(self):
+        text = extract_text(self._write("cards.yaml", _OPENAPI_YAML), STRUCTURED)
+
+        self.assertTrue(text.startswith("# Cards API 2.1"))
+        self.assertIn("## POST /cards/{id}/freeze\nFreeze a card\n- path id (required)\n- Response 204: Frozen", text)
+
+    def test_other_structured_files_are_kept_verbatim(self):
+        raw = '{"feature_flags": {"virtual_cards": true}}'
+        self.assertEqual(extract_text(self._write("flags.json", raw), STRUCTURED), raw)
+
+
+class TestAttachmentExtractor(unittest.IsolatedAsyncioTestCase):
+
+    async def test_extracts_supported_attachments_and_reports_oversized_ones(self):
+        loader = _FakeLoader({"att1": b"Refunds take 5 days.", "att3": b"x" * 10})
+        attachments = [
+            {"id": "att1", "title": "refunds.txt", "media_type": "text/plain", "file_size": 20},
+            {"id": "att2", "title": "logo.png", "media_type": "image/png", "file_size": 10},
+            {"id": "att3", "title": "huge.txt", "media_type": "text/plain", "file_size": 10_000},
+        ]
+        with tempfile.TemporaryDirectory() as spool:
+            extractor = AttachmentExtractor(workers=2, max_bytes=1000, spool_dir=spool)
+            results = {a["id"]: (text, error)
+                       async for a, text, error in extractor.extract_all(loader, _listed(attachments))}
+            self.assertEqual(os.listdir(spool), [])
+
+        self.assertEqual(set(results), {"att1", "att3"})
+        self.assertEqual(results["att1"], ("Refunds take 5 days.", None))
+        self.assertIsInstance(results["att3"][1], AttachmentTooLarge)
+        self.assertEqual(loader.downloads, ["att1"])
+
+    async def test_slow_extraction_is_killed(self):
+        path = os.path.join(tempfile.mkdtemp(), "slow.txt")
+        with open(path, "w") as f:
+            f.write("slow")
+        extractor = AttachmentExtractor(timeout=0.5)
+        # Only a forked child sees the patched extract_text.
+        extractor._context = multiprocessing.get_context("fork")
+
+        start = time.monotonic()
+        with patch("core.attachments.extract_text", _slow_extract), self.assertRaises(TimeoutError):
+            await extractor.extract_file(path, PLAIN)
+        self.assertLess(time.monotonic() - start, 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+
+from core.bm25_index import BM25Index, tokenize
+
+
+class TestBM25Index(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "bm25.sqlite3")
+        self.index = BM25Index(self.path)
+        self.index.add_chunks(
+            ["1:a", "1:b", "2:a"],
+            [
+                "Error ERR_4012 means the card BIN 428765 is not enabled.",
+                "Cards are issued through the issuing API with card_holder_id.",
+                "General overview of the platform and its cards.",
+            ],
+            [{"page_id": "1", "title": "Errors"}, {"page_id": "1", "title": "Errors"},
+             {"page_id": "2", "title": "Overview"}]
+        )
+
+    def tearDown(self):
+        self.index.close()
+        self.tmp_dir.cleanup()
+
+    def test_tokenize_keeps_identifiers_and_parts(self):
+        self.assertEqual(tokenize("The ERR_4012 code"), ["err_4012", "err", "4012", "code"])
+
+    def test_exact_identifier_ranks_first(self):
+        results = self.index.search("ERR_4012", k=3)
+        self.assertEqual(results[0][1]["chunk_id"], "1:a")
+        self.assertEqual(len(results), 1)
+
+        results = self.index.search("card_holder_id", k=3)
+        self.assertEqual(results[0][1], {"page_id": "1", "title": "Errors", "chunk_id": "1:b"})
+
+    def test_remove_and_replace_chunks(self):
+        self.index.remove_chunks(["1:a", "missing"])
+        self.assertEqual(self.index.search("428765"), [])
+        self.assertEqual(len(self.index), 2)
+
+        self.index.add_chunks(["2:a"], ["Overview now mentions 428765."], [{"page_id": "2"}])
+        self.assertEqual(len(self.index), 2)
+        self.assertEqual(self.index.search("428765")[0][1]["chunk_id"], "2:a")
+
+    def test_index_persists_across_instances(self):
+        self.index.close()
+        self.index = BM25Index(self.path)
+        self.assertEqual(len(self.index), 3)
+        self.assertEqual(self.index.search("BIN 428765")[0][1]["chunk_id"], "1:a")
+
+    def test_sees_chunks_indexed_by_another_process(self):
+        empty_path = os.path.join(self.tmp_dir.name, "shared.sqlite3")
+        reader = BM25Index(empty_path)
+        self.addCleanup(reader.close)
+        self.assertEqual(reader.search("428765"), [])
+
+        writer = BM25Index(empty_path)
+        self.addCleanup(writer.close)
+        writer.add_chunks(["1:a"], ["BIN 428765 is not enabled."], [{"page_id": "1"}])
+
+        self.assertEqual(len(reader), 1)
+        self.assertEqual(reader.search("428765")[0][1]["chunk_id"], "1:a")
+
+    def test_removed_terms_are_pruned(self):
+        self.index.remove_chunks(["1:a"])
+        rows = self.index._conn.execute("SELECT COUNT(*) FROM terms WHERE term = 'err_4012' OR df <= 0").fetchone()
+        self.assertEqual(rows[0], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+from unittest.mock import patch
+
+from core.chunker import chunk_spans, PageChunks
+
+
+def _count_words(text):
+    return len(text.split())
+
+
+@patch('core.chunker.count_tokens', side_effect=_count_words)
+class TestChunker(unittest.TestCase):
+
+    def test_chunks_are_offsets_with_section_paths(self, _):
+        text = "# Cards\nIntro line.\n## Limits\nDaily limit is 500.\n# Fees\nNo fees."
+        spans = chunk_spans(text, max_tokens=6, overlap_tokens=0)
+        chunks = PageChunks(text, spans)
+
+        self.assertEqual(list(chunks), [
+            "# Cards\nIntro line.",
+            "## Limits\nDaily limit is 500.",
+            "# Fees\nNo fees.",
+        ])
+        self.assertEqual([s.section for s in spans], ["Cards", "Cards > Limits", "Fees"])
+        self.assertEqual(text[spans[1].start:spans[1].end], chunks[1])
+
+    def test_short_sections_stay_together(self, _):
+        text = "# A\nx.\n# B\ny."
+        spans = chunk_spans(text, max_tokens=100)
+        self.assertEqual(list(PageChunks(text, spans)), [text])
+
+    def test_size_split_repeats_trailing_lines(self, _):
+        text = "\n".join(f"Line {i} here." for i in range(6))  # 3 words per line
+        chunks = list(PageChunks(text, chunk_spans(text, max_tokens=9, overlap_tokens=3)))
+        self.assertEqual(chunks[0], "Line 0 here.\nLine 1 here.\nLine 2 here.")
+        self.assertEqual(chunks[1], "Line 2 here.\nLine 3 here.\nLine 4 here.")
+
+    def test_code_blocks_are_not_split(self, _):
+        code = "```\nif (a) {\n    b();\n}\n```"
+        text = f"Before.\n{code}\nAfter."
+        chunks = list(PageChunks(text, chunk_spans(text, max_tokens=8, overlap_tokens=0)))
+        self.assertEqual(chunks, ["Before.\n" + code, "After."])
+
+    def test_oversized_paragraph_is_cut_between_words(self, _):
+        text = " ".join(f"w{i}" for i in range(30))
+        spans = chunk_spans(text, max_tokens=10, overlap_tokens=2)
+        chunks = list(PageChunks(text, spans))
+        self.assertEqual(chunks[0], " ".join(f"w{i}" for i in range(10)))
+        self.assertTrue(chunks[1].startswith("w8 w9 w10"))
+        self.assertTrue(all(s.tokens <= 10 for s in spans))
+
+
+if __name__ == "__main__":
+    unittest.main()
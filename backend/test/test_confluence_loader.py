@@ -1,6 +1,10 @@
+import asyncio
+import threading
+import time
 import unittest
+from datetime import datetime, timezone
 from unittest.mock import patch, AsyncMock
-from core.confluence_loader import ConfluenceLoader
+from core.confluence_loader import ConfluenceLoader, CrawlReport
 
 class TestConfluenceLoader(unittest.TestCase):
 
@@ -20,7 +24,7 @@ class TestConfluenceLoader(unittest.TestCase):
         }
 
         loader = ConfluenceLoader(url="http://example.com", username="user", api_token="token")
-        result = asyncio.run(loader.fetch_all_pages_in_space("TD", limit=2))
+        result = asyncio.run(loader.fetch_all_pages_in_space("TD", limit=50))
 
         expected = [
             {
@@ -47,5 +51,167 @@ class TestConfluenceLoader(unittest.TestCase):
         mock_confluence_instance.cql.assert_called_once()
         mock_confluence_instance.get_page_by_id.assert_called()
 
+    @patch('core.confluence_loader.Confluence')
+    def test_expanded_body_skips_page_fetch(self, MockConfluence):
+        mock_confluence_instance = MockConfluence.return_value
+        mock_confluence_instance.cql.return_value = {
+            "results": [
+                {"content": {"id": "1", "body": {"storage": {"value": "<p>One</p>"}}}, "title": "One"},
+                {"content": {"id": "2", "body": {"storage": {"value": ""}}}, "title": "Two"}
+            ],
+            "size": 2
+        }
+
+        loader = ConfluenceLoader(url="http://example.com", username="user", api_token="token")
+        result = asyncio.run(loader.fetch_all_pages_in_space("TD", limit=50))
+
+        self.assertEqual([p["body"]["storage"]["value"] for p in result], ["<p>One</p>", ""])
+        mock_confluence_instance.get_page_by_id.assert_not_called()
+
+    @patch('core.confluence_loader.Confluence')
+    def test_iter_pages_bounds_requests_in_flight(self, MockConfluence):
+        mock_confluence_instance = MockConfluence.return_value
+        first = {
+            "results": [{"content": {"id": str(i)}, "title": f"P{i}"} for i in range(4)],
+            "size": 4
+        }
+        second = {
+            "results": [{"content": {"id": str(i)}, "title": f"P{i}"} for i in range(4, 6)],
+            "size": 2
+        }
+        mock_confluence_instance.cql.side_effect = [first, second]
+
+        lock = threading.Lock()
+        in_flight = {"now": 0, "peak": 0}
+
+        def slow_get_page(page_id, expand=None):
+            with lock:
+                in_flight["now"] += 1
+                in_flight["peak"] = max(in_flight["peak"], in_flight["now"])
+            time.sleep(0.02)
+            with lock:
+                in_flight["now"] -= 1
+            return {"body": {"storage": {"value": f"<p>{page_id}</p>"}}}
+
+        mock_confluence_instance.get_page_by_id.side_effect = slow_get_page
+
+        async def collect():
+            loader = ConfluenceLoader(url="http://example.com", username="user",
+                                      api_token="token", max_concurrency=2)
+            return [page async for page in loader.iter_pages_in_space("TD", limit=4)]
+
+        pages = asyncio.run(collect())
+
+        self.assertEqual(sorted(p["id"] for p in pages), [str(i) for i in range(6)])
+        self.assertLessEqual(in_flight["peak"], 2)
+        self.assertEqual(mock_confluence_instance.cql.call_count, 2)
+
+    @patch('core.confluence_loader.Confluence')
+    def test_delta_listing_uses_lastmodified_and_ids_only(self, MockConfluence):
+        mock_confluence_instance = MockConfluence.return_value
+        mock_confluence_instance.cql.return_value = {
+            "results": [{"content": {"id": "7"}, "title": "Seven"}],
+            "size": 1
+        }
+        loader = ConfluenceLoader(url="http://example.com", username="user", api_token="token")
+
+        since = datetime(2024, 3, 5, 9, 30, tzinfo=timezone.utc)
+        asyncio.run(_drain(loader.iter_pages_in_space("TD", modified_since=since)))
+        cql_str = mock_confluence_instance.cql.call_args[0][0]
+        self.assertIn('lastmodified >= "2024/03/05 09:30"', cql_str)
+
+        page_ids = asyncio.run(loader.fetch_page_ids_in_space("TD"))
+        self.assertEqual(page_ids, {"7"})
+        self.assertIsNone(mock_confluence_instance.cql.call_args[1]["expand"])
+
+    @patch('core.confluence_loader.Confluence')
+    def test_known_versions_skip_unchanged_bodies(self, MockConfluence):
+        mock_confluence_instance = MockConfluence.return_value
+        mock_confluence_instance.cql.return_value = {
+            "results": [
+                {"content": {"id": "1", "version": {"number": 3}}, "title": "Same"},
+                {"content": {"id": "2", "version": {"number": 5}}, "title": "Edited"},
+            ],
+            "size": 2
+        }
+        mock_confluence_instance.get_page_by_id.return_value = {"body": {"storage": {"value": "<p>New</p>"}}}
+        loader = ConfluenceLoader(url="http://example.com", username="user", api_token="token")
+        report = CrawlReport()
+
+        lookup_threads = []
+
+        def known_versions(ids):
+            lookup_threads.append(threading.get_ident())
+            return {"1": 3, "2": 4}
+
+        pages = asyncio.run(_drain(loader.iter_pages_in_space("TD", known_versions=known_versions, report=report)))
+
+        self.assertEqual([(p["id"], p["version"]) for p in pages], [("2", 5)])
+        # Registry reads block; they must not run on the event loop's thread.
+        self.assertNotIn(threading.get_ident(), lookup_threads)
+        self.assertEqual(report.unchanged_ids, {"1"})
+        self.assertEqual(mock_confluence_instance.cql.call_args[1]["expand"], "content.version")
+        mock_confluence_instance.get_page_by_id.assert_called_once_with("2", expand="body.storage")
+
+    @patch('core.confluence_loader.Confluence')
+    def test_failed_bodies_are_retried_then_reported(self, MockConfluence):
+        mock_confluence_instance = MockConfluence.return_value
+        mock_confluence_instance.cql.return_value = {
+            "results": [{"content": {"id": str(i)}, "title": f"P{i}"} for i in range(3)],
+            "size": 3
+        }
+        attempts = {}
+
+        def flaky_get_page(page_id, expand=None):
+            attempts[page_id] = attempts.get(page_id, 0) + 1
+            if page_id == "2" or (page_id == "1" and attempts[page_id] == 1):
+                raise RuntimeError("connection reset")
+            return {"body": {"storage": {"value": f"<p>{page_id}</p>"}}}
+
+        mock_confluence_instance.get_page_by_id.side_effect = flaky_get_page
+        loader = ConfluenceLoader(url="http://example.com", username="user", api_token="token",
+                                  retry_queue_delay=0)
+        report = CrawlReport()
+
+        pages = asyncio.run(_drain(loader.iter_pages_in_space("TD", report=report)))
+
+        self.assertEqual(sorted(p["id"] for p in pages), ["0", "1"])
+        self.assertEqual(report.failed_page_ids, {"2"})
+        self.assertEqual(attempts, {"0": 1, "1": 2, "2": 2})
+
+    @patch('core.confluence_loader.Confluence')
+    def test_iter_attachments_lists_metadata_and_skips_known_versions(self, MockConfluence):
+        mock_confluence_instance = MockConfluence.return_value
+        mock_confluence_instance.url = "http://example.com/wiki"
+        mock_confluence_instance.cql.return_value = {
+            "results": [
+                {"content": {"id": "att1", "title": "spec.yaml", "version": {"number": 2},
+                             "container": {"id": "10", "title": "Cards"},
+                             "extensions": {"mediaType": "application/yaml", "fileSize": 812},
+                             "_links": {"download": "/download/attachments/10/spec.yaml?version=2"}}},
+                {"content": {"id": "att2", "title": "old.pdf", "version": {"number": 1},
+                             "_links": {"download": "/download/attachments/10/old.pdf"}}},
+            ],
+            "size": 2
+        }
+        loader = ConfluenceLoader(url="http://example.com/wiki", username="user", api_token="token")
+        report = CrawlReport()
+
+        attachments = asyncio.run(_drain(loader.iter_attachments_in_space(
+            "TD", known_versions=lambda ids: {"att2": 1}, report=report
+        )))
+
+        self.assertEqual(attachments, [{
+            "id": "att1", "title": "spec.yaml", "version": 2, "media_type": "application/yaml",
+            "file_size": 812, "download_url": "http://example.com/wiki/download/attachments/10/spec.yaml?version=2",
+            "page_id": "10", "page_title": "Cards",
+        }])
+        self.assertEqual(report.unchanged_ids, {"att2"})
+        self.assertIn("type=attachment", mock_confluence_instance.cql.call_args[0][0])
+
+
+async def _drain(page_iter):
+    return [page async for page in page_iter]
+
 if __name__ == "__main__":
     unittest.main()
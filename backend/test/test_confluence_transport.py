@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+
+import requests
+
+from core.confluence_transport import AIMDLimiter, ConfluenceTransport, parse_retry_after
+
+
+def _http_error(status: int, retry_after: str = None) -> requests.HTTPError:
+    response = MagicMock(status_code=status, headers={"Retry-After": retry_after} if retry_after else {})
+    return requests.HTTPError(f"{status} error", response=response)
+
+
+class TestParseRetryAfter(unittest.TestCase):
+
+    def test_seconds_and_http_date(self):
+        self.assertEqual(parse_retry_after("3"), 3.0)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after("soon"))
+        self.assertEqual(parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"), 0.0)
+
+
+class TestAIMDLimiter(unittest.IsolatedAsyncioTestCase):
+
+    async def test_halves_once_per_congestion_event_and_grows_back(self):
+        limiter = AIMDLimiter(max_limit=8)
+        starts = [await limiter.acquire() for _ in range(4)]
+
+        # Four requests throttled together cut the limit once, not four times.
+        for started in starts:
+            await limiter.release(started, throttled=True)
+        self.assertEqual(limiter.limit, 4)
+
+        for _ in range(8):
+            await limiter.release(await limiter.acquire())
+        self.assertGreater(limiter.limit, 5)
+        self.assertLessEqual(limiter.limit, 8)
+
+    async def test_retry_after_pauses_new_requests(self):
+        limiter = AIMDLimiter(max_limit=2)
+        await limiter.release(await limiter.acquire(), throttled=True, retry_after=0.05)
+
+        start = time.monotonic()
+        await limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.04)
+
+
+class TestConfluenceTransport(unittest.IsolatedAsyncioTestCase):
+
+    async def test_retries_throttled_and_transient_errors(self):
+        transport = ConfluenceTransport(max_concurrency=4, max_retries=3, backoff=0.001)
+        fn = MagicMock(side_effect=[_http_error(429, "0"), requests.ConnectionError("reset"), "body"])
+
+        self.assertEqual(await transport.call(fn, "1", expand="body.storage"), "body")
+        self.assertEqual(fn.call_count, 3)
+        fn.assert_called_with("1", expand="body.storage")
+        self.assertEqual(transport.limiter.in_flight, 0)
+        self.assertLess(transport.limiter.limit, 4)
+
+    async def test_zero_retry_after_falls_back_to_backoff(self):
+        transport = ConfluenceTransport(max_concurrency=2, max_retries=2, backoff=0.05)
+        fn = MagicMock(side_effect=[_http_error(429, "0"), "body"])
+
+        start = time.monotonic()
+        self.assertEqual(await transport.call(fn), "body")
+        self.assertGreaterEqual(time.monotonic() - start, 0.02)
+
+    async def test_gives_up_after_max_retries_and_on_other_errors(self):
+        transport = ConfluenceTransport(max_concurrency=2, max_retries=2, backoff=0.001)
+        throttled = MagicMock(side_effect=_http_error(503))
+        with self.assertRaises(requests.HTTPError):
+            await transport.call(throttled)
+        self.assertEqual(throttled.call_count, 3)
+
+        not_found = MagicMock(side_effect=_http_error(404))
+        with self.assertRaises(requests.HTTPError):
+            await transport.call(not_found)
+        self.assertEqual(not_found.call_count, 1)
+
+    async def test_bounds_calls_in_flight(self):
+        transport = ConfluenceTransport(max_concurrency=3)
+        lock = threading.Lock()
+        in_flight = {"now": 0, "peak": 0}
+
+        def slow_call():
+            with lock:
+                in_flight["now"] += 1
+                in_flight["peak"] = max(in_flight["peak"], in_flight["now"])
+            time.sleep(0.01)
+            with lock:
+                in_flight["now"] -= 1
+
+        await asyncio.gather(*(transport.call(slow_call) for _ in range(10)))
+        self.assertLessEqual(in_flight["peak"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
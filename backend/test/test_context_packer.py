@@ -0,0 +1,69 @@
+import unittest
+from unittest.mock import patch
+
+from core.context_packer import pack_context, context_budget
+
+
+def _count_words(text):
+    return len(text.split())
+
+
+@patch('core.context_packer.count_tokens', side_effect=_count_words)
+class TestContextPacker(unittest.TestCase):
+
+    def test_overlapping_chunks_of_a_page_are_merged(self, _):
+        # Two 10-word chunks overlapping by 3 words.
+        chunks = [" ".join(f"w{i}" for i in range(start, start + 10)) for start in (0, 7)]
+        retrieved = [
+            (chunks[1], {"page_id": "1", "chunk_index": 1, "score": 0.2}),
+            (chunks[0], {"page_id": "1", "chunk_index": 0, "score": 0.3}),
+        ]
+
+        packed = pack_context(retrieved, max_tokens=100)
+
+        self.assertEqual(packed, " ".join(f"w{i}" for i in range(17)))
+
+    def test_merged_passages_keep_their_layout(self, _):
+        first = "## Card limits\n- Daily limit: 500 USD per card\n- Monthly limit: 5000 USD per card"
+        second = "- Monthly limit: 5000 USD per card\n\n| Tier | Limit |\n| Gold | 9000 |"
+        retrieved = [
+            (second, {"page_id": "1", "chunk_index": 1}),
+            (first, {"page_id": "1", "chunk_index": 0}),
+        ]
+
+        packed = pack_context(retrieved, max_tokens=100)
+
+        self.assertEqual(packed, first + "\n\n| Tier | Limit |\n| Gold | 9000 |")
+        self.assertEqual(pack_context(retrieved, max_tokens=7), "## Card limits\n- Daily limit: 500")
+
+    def test_packs_best_ranked_passages_within_budget(self, _):
+        retrieved = [
+            ("alpha " * 6, {"page_id": "1", "chunk_index": 0}),
+            ("beta " * 6, {"page_id": "2", "chunk_index": 4}),
+            ("gamma " * 3, {"page_id": "3", "chunk_index": 0}),
+            ("https://docs.example.com", {"type": "url_extraction"}),
+            ("https://docs.example.com", {"type": "url_extraction"}),
+        ]
+
+        packed = pack_context(retrieved, max_tokens=10)
+
+        self.assertEqual(packed.split("\n\n"), [
+            "https://docs.example.com",
+            " ".join(["alpha"] * 6),
+            " ".join(["gamma"] * 3),
+        ])
+
+    def test_oversized_best_passage_is_truncated(self, _):
+        packed = pack_context([("one two three four five", {"page_id": "1"})], max_tokens=3)
+        self.assertEqual(packed, "one two three")
+
+    def test_context_budget_leaves_room_for_prompt_and_answer(self, _):
+        with patch('core.context_packer.CONTEXT_MAX_TOKENS', 3000), \
+                patch('core.context_packer.LLM_CONTEXT_TOKENS', 4000), \
+                patch('core.context_packer.ANSWER_RESERVE_TOKENS', 1000):
+            self.assertEqual(context_budget(500), 2500)
+            self.assertEqual(context_budget(5000), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,7 @@
 # nymcard_project/test/test_doc_processor.py
 
 import unittest
-from core.doc_processor import clean_text, chunk_text, process_confluence_page
+from core.doc_processor import clean_text, process_confluence_page
 
 class TestDocProcessor(unittest.TestCase):
 
@@ -9,16 +9,6 @@ class TestDocProcessor(unittest.TestCase):
         html = "<p>Test <b>HTML</b></p>"
         self.assertEqual(clean_text(html), "Test HTML")
 
-    def test_chunk_text(self):
-        text = "This is a sample text to test chunking."
-        chunks = chunk_text(text, chunk_size=5, overlap=2)
-        self.assertEqual(len(chunks), 3)
-        self.assertEqual(chunks, [
-            "This is a sample text",
-            "text to test chunking.",
-            "chunking."
-        ])
-
     def test_process_confluence_page(self):
         page = {
             "id": "123",
@@ -29,7 +19,8 @@ class TestDocProcessor(unittest.TestCase):
         self.assertEqual(processed["page_id"], "123")
         self.assertEqual(processed["title"], "Test Page")
         self.assertIn("Content", processed["cleaned_text"])
-        self.assertEqual(processed["chunks"], ["Content"])
+        self.assertEqual(list(processed["chunks"]), ["Content"])
+        self.assertEqual(processed["chunk_spans"][0].start, 0)
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,99 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import core.doc_registry as doc_registry
+from core.doc_registry import DocRegistry, get_registry_chunk_ids
+
+
+class TestDocRegistry(unittest.TestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.tmpdir = tmpdir.name
+        self.path = os.path.join(self.tmpdir, "registry.sqlite3")
+
+    def _open(self, legacy_file=None):
+        registry = DocRegistry(self.path, legacy_file=legacy_file)
+        self.addCleanup(registry.close)
+        return registry
+
+    def test_upsert_get_and_delete(self):
+        registry = self._open()
+        registry.upsert_many({
+            "1": {"hash": "h1", "chunk_ids": ["1:a"], "version": 3},
+            "2": {"hash": "h2", "chunk_ids": None},
+        })
+        registry.upsert_many({"1": {"hash": "h1-new", "chunk_ids": ["1:b"], "version": 4}})
+
+        entry = registry.get("1")
+        self.assertEqual((entry["hash"], entry["chunk_ids"], entry["version"]), ("h1-new", ["1:b"], 4))
+        self.assertIsNone(registry.get("2")["chunk_ids"])
+        self.assertIsNone(registry.get("9"))
+        self.assertEqual(get_registry_chunk_ids(registry, ["1", "2", "9"]), {"1": ["1:b"]})
+
+        self.assertEqual(registry.delete_many(["2", "9"]), 1)
+        self.assertEqual(len(registry), 1)
+        self.assertNotIn("2", registry)
+
+    def test_list_pages_is_paged(self):
+        registry = self._open()
+        registry.upsert_many({str(i): {"hash": f"h{i}", "chunk_ids": []} for i in range(5)})
+
+        self.assertEqual([page_id for page_id, _ in registry.list_pages(offset=1, limit=2)], ["1", "2"])
+        self.assertEqual([page_id for page_id, _ in registry.list_pages(offset=4, limit=10)], ["4"])
+
+    def test_changes_are_visible_to_other_connections(self):
+        writer = self._open()
+        reader = self._open()
+        writer.upsert_many({"1": {"hash": "h1", "chunk_ids": ["1:a"]}})
+
+        self.assertEqual(reader.get("1")["chunk_ids"], ["1:a"])
+
+    def test_migrates_json_registry_once(self):
+        legacy_file = os.path.join(self.tmpdir, "ingested_docs.json")
+        with open(legacy_file, "w", encoding="utf-8") as f:
+            json.dump({"1": "old-hash", "2": {"hash": "h2", "chunk_ids": ["2:a"]}}, f)
+
+        registry = self._open(legacy_file)
+
+        self.assertEqual(registry.get("1")["hash"], "old-hash")
+        self.assertIsNone(registry.get("1")["chunk_ids"])
+        self.assertEqual(registry.get("2")["chunk_ids"], ["2:a"])
+        self.assertFalse(os.path.exists(legacy_file))
+        self.assertTrue(os.path.exists(legacy_file + ".migrated"))
+
+    def test_corpus_version_is_reread_only_when_the_file_changes(self):
+        version_file = os.path.join(self.tmpdir, "data", "corpus_version.json")
+        with patch.object(doc_registry, "CORPUS_VERSION_FILE", version_file):
+            self.assertEqual(doc_registry.load_corpus_version(), "0")
+            version = doc_registry.bump_corpus_version()
+
+            with patch("builtins.open", wraps=open) as mock_open:
+                self.assertEqual(doc_registry.load_corpus_version(), version)
+                self.assertEqual(doc_registry.load_corpus_version(), version)
+            self.assertEqual(mock_open.call_count, 1)
+
+            # Another process replacing the file is noticed.
+            with open(version_file + ".new", "w", encoding="utf-8") as f:
+                json.dump({"version": "from-elsewhere"}, f)
+            os.replace(version_file + ".new", version_file)
+            self.assertEqual(doc_registry.load_corpus_version(), "from-elsewhere")
+
+    def test_checkpoints_are_written_atomically(self):
+        checkpoint_file = os.path.join(self.tmpdir, "data", "sync_checkpoints.json")
+        with patch.object(doc_registry, "CHECKPOINT_FILE", checkpoint_file):
+            doc_registry.save_checkpoint("TD", {"last_sync": "t1", "page_ids": ["1"]})
+            with patch("core.doc_registry.json.dump", side_effect=OSError("disk full")):
+                with self.assertRaises(OSError):
+                    doc_registry.save_checkpoint("OPS", {"last_sync": "t2", "page_ids": []})
+
+            self.assertEqual(doc_registry.load_checkpoint("TD"), {"last_sync": "t1", "page_ids": ["1"]})
+            self.assertEqual(os.listdir(os.path.dirname(checkpoint_file)), ["sync_checkpoints.json"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+from core.embedding_cache import EmbeddingCache, CachedEmbeddings
+
+
+class TestEmbeddingCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.tmp_dir.name, "cache.sqlite3")
+        self.cache = EmbeddingCache(self.cache_path)
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp_dir.cleanup()
+
+    def _provider(self):
+        provider = MagicMock()
+        provider.model = "test-model"
+        provider.embed_documents.side_effect = lambda texts: [[float(len(t)), 1.0] for t in texts]
+        return provider
+
+    def test_only_misses_reach_the_provider(self):
+        provider = self._provider()
+        embeddings = CachedEmbeddings(provider, self.cache)
+
+        first = embeddings.embed_documents(["alpha", "beta"])
+        second = embeddings.embed_documents(["beta", "gamma", "alpha"])
+
+        self.assertEqual(first, [[5.0, 1.0], [4.0, 1.0]])
+        self.assertEqual(second, [[4.0, 1.0], [5.0, 1.0], [5.0, 1.0]])
+        self.assertEqual(provider.embed_documents.call_args_list[1].args[0], ["gamma"])
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 3))
+
+    def test_cache_is_shared_across_runs(self):
+        CachedEmbeddings(self._provider(), self.cache).embed_documents(["persisted chunk"])
+        self.cache.close()
+
+        self.cache = EmbeddingCache(self.cache_path)
+        provider = self._provider()
+        vectors = CachedEmbeddings(provider, self.cache).embed_documents(["persisted chunk"])
+
+        self.assertEqual(vectors, [[15.0, 1.0]])
+        provider.embed_documents.assert_not_called()
+
+    def test_namespace_separates_models(self):
+        CachedEmbeddings(self._provider(), self.cache).embed_documents(["chunk"])
+        other = self._provider()
+        other.model = "other-model"
+
+        CachedEmbeddings(other, self.cache).embed_documents(["chunk"])
+
+        other.embed_documents.assert_called_once_with(["chunk"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+import os
+import json
+import time
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from core.embedding_providers import (
+    EMBEDDING_INFO_FILE, EmbeddingMismatchError, EmbeddingSignature, HashingEmbeddings, LocalEmbeddings,
+    check_embedding_signature
+)
+
+
+class _FakeOnnxModel:
+    """Stands in for the ONNX model: the vector of a text is [len(text), 1]. Records batch sizes."""
+
+    def __init__(self):
+        self.batches = []
+        self.delay = 0.0
+
+    def __call__(self, input):
+        self.batches.append(len(input))
+        time.sleep(self.delay)
+        return np.array([[len(text), 1.0] for text in input], dtype=np.float32)
+
+
+class TestHashingEmbeddings(unittest.TestCase):
+
+    def test_vectors_are_deterministic_and_normalized(self):
+        embeddings = HashingEmbeddings(dimension=64)
+        first = embeddings.embed_query("How do I reset a card PIN?")
+        second = HashingEmbeddings(dimension=64).embed_documents(["How do I reset a card PIN?"])[0]
+
+        self.assertEqual(len(first), 64)
+        self.assertEqual(first, second)
+        self.assertAlmostEqual(float(np.linalg.norm(first)), 1.0, places=5)
+
+    def test_texts_sharing_words_are_closer(self):
+        embeddings = HashingEmbeddings(dimension=256)
+        query, related, unrelated = (np.array(v) for v in embeddings.embed_documents([
+            "reset card pin", "how to reset the pin of a card", "webhook retry schedule"
+        ]))
+        self.assertGreater(query @ related, query @ unrelated)
+
+    def test_empty_text_gives_zero_vector(self):
+        self.assertEqual(HashingEmbeddings(dimension=8).embed_query(""), [0.0] * 8)
+
+
+class TestLocalEmbeddings(unittest.TestCase):
+
+    def setUp(self):
+        self.model = _FakeOnnxModel()
+        with patch("chromadb.utils.embedding_functions.ONNXMiniLM_L6_V2", return_value=self.model):
+            self.embeddings = LocalEmbeddings(batch_size=2, threads=2)
+
+    def test_documents_are_embedded_in_micro_batches_in_order(self):
+        vectors = self.embeddings.embed_documents(["a", "bb", "ccc", "dddd", "eeeee"])
+
+        self.assertEqual([v[0] for v in vectors], [1, 2, 3, 4, 5])
+        self.assertEqual(sorted(self.model.batches), [1, 2, 2])
+
+    def test_lone_query_is_encoded_at_once(self):
+        start = time.monotonic()
+        self.assertEqual(self.embeddings.embed_query("abc")[0], 3)
+        self.assertLess(time.monotonic() - start, 0.05)
+        self.assertEqual(self.model.batches, [1])
+
+    def test_queries_arriving_during_an_encode_are_encoded_together(self):
+        self.model.delay = 0.2
+        results = {}
+
+        def query(text):
+            results[text] = self.embeddings.embed_query(text)
+
+        first = threading.Thread(target=query, args=("a",))
+        first.start()
+        while not self.model.batches:
+            time.sleep(0.001)
+        threads = [threading.Thread(target=query, args=(text,)) for text in ("bb", "ccc", "dddd")]
+        for thread in threads:
+            thread.start()
+        while len(self.embeddings._queries) < 3:
+            time.sleep(0.001)
+        for thread in [first] + threads:
+            thread.join()
+
+        self.assertEqual({text: v[0] for text, v in results.items()}, {"a": 1, "bb": 2, "ccc": 3, "dddd": 4})
+        self.assertEqual(self.model.batches, [1, 2, 1])
+
+
+class TestEmbeddingSignature(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.directory = os.path.join(self.tmp_dir.name, "store")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_first_open_records_the_signature(self):
+        signature = EmbeddingSignature("hashing", "hashing-384", 384)
+        check_embedding_signature(self.directory, signature)
+
+        with open(os.path.join(self.directory, EMBEDDING_INFO_FILE)) as f:
+            self.assertEqual(json.load(f), {"provider": "hashing", "model": "hashing-384", "dimension": 384})
+        self.assertEqual(check_embedding_signature(self.directory, signature), signature)
+
+    def test_other_provider_or_dimension_is_refused(self):
+        check_embedding_signature(self.directory, EmbeddingSignature("openai", "text-embedding-ada-002", 1536))
+
+        with self.assertRaises(EmbeddingMismatchError):
+            check_embedding_signature(self.directory, EmbeddingSignature("local", "all-MiniLM-L6-v2", 384))
+        with self.assertRaises(EmbeddingMismatchError):
+            check_embedding_signature(self.directory, EmbeddingSignature("openai", "text-embedding-ada-002", 512))
+
+    def test_unknown_dimension_matches_on_model(self):
+        check_embedding_signature(self.directory, EmbeddingSignature("openai", "custom-model", None))
+        check_embedding_signature(self.directory, EmbeddingSignature("openai", "custom-model", 1024))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import os
+import tempfile
+import unittest
+
+from core.entity_index import EntityIndex, normalize_url, normalize_phone, URL, PHONE
+
+
+class TestEntityIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.index = EntityIndex(os.path.join(self.tmp_dir.name, "entities.sqlite3"))
+        self.index.add_chunks(
+            ["1:a", "1:b", "2:a"],
+            [
+                "Use https://Sandbox.Example.com:443/v1/ for tests. Support: +971 50 123 4567.",
+                "Production: https://api.example.com/v1, see https://sandbox.example.com/v1.",
+                "Status page at https://status.example.com and phone 800-555-1234 (released 2024-01).",
+            ],
+            [{"page_id": "1"}, {"page_id": "1"}, {"page_id": "2"}]
+        )
+
+    def tearDown(self):
+        self.index.close()
+        self.tmp_dir.cleanup()
+
+    def test_normalization(self):
+        self.assertEqual(normalize_url("HTTPS://Api.Example.com:443/v1/#top"), "https://api.example.com/v1")
+        self.assertEqual(normalize_url("http://host:8080/x)."), "http://host:8080/x")
+        self.assertIsNone(normalize_url("https://"))
+        self.assertEqual(normalize_phone("+971 4 123 4567"), "+97141234567")
+        self.assertIsNone(normalize_phone("2024-01"))
+
+    def test_lookup_by_page_dedupes_normalized_values(self):
+        results = self.index.lookup(URL, page_ids=["1"])
+        self.assertEqual([meta["value"] for _, meta in results],
+                         ["https://api.example.com/v1", "https://sandbox.example.com/v1"])
+        self.assertEqual(results[0], ("https://api.example.com/v1",
+                                      {"type": "url_extraction", "value": "https://api.example.com/v1", "page_id": "1"}))
+
+    def test_lookup_by_term_covers_whole_corpus(self):
+        results = self.index.lookup(URL, terms=["status"])
+        self.assertEqual([text for text, _ in results], ["https://status.example.com"])
+        self.assertEqual([meta["value"] for _, meta in self.index.lookup(PHONE, page_ids=["2", "1"])],
+                         ["8005551234", "+971501234567"])
+
+    def test_remove_and_replace_chunks(self):
+        self.index.remove_chunks(["2:a", "missing"])
+        self.assertEqual(self.index.lookup(URL, terms=["status"]), [])
+        self.index.add_chunks(["1:a"], ["No links anymore."], [{"page_id": "1"}])
+        self.assertEqual([meta["value"] for _, meta in self.index.lookup(PHONE, page_ids=["1"])], [])
+        self.assertEqual(len(self.index), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
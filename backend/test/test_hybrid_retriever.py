@@ -1,9 +1,11 @@
 import unittest
 from unittest.mock import patch, AsyncMock, MagicMock
 import asyncio
+import threading
 
 from core.vectorstore_manager import VectorStoreManager
 from core.hybrid_retriever import HybridRetriever
+from core.reranker import LexicalReranker
 
 class TestHybridRetriever(unittest.IsolatedAsyncioTestCase):
 
@@ -15,7 +17,7 @@ class TestHybridRetriever(unittest.IsolatedAsyncioTestCase):
             ("Check our website at https://example.com for more info.", {"source": "doc1"}, 0.95)
         ])
         
-        retriever = HybridRetriever(vectorstore_manager=mock_vs_manager, all_docs_text=[])
+        retriever = HybridRetriever(vectorstore_manager=mock_vs_manager)
         result = await retriever.retrieve("Provide all URLs related to authentication.")
         
         expected = [
@@ -33,7 +35,7 @@ class TestHybridRetriever(unittest.IsolatedAsyncioTestCase):
             ("Contact us at +1-800-555-1234 for support.", {"source": "doc2"}, 0.90)
         ])
         
-        retriever = HybridRetriever(vectorstore_manager=mock_vs_manager, all_docs_text=[])
+        retriever = HybridRetriever(vectorstore_manager=mock_vs_manager)
         result = await retriever.retrieve("What is the contact phone number?")
         
         expected = [
@@ -51,7 +53,7 @@ class TestHybridRetriever(unittest.IsolatedAsyncioTestCase):
             ("Project Aurora user data handling.", {"source": "doc3"}, 0.85)
         ])
         
-        retriever = HybridRetriever(vectorstore_manager=mock_vs_manager, all_docs_text=[])
+        retriever = HybridRetriever(vectorstore_manager=mock_vs_manager)
         result = await retriever.retrieve("How does user data handling work in Project Aurora?")
         
         expected = [
@@ -66,12 +68,112 @@ class TestHybridRetriever(unittest.IsolatedAsyncioTestCase):
         mock_vs_manager = MockVectorStoreManager.return_value
         mock_vs_manager.similarity_search_with_scores = AsyncMock(return_value=[])
         
-        retriever = HybridRetriever(vectorstore_manager=mock_vs_manager, all_docs_text=[])
+        retriever = HybridRetriever(vectorstore_manager=mock_vs_manager)
         result = await retriever.retrieve("Explain the backup procedures.")
         
         expected = []
         
         self.assertEqual(result, expected)
 
+    @patch('core.hybrid_retriever.VectorStoreManager')
+    async def test_identifier_query_skips_embedding(self, MockVectorStoreManager):
+        mock_vs_manager = MockVectorStoreManager.return_value
+        mock_vs_manager.similarity_search_with_scores = AsyncMock(return_value=[])
+        lexical_index = MagicMock()
+        lexical_index.search.return_value = [
+            ("ERR_4012 means the BIN is disabled.", {"chunk_id": "1:a"}, 7.5)
+        ]
+
+        retriever = HybridRetriever(vectorstore_manager=mock_vs_manager, lexical_index=lexical_index)
+        result = await retriever.retrieve("ERR_4012")
+
+        self.assertEqual(result, [("ERR_4012 means the BIN is disabled.", {"chunk_id": "1:a", "score": 7.5})])
+        mock_vs_manager.similarity_search_with_scores.assert_not_awaited()
+
+    @patch('core.hybrid_retriever.VectorStoreManager')
+    async def test_bm25_search_runs_off_the_event_loop(self, MockVectorStoreManager):
+        mock_vs_manager = MockVectorStoreManager.return_value
+        mock_vs_manager.similarity_search_with_scores = AsyncMock(return_value=[])
+        search_threads = []
+        lexical_index = MagicMock()
+        lexical_index.search.side_effect = lambda query, k: search_threads.append(threading.get_ident()) or []
+
+        retriever = HybridRetriever(vectorstore_manager=mock_vs_manager, lexical_index=lexical_index)
+        await retriever.retrieve("How are cards with ERR_4012 handled by the platform?")
+
+        self.assertEqual(len(search_threads), 1)
+        self.assertNotEqual(search_threads[0], threading.get_ident())
+
+    @patch('core.hybrid_retriever.VectorStoreManager')
+    async def test_semantic_query_fuses_vector_and_bm25(self, MockVectorStoreManager):
+        mock_vs_manager = MockVectorStoreManager.return_value
+        mock_vs_manager.similarity_search_with_scores = AsyncMock(return_value=[
+            ("Vector only.", {"chunk_id": "v"}, 0.2),
+            ("Both lists.", {"chunk_id": "both"}, 0.3),
+        ])
+        lexical_index = MagicMock()
+        lexical_index.search.return_value = [
+            ("Both lists.", {"chunk_id": "both"}, 9.0),
+            ("Lexical only.", {"chunk_id": "l"}, 4.0),
+        ]
+
+        retriever = HybridRetriever(vectorstore_manager=mock_vs_manager, lexical_index=lexical_index)
+        result = await retriever.retrieve("How are cards with ERR_4012 handled by the platform?")
+
+        self.assertEqual([md["chunk_id"] for _, md in result], ["both", "v", "l"])
+        self.assertAlmostEqual(result[0][1]["score"], 1 / 62 + 1 / 61)
+
+    @patch('core.hybrid_retriever.VectorStoreManager')
+    async def test_url_query_uses_entity_index(self, MockVectorStoreManager):
+        mock_vs_manager = MockVectorStoreManager.return_value
+        mock_vs_manager.similarity_search_with_scores = AsyncMock(return_value=[
+            ("Auth guide, see https://docs.example.com.", {"page_id": "7", "chunk_id": "7:a"}, 0.3)
+        ])
+        lookup_threads = []
+        entity_index = MagicMock()
+        entity_index.lookup.side_effect = lambda *args, **kwargs: lookup_threads.append(threading.get_ident()) or [
+            ("https://sandbox.example.com", {"type": "url_extraction", "value": "https://sandbox.example.com", "page_id": "9"})
+        ]
+
+        retriever = HybridRetriever(vectorstore_manager=mock_vs_manager, entity_index=entity_index)
+        result = await retriever.retrieve("What is the sandbox URL?")
+
+        entity_index.lookup.assert_called_once_with("url", page_ids=["7"], terms=["sandbox"], limit=20)
+        self.assertNotEqual(lookup_threads, [threading.get_ident()])
+        self.assertEqual(result[-1][0], "https://sandbox.example.com")
+        self.assertEqual(len(result), 2)
+
+    @patch('core.hybrid_retriever.VectorStoreManager')
+    async def test_empty_entity_index_falls_back_to_scanning_chunks(self, MockVectorStoreManager):
+        mock_vs_manager = MockVectorStoreManager.return_value
+        mock_vs_manager.similarity_search_with_scores = AsyncMock(return_value=[
+            ("Sandbox lives at https://sandbox.example.com for testing.", {"page_id": "7", "chunk_id": "7:a"}, 0.3)
+        ])
+        entity_index = MagicMock()
+        entity_index.lookup.return_value = []
+
+        retriever = HybridRetriever(vectorstore_manager=mock_vs_manager, entity_index=entity_index)
+        result = await retriever.retrieve("What is the sandbox URL?")
+
+        entity_index.lookup.assert_called_once()
+        self.assertEqual(result[-1], ("https://sandbox.example.com", {"type": "url_extraction"}))
+
+    @patch('core.hybrid_retriever.VectorStoreManager')
+    async def test_reranker_narrows_wide_first_stage(self, MockVectorStoreManager):
+        mock_vs_manager = MockVectorStoreManager.return_value
+        mock_vs_manager.similarity_search_with_scores = AsyncMock(return_value=[
+            ("Cards are issued through the issuing API.", {"chunk_id": "a"}, 0.2),
+            ("Webhooks report card status changes.", {"chunk_id": "b"}, 0.3),
+            ("To freeze a card, call the freeze endpoint.", {"chunk_id": "c"}, 0.4),
+        ])
+
+        retriever = HybridRetriever(vectorstore_manager=mock_vs_manager, k=5,
+                                    reranker=LexicalReranker(top_k=2, min_score=0.0), candidates=50)
+        result = await retriever.retrieve("How do I freeze a card?")
+
+        mock_vs_manager.similarity_search_with_scores.assert_awaited_once_with("How do I freeze a card?", k=50)
+        self.assertEqual(len(result), 2)
+        self.assertEqual(result[0][1]["chunk_id"], "c")
+
 if __name__ == "__main__":
     unittest.main()
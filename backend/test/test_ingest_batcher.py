@@ -0,0 +1,90 @@
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from core.ingest_batcher import IngestBatcher
+
+
+class TestIngestBatcher(unittest.IsolatedAsyncioTestCase):
+
+    @patch('core.ingest_batcher.count_tokens', side_effect=lambda text: len(text.split()))
+    async def test_batches_across_pages_and_persists_once(self, _mock_count_tokens):
+        vs_manager = AsyncMock()
+        batcher = IngestBatcher(vs_manager, max_batch_tokens=4, max_batch_texts=10,
+                                max_concurrency=2, persist_every=100)
+
+        await batcher.add_page("p1", ["a b", "c"], [{"page_id": "p1"}, {"page_id": "p1"}])
+        await batcher.add_page("p2", ["d e", "f g h"], [{"page_id": "p2"}, {"page_id": "p2"}])
+        report = await batcher.close()
+
+        batches = [call.args[0] for call in vs_manager.add_text_batch.await_args_list]
+        self.assertEqual(sorted(batches), [["a b", "c"], ["d e"], ["f g h"]])
+        self.assertEqual(report.batch_count, 3)
+        self.assertEqual(report.chunk_count, 4)
+        self.assertEqual(report.embedded_pages, {"p1", "p2"})
+        vs_manager.persist.assert_awaited_once()
+
+    async def test_persists_once_per_window(self):
+        vs_manager = AsyncMock()
+        batcher = IngestBatcher(vs_manager, max_batch_tokens=10_000, max_batch_texts=1,
+                                max_concurrency=1, persist_every=2)
+
+        for i in range(4):
+            await batcher.add_page(f"p{i}", [f"chunk {i}"], [{}])
+        await batcher.close()
+
+        self.assertEqual(vs_manager.add_text_batch.await_count, 4)
+        self.assertEqual(vs_manager.persist.await_count, 2)
+
+    async def test_reports_failed_batches(self):
+        vs_manager = AsyncMock()
+
+        async def flaky_add(texts, metadatas, ids=None):
+            if "bad" in texts:
+                raise RuntimeError("429 Too Many Requests")
+
+        vs_manager.add_text_batch.side_effect = flaky_add
+        batcher = IngestBatcher(vs_manager, max_batch_tokens=10_000, max_batch_texts=1)
+
+        await batcher.add_page("ok", ["good"], [{}])
+        await batcher.add_page("broken", ["fine", "bad"], [{}, {}])
+        report = await batcher.close()
+
+        self.assertEqual(report.embedded_pages, {"ok"})
+        self.assertEqual(report.failed_pages, {"broken"})
+        self.assertEqual(len(report.failures), 1)
+        self.assertEqual(report.failures[0].page_ids, ["broken"])
+        self.assertIn("429", report.failures[0].error)
+
+    async def test_passes_chunk_ids_through(self):
+        vs_manager = AsyncMock()
+        batcher = IngestBatcher(vs_manager)
+
+        await batcher.add_page("p1", ["a", "b"], [{}, {}], ["p1:aa", "p1:bb"])
+        await batcher.close()
+
+        self.assertEqual(vs_manager.add_text_batch.await_args.kwargs["ids"], ["p1:aa", "p1:bb"])
+
+    async def test_reports_stored_pages_after_each_persist(self):
+        vs_manager = AsyncMock()
+
+        async def flaky_add(texts, metadatas, ids=None):
+            if "bad" in texts:
+                raise RuntimeError("429 Too Many Requests")
+
+        vs_manager.add_text_batch.side_effect = flaky_add
+        stored = []
+        on_pages_stored = AsyncMock(side_effect=lambda pages: stored.append(sorted(pages)))
+        batcher = IngestBatcher(vs_manager, max_batch_tokens=10_000, max_batch_texts=1,
+                                max_concurrency=1, persist_every=2, on_pages_stored=on_pages_stored)
+
+        await batcher.add_page("p1", ["a"], [{}])
+        await batcher.add_page("p2", ["b", "bad"], [{}, {}])
+        await batcher.add_page("p3", ["c"], [{}])
+        await batcher.close()
+
+        # p2 had a failed batch, so it is never reported as stored.
+        self.assertEqual(stored, [["p1"], ["p3"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from core.ingest_jobs import IngestScheduler, parse_schedule, RUNNING, SUCCEEDED, FAILED
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.01)
+
+
+class _FakeIngest:
+    """Ingestion stand-in whose runs stay open until release() is called."""
+
+    def __init__(self):
+        self.calls = []
+        self.running = 0
+        self.peak = 0
+        self._released = threading.Event()
+
+    def release(self):
+        self._released.set()
+
+    async def __call__(self, space_key, delta, progress):
+        self.calls.append((space_key, delta))
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        progress.fetched += 3
+        try:
+            while not self._released.is_set():
+                await asyncio.sleep(0.01)
+            if space_key == "BROKEN":
+                raise RuntimeError("Confluence is down")
+            return 3
+        finally:
+            self.running -= 1
+
+
+class TestIngestScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.ingest = _FakeIngest()
+        self.scheduler = IngestScheduler(self.ingest, max_concurrent=2)
+        self.addCleanup(self.scheduler.stop)
+        self.addCleanup(self.ingest.release)
+
+    def test_requests_for_a_space_join_its_job(self):
+        first = self.scheduler.submit("TD", delta=True)
+        _wait_for(lambda: first.status == RUNNING)
+        self.assertIs(self.scheduler.submit("TD", delta=True), first)
+
+        # A full ingestion waits for the running delta one, and later requests join it.
+        full = self.scheduler.submit("TD")
+        self.assertIsNot(full, first)
+        self.assertIs(self.scheduler.submit("TD", delta=True), full)
+        self.assertFalse(full.delta)
+
+        self.ingest.release()
+        _wait_for(lambda: full.done)
+        self.assertEqual(self.ingest.calls, [("TD", True), ("TD", False)])
+        self.assertEqual(self.ingest.peak, 1)
+        self.assertEqual((first.requests, full.requests), (2, 2))
+        self.assertEqual((full.status, full.updated_count, full.progress.fetched), (SUCCEEDED, 3, 3))
+
+    def test_spaces_run_in_parallel_up_to_the_limit(self):
+        jobs = [self.scheduler.submit(space_key) for space_key in ("TD", "OPS", "BROKEN")]
+        _wait_for(lambda: self.ingest.running == 2)
+        time.sleep(0.05)
+        self.assertEqual(self.ingest.running, 2)
+
+        self.ingest.release()
+        _wait_for(lambda: all(job.done for job in jobs))
+        self.assertEqual(self.ingest.peak, 2)
+        self.assertEqual(jobs[2].status, FAILED)
+        self.assertEqual(jobs[2].error, "RuntimeError: Confluence is down")
+        self.assertEqual([job.id for job in self.scheduler.list_jobs()], [job.id for job in reversed(jobs)])
+        self.assertIs(self.scheduler.get(jobs[0].id), jobs[0])
+        self.assertIsNone(self.scheduler.get("missing"))
+
+    def test_scheduled_refresh_submits_delta_jobs(self):
+        self.ingest.release()
+        self.scheduler.schedule("TD", 0.05)
+
+        _wait_for(lambda: len(self.ingest.calls) >= 2)
+        self.assertEqual(self.ingest.calls[:2], [("TD", True), ("TD", True)])
+        self.assertEqual(self.scheduler.list_jobs()[-1].trigger, "schedule")
+
+    def test_parse_schedule(self):
+        self.assertEqual(parse_schedule("TD=3600, OPS=86400,BAD=soon,OFF=0,"), {"TD": 3600.0, "OPS": 86400.0})
+        self.assertEqual(parse_schedule(""), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
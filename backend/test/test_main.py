@@ -1,24 +1,47 @@
 import unittest
 from unittest.mock import patch, AsyncMock
 import asyncio
+import os
+import tempfile
 
 from core.vectorstore_manager import VectorStoreManager
 from core.confluence_loader import ConfluenceLoader
 from core.doc_processor import process_confluence_page
-from core.doc_registry import load_registry, save_registry
-from main import fetch_and_ingest_pages, run_ingestion_only, run_all
+from core.doc_registry import DocRegistry, compute_chunk_id
+from core.attachments import AttachmentTooLarge
+from core.ingest_jobs import IngestProgress
+from main import fetch_and_ingest_pages, run_ingestion_only, run_all, delete_pages, DeltaSyncAborted
+
+
+def _pages_stream(pages):
+    """Stand-in for ConfluenceLoader.iter_pages_in_space."""
+    async def _iter(space_key, *args, **kwargs):
+        for page in pages:
+            yield page
+    return _iter
 
 class TestMain(unittest.TestCase):
 
+    def setUp(self):
+        corpus_version_patcher = patch('main.bump_corpus_version')
+        self.mock_bump_corpus_version = corpus_version_patcher.start()
+        self.addCleanup(corpus_version_patcher.stop)
+
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.registry = DocRegistry(os.path.join(tmpdir.name, "registry.sqlite3"), legacy_file=None)
+        self.addCleanup(self.registry.close)
+        registry_patcher = patch('main.open_registry', return_value=self.registry)
+        registry_patcher.start()
+        self.addCleanup(registry_patcher.stop)
+
     @patch('main.VectorStoreManager')
     @patch('main.ConfluenceLoader')
     @patch('main.process_confluence_page')
-    @patch('main.load_registry')
-    @patch('main.save_registry')
-    def test_fetch_and_ingest_pages(self, mock_save_registry, mock_load_registry, mock_process_page, MockLoader, MockManager):
-        mock_load_registry.return_value = {}  # Simulate no existing registry
+    @patch('main.save_checkpoint')
+    def test_fetch_and_ingest_pages(self, mock_save_checkpoint, mock_process_page, MockLoader, MockManager):
         mock_loader_instance = MockLoader.return_value
-        mock_loader_instance.fetch_all_pages_in_space = AsyncMock(return_value=[{
+        mock_loader_instance.iter_pages_in_space = _pages_stream([{
             "id": "1",
             "title": "Test Page",
             "body": {"storage": {"value": "<p>Test content</p>"}}
@@ -30,24 +53,197 @@ class TestMain(unittest.TestCase):
             "title": "Test Page"
         }
         mock_manager_instance = MockManager.return_value
-        mock_manager_instance.add_texts = AsyncMock()
+        mock_manager_instance.add_text_batch = AsyncMock()
+        mock_manager_instance.persist = AsyncMock()
         
         updated_count, all_docs_text = asyncio.run(fetch_and_ingest_pages("TEST_SPACE", mock_manager_instance))
         
         self.assertEqual(updated_count, 1)
         self.assertEqual(all_docs_text, ["Test content"])
-        mock_manager_instance.add_texts.assert_awaited_once()
+        mock_manager_instance.add_text_batch.assert_awaited_once()
+        self.assertEqual(mock_save_checkpoint.call_args[0][1]["page_ids"], ["1"])
+
+    @patch('main.ConfluenceLoader')
+    @patch('main.load_checkpoint')
+    @patch('main.save_checkpoint')
+    def test_fetch_and_ingest_pages_delta(self, mock_save_checkpoint, mock_load_checkpoint, MockLoader):
+        self.registry.upsert_many({
+            "1": {"hash": "old-hash", "chunk_ids": None},
+            "2": {"hash": "hash-2", "chunk_ids": None},
+        })
+        mock_load_checkpoint.return_value = {
+            "last_sync": "2024-01-02T10:00:00+00:00",
+            "page_ids": ["1", "2"]
+        }
+        mock_loader_instance = MockLoader.return_value
+        mock_loader_instance.fetch_page_ids_in_space = AsyncMock(return_value={"1", "3"})
+        seen_kwargs = {}
+
+        async def _iter(space_key, *args, **kwargs):
+            seen_kwargs.update(kwargs)
+            yield {"id": "3", "title": "New Page", "body": {"storage": {"value": "<p>New</p>"}}}
+
+        mock_loader_instance.iter_pages_in_space = _iter
+        mock_manager_instance = AsyncMock()
+
+        updated_count, all_docs_text = asyncio.run(
+            fetch_and_ingest_pages("TEST_SPACE", mock_manager_instance, delta=True)
+        )
+
+        self.assertEqual(updated_count, 1)
+        self.assertEqual(all_docs_text, ["New"])
+        self.assertIsNotNone(seen_kwargs["modified_since"])
+        mock_manager_instance.delete_documents.assert_awaited_once_with(["2"], chunk_ids_by_page={})
+        self.assertNotIn("2", self.registry)
+        self.assertIn("3", self.registry)
+        self.assertEqual(mock_save_checkpoint.call_args[0][1]["page_ids"], ["1", "3"])
+
+    @patch('main.ConfluenceLoader')
+    @patch('main.load_checkpoint')
+    @patch('main.save_checkpoint')
+    def test_delta_with_empty_listing_deletes_nothing(self, mock_save_checkpoint, mock_load_checkpoint, MockLoader):
+        self.registry.upsert_many({
+            "1": {"hash": "hash-1", "chunk_ids": None},
+            "2": {"hash": "hash-2", "chunk_ids": None},
+        })
+        mock_load_checkpoint.return_value = {
+            "last_sync": "2024-01-02T10:00:00+00:00",
+            "page_ids": ["1", "2"]
+        }
+        MockLoader.return_value.fetch_page_ids_in_space = AsyncMock(return_value=set())
+        mock_manager_instance = AsyncMock()
+
+        with self.assertRaises(DeltaSyncAborted):
+            asyncio.run(fetch_and_ingest_pages("TEST_SPACE", mock_manager_instance, delta=True))
+
+        mock_manager_instance.delete_documents.assert_not_awaited()
+        self.assertEqual(len(self.registry), 2)
+        mock_save_checkpoint.assert_not_called()
+
+    @patch('main.ConfluenceLoader')
+    @patch('main.save_checkpoint')
+    def test_updated_page_embeds_only_changed_chunks(self, mock_save_checkpoint, MockLoader):
+        kept_id = compute_chunk_id("1", "Intro")
+        self.registry.upsert_many({"1": {"hash": "old-hash", "chunk_ids": [kept_id, "1:stale"]}})
+        MockLoader.return_value.iter_pages_in_space = _pages_stream([{"id": "1", "title": "Page"}])
+        mock_manager_instance = AsyncMock()
+
+        with patch('main.process_confluence_page') as mock_process_page:
+            mock_process_page.return_value = {
+                "page_id": "1",
+                "title": "Page",
+                "cleaned_text": "Intro Fixed typo",
+                "chunks": ["Intro", "Fixed typo"]
+            }
+            updated_count, _ = asyncio.run(fetch_and_ingest_pages("TEST_SPACE", mock_manager_instance))
+
+        self.assertEqual(updated_count, 1)
+        embedded_texts = mock_manager_instance.add_text_batch.await_args.args[0]
+        self.assertEqual(embedded_texts, ["Fixed typo"])
+        mock_manager_instance.delete_chunks.assert_awaited_once_with(["1:stale"])
+        entry = self.registry.get("1")
+        self.assertEqual(entry["chunk_ids"], [kept_id, compute_chunk_id("1", "Fixed typo")])
+
+    @patch('main.ConfluenceLoader')
+    @patch('main.save_checkpoint')
+    def test_failed_batch_is_not_recorded(self, mock_save_checkpoint, MockLoader):
+        MockLoader.return_value.iter_pages_in_space = _pages_stream([{
+            "id": "1",
+            "title": "Test Page",
+            "body": {"storage": {"value": "<p>Test content</p>"}}
+        }])
+        mock_manager_instance = AsyncMock()
+        mock_manager_instance.add_text_batch.side_effect = RuntimeError("rate limited")
+
+        updated_count, _ = asyncio.run(fetch_and_ingest_pages("TEST_SPACE", mock_manager_instance))
+
+        self.assertEqual(updated_count, 0)
+        self.assertEqual(len(self.registry), 0)
+        mock_save_checkpoint.assert_not_called()
+
+    @patch('main.ConfluenceLoader')
+    @patch('main.save_checkpoint')
+    def test_unchanged_and_unfetchable_pages(self, mock_save_checkpoint, MockLoader):
+        self.registry.upsert_many({"1": {"hash": "h1", "chunk_ids": ["1:a"], "version": 3}})
+        seen_kwargs = {}
+
+        async def _iter(space_key, *args, **kwargs):
+            seen_kwargs.update(kwargs)
+            kwargs["report"].unchanged_ids.add("1")
+            kwargs["report"].failed_page_ids.add("2")
+            yield {"id": "3", "title": "New Page", "body": {"storage": {"value": "<p>New</p>"}}}
+
+        MockLoader.return_value.iter_pages_in_space = _iter
+        mock_manager_instance = AsyncMock()
+        progress = IngestProgress()
+
+        updated_count, _ = asyncio.run(
+            fetch_and_ingest_pages("TEST_SPACE", mock_manager_instance, progress=progress)
+        )
+
+        self.assertEqual(updated_count, 1)
+        self.assertEqual((progress.fetched, progress.processed, progress.embedded), (1, 1, 1))
+        self.assertEqual((progress.unchanged, progress.failed), (1, 1))
+        self.assertEqual(progress.errors, ["1 pages could not be fetched."])
+        self.assertEqual(seen_kwargs["known_versions"](["1", "3"]), {"1": 3})
+        self.assertIn("3", self.registry)
+        self.assertNotIn("2", self.registry)
+        # A page that could not be fetched holds the checkpoint back.
+        mock_save_checkpoint.assert_not_called()
+
+    @patch('main.AttachmentExtractor')
+    @patch('main.ConfluenceLoader')
+    @patch('main.save_checkpoint')
+    def test_attachments_are_ingested_like_pages(self, mock_save_checkpoint, MockLoader, MockExtractor):
+        MockLoader.return_value.iter_pages_in_space = _pages_stream([{
+            "id": "1", "title": "Cards", "body": {"storage": {"value": "<p>Card docs</p>"}}
+        }])
+        spec = {"id": "att1", "title": "cards.yaml", "version": 2, "page_id": "1", "page_title": "Cards"}
+        huge = {"id": "att2", "title": "dump.pdf", "version": 1, "page_id": "1", "page_title": "Cards"}
+
+        async def _extract_all(loader, attachments):
+            yield spec, "## POST /cards/{id}/freeze\nFreeze a card", None
+            yield huge, None, AttachmentTooLarge("too big")
+
+        MockExtractor.return_value.extract_all = _extract_all
+        mock_manager_instance = AsyncMock()
+
+        updated_count, _ = asyncio.run(
+            fetch_and_ingest_pages("TEST_SPACE", mock_manager_instance, attachments=True)
+        )
+
+        self.assertEqual(updated_count, 3)
+        metadatas = mock_manager_instance.add_text_batch.await_args.args[1]
+        self.assertEqual(metadatas[-1]["title"], "Cards / cards.yaml")
+        self.assertEqual(metadatas[-1]["parent_page_id"], "1")
+        self.assertEqual(self.registry.get("att1")["version"], 2)
+        # Oversized files are recorded empty, so this version is not downloaded again.
+        self.assertEqual(self.registry.get("att2")["chunk_ids"], [])
+        self.assertEqual(mock_save_checkpoint.call_args[0][1]["attachment_ids"], ["att1", "att2"])
+
+    @patch('main.AttachmentExtractor')
+    @patch('main.ConfluenceLoader')
+    @patch('main.save_checkpoint')
+    def test_empty_space_skips_attachments(self, mock_save_checkpoint, MockLoader, MockExtractor):
+        MockLoader.return_value.iter_pages_in_space = _pages_stream([])
+        mock_manager_instance = AsyncMock()
+
+        updated_count, all_docs_text = asyncio.run(
+            fetch_and_ingest_pages("TEST_SPACE", mock_manager_instance, attachments=True)
+        )
+
+        self.assertEqual((updated_count, all_docs_text), (0, []))
+        MockExtractor.return_value.extract_all.assert_not_called()
+        mock_manager_instance.add_text_batch.assert_not_awaited()
+        mock_save_checkpoint.assert_not_called()
 
     @patch('main.VectorStoreManager')
     @patch('main.ConfluenceLoader')
     @patch('main.process_confluence_page')
-    @patch('main.load_registry')
-    @patch('main.save_registry')
-    def test_run_ingestion_only(self, mock_save_registry, mock_load_registry, mock_process_page, MockLoader, MockManager):
-        mock_load_registry.return_value = {}
-    
+    @patch('main.save_checkpoint')
+    def test_run_ingestion_only(self, mock_save_checkpoint, mock_process_page, MockLoader, MockManager):
         mock_loader_instance = MockLoader.return_value
-        mock_loader_instance.fetch_all_pages_in_space = AsyncMock(return_value=[{
+        mock_loader_instance.iter_pages_in_space = _pages_stream([{
             "id": "1",
             "title": "Test Page",
             "body": {"storage": {"value": "<p>Test content</p>"}}
@@ -61,23 +257,21 @@ class TestMain(unittest.TestCase):
         }
     
         mock_manager_instance = MockManager.return_value
-        mock_manager_instance.add_texts = AsyncMock()
+        mock_manager_instance.add_text_batch = AsyncMock()
+        mock_manager_instance.persist = AsyncMock()
     
         asyncio.run(run_ingestion_only())
     
-        mock_manager_instance.add_texts.assert_awaited_once()
+        mock_manager_instance.add_text_batch.assert_awaited_once()
 
     @patch('main.VectorStoreManager')
     @patch('main.ConfluenceLoader')
     @patch('main.process_confluence_page')
-    @patch('main.load_registry')
-    @patch('main.save_registry')
+    @patch('main.save_checkpoint')
     @patch('main.interactive_query_loop')
-    def test_run_all(self, mock_query_loop, mock_save_registry, mock_load_registry, mock_process_page, MockLoader, MockManager):
-        mock_load_registry.return_value = {}
-    
+    def test_run_all(self, mock_query_loop, mock_save_checkpoint, mock_process_page, MockLoader, MockManager):
         mock_loader_instance = MockLoader.return_value
-        mock_loader_instance.fetch_all_pages_in_space = AsyncMock(return_value=[{
+        mock_loader_instance.iter_pages_in_space = _pages_stream([{
             "id": "1",
             "title": "Test Page",
             "body": {"storage": {"value": "<p>Test content</p>"}}
@@ -91,15 +285,33 @@ class TestMain(unittest.TestCase):
         }
     
         mock_manager_instance = MockManager.return_value
-        mock_manager_instance.add_texts = AsyncMock()
+        mock_manager_instance.add_text_batch = AsyncMock()
+        mock_manager_instance.persist = AsyncMock()
     
         mock_query_loop.return_value = AsyncMock()
     
         asyncio.run(run_all())
     
-        mock_manager_instance.add_texts.assert_awaited_once()
+        mock_manager_instance.add_text_batch.assert_awaited_once()
     
         mock_query_loop.assert_awaited_once()
 
+    def test_delete_pages_uses_registry_chunk_ids(self):
+        self.registry.upsert_many({
+            "1": {"hash": "h1", "chunk_ids": ["1:a", "1:b"]},
+            "2": {"hash": "h2", "chunk_ids": ["2:a"]},
+        })
+        mock_manager_instance = AsyncMock()
+        mock_manager_instance.delete_documents.return_value = 2
+
+        deleted = asyncio.run(delete_pages(["1", "9"], mock_manager_instance))
+
+        self.assertEqual(deleted, 2)
+        mock_manager_instance.delete_documents.assert_awaited_once_with(
+            ["1", "9"], chunk_ids_by_page={"1": ["1:a", "1:b"]}
+        )
+        self.assertEqual([page_id for page_id, _ in self.registry.list_pages()], ["2"])
+        self.mock_bump_corpus_version.assert_called_once()
+
 if __name__ == "__main__":
     unittest.main()
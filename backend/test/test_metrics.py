@@ -0,0 +1,80 @@
+import asyncio
+import unittest
+
+from core.metrics import MetricsRegistry, STAGE_SECONDS, STAGE_ERRORS, span
+
+
+class TestMetricsRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_counter_renders_one_sample_per_label_set(self):
+        counter = self.registry.counter("test_requests_total", "Requests.", ["cache", "result"])
+        counter.inc(cache="answers", result="hit")
+        counter.inc(2, cache="answers", result="hit")
+        counter.inc(cache="answers", result="miss")
+
+        self.assertEqual(self.registry.render(), (
+            "# HELP test_requests_total Requests.\n"
+            "# TYPE test_requests_total counter\n"
+            'test_requests_total{cache="answers",result="hit"} 3\n'
+            'test_requests_total{cache="answers",result="miss"} 1\n'
+        ))
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = self.registry.histogram("test_seconds", "Latency.", ["stage"], buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 3.0):
+            histogram.observe(value, stage="llm")
+
+        lines = self.registry.render().splitlines()
+        self.assertEqual(lines[2:], [
+            'test_seconds_bucket{stage="llm",le="0.1"} 1',
+            'test_seconds_bucket{stage="llm",le="1"} 3',
+            'test_seconds_bucket{stage="llm",le="+Inf"} 4',
+            'test_seconds_sum{stage="llm"} 4.05',
+            'test_seconds_count{stage="llm"} 4',
+        ])
+
+    def test_label_values_are_escaped(self):
+        counter = self.registry.counter("test_total", "Escaping.", ["stage"])
+        counter.inc(stage='a "quoted"\nvalue')
+
+        self.assertIn('test_total{stage="a \\"quoted\\"\\nvalue"} 1', self.registry.render())
+
+
+class TestSpan(unittest.TestCase):
+
+    def test_times_blocks_and_counts_errors(self):
+        before = STAGE_SECONDS.count(stage="test.span")
+        errors = STAGE_ERRORS.value(stage="test.span")
+
+        with span("test.span"):
+            pass
+        with self.assertRaises(ValueError):
+            with span("test.span"):
+                raise ValueError("boom")
+
+        self.assertEqual(STAGE_SECONDS.count(stage="test.span"), before + 2)
+        self.assertEqual(STAGE_ERRORS.value(stage="test.span"), errors + 1)
+
+    def test_cancellation_is_not_an_error(self):
+        errors = STAGE_ERRORS.value(stage="test.cancelled")
+
+        async def slow():
+            with span("test.cancelled"):
+                await asyncio.sleep(10)
+
+        async def run():
+            task = asyncio.create_task(slow())
+            await asyncio.sleep(0)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(run())
+        self.assertEqual(STAGE_ERRORS.value(stage="test.cancelled"), errors)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from core.numpy_vector_index import NumpyVectorIndex
+
+
+class _FakeEmbeddings:
+    """Maps 'x,y,z' texts to their vector."""
+
+    def embed_documents(self, texts):
+        return [[float(v) for v in text.split(",")] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class TestNumpyVectorIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.directory = os.path.join(self.tmp_dir.name, "index")
+        self.index = NumpyVectorIndex(self.directory, _FakeEmbeddings())
+        self.index.add_texts(
+            ["1,0,0", "0,1,0", "1,1,0"],
+            [{"page_id": "1"}, {"page_id": "1"}, {"page_id": "2"}],
+            ids=["1:a", "1:b", "2:a"]
+        )
+
+    def tearDown(self):
+        self.index.close()
+        self.tmp_dir.cleanup()
+
+    def _search(self, index, vector, k=3):
+        return [(doc.metadata, round(score, 4))
+                for doc, score in index.similarity_search_by_vector_with_relevance_scores(vector, k=k)]
+
+    def test_top_k_is_closest_first_with_l2_distances(self):
+        results = self._search(self.index, [2.0, 0.0, 0.0], k=2)
+        self.assertEqual(results, [({"page_id": "1"}, 0.0), ({"page_id": "2"}, round(2 - np.sqrt(2), 4))])
+        doc, _ = self.index.similarity_search_with_score("0,1,0", k=1)[0]
+        self.assertEqual(doc.page_content, "0,1,0")
+
+    def test_overwrite_and_delete_are_tombstoned(self):
+        self.index.add_texts(["0,0,1"], [{"page_id": "1"}], ids=["1:a"])
+        self.index.delete(ids=["1:b", "missing"])
+
+        self.assertEqual(len(self.index), 2)
+        docs = self.index.similarity_search_by_vector_with_relevance_scores([0.0, 0.0, 1.0], k=5)
+        self.assertEqual([doc.page_content for doc, _ in docs], ["0,0,1", "1,1,0"])
+        self.assertEqual(self.index.get(where={"page_id": "1"}, include=[]), {"ids": ["1:a"]})
+        self.assertEqual(
+            sorted(self.index.get(where={"page_id": {"$in": ["1", "2"]}}, include=[])["ids"]), ["1:a", "2:a"]
+        )
+
+    def test_state_survives_reopen_and_compaction(self):
+        self.index.delete(ids=["1:a"])
+        self.index.compact()
+        self.index.close()
+
+        reopened = NumpyVectorIndex(self.directory, _FakeEmbeddings())
+        self.assertEqual(len(reopened), 2)
+        self.assertEqual(self._search(reopened, [0.0, 1.0, 0.0], k=1), [({"page_id": "1"}, 0.0)])
+        self.assertEqual(len([f for f in os.listdir(self.directory) if f.endswith(".npy")]), 1)
+        reopened.close()
+
+    def test_sees_writes_of_another_process(self):
+        # A second instance on the same directory stands in for the API process.
+        reader = NumpyVectorIndex(self.directory, _FakeEmbeddings())
+        self.index.add_texts(["0,0,1"], [{"page_id": "3"}], ids=["3:a"])
+        self.index.delete(ids=["1:a"])
+
+        self.assertEqual(self._search(reader, [0.0, 0.0, 1.0], k=1), [({"page_id": "3"}, 0.0)])
+        self.assertEqual(len(reader), 3)
+
+        self.index.delete(ids=["1:b", "2:a"])
+        self.index.compact()
+        self.assertEqual(self._search(reader, [1.0, 1.0, 1.0]), [({"page_id": "3"}, round(2 - 2 / np.sqrt(3), 4))])
+        reader.close()
+
+    def test_ivf_search_finds_neighbours_in_probed_lists(self):
+        rng = np.random.default_rng(1)
+        centers = rng.normal(size=(4, 16))
+        vectors = np.repeat(centers, 60, axis=0) + rng.normal(scale=0.05, size=(240, 16))
+        texts = [",".join(str(v) for v in row) for row in vectors]
+
+        index = NumpyVectorIndex(os.path.join(self.tmp_dir.name, "ivf"), _FakeEmbeddings(), ivf_lists=4, ivf_probe=1)
+        index.add_texts(texts, [{"row": i} for i in range(240)], ids=[str(i) for i in range(240)])
+
+        self.assertIsNotNone(index._centroids)
+        results = index.similarity_search_by_vector_with_relevance_scores(vectors[130].tolist(), k=5)
+        self.assertEqual(results[0][0].metadata, {"row": 130})
+        self.assertTrue(all(120 <= doc.metadata["row"] < 180 for doc, _ in results))
+        index.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
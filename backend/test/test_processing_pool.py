@@ -0,0 +1,58 @@
+import unittest
+import asyncio
+
+from core.doc_processor import process_confluence_page
+from core.processing_pool import PageProcessingPool
+
+
+def _pages(count):
+    async def _iter():
+        for i in range(count):
+            yield {"id": str(i), "title": f"Page {i}", "body": {"storage": {"value": f"<h1>T{i}</h1><p>Body {i}</p>"}}}
+    return _iter()
+
+
+async def _collect(pool, pages):
+    return [processed async for processed in pool.process(pages)]
+
+
+class TestPageProcessingPool(unittest.TestCase):
+
+    def test_inline_processing_keeps_order(self):
+        pool = PageProcessingPool(process_confluence_page, workers=0)
+        processed = asyncio.run(_collect(pool, _pages(3)))
+        self.assertEqual([p["page_id"] for p in processed], ["0", "1", "2"])
+
+    def test_worker_processes_return_every_page(self):
+        pool = PageProcessingPool(process_confluence_page, workers=2, batch_size=2)
+        processed = asyncio.run(_collect(pool, _pages(7)))
+        self.assertEqual(sorted(p["page_id"] for p in processed), [str(i) for i in range(7)])
+        page = next(p for p in processed if p["page_id"] == "3")
+        self.assertEqual(list(page["chunks"]), ["# T3\nBody 3"])
+        self.assertEqual(page["chunk_spans"][0].section, "T3")
+
+    def test_finished_batches_are_yielded_while_the_crawl_waits(self):
+        crawl_resumed = asyncio.Event()
+
+        async def _slow_pages():
+            async for page in _pages(2):
+                yield page
+            # The crawl stalls until the first batch has reached the consumer.
+            await crawl_resumed.wait()
+            yield {"id": "2", "title": "Page 2", "body": {"storage": {"value": "<p>Late</p>"}}}
+
+        async def _run():
+            pool = PageProcessingPool(process_confluence_page, workers=1, batch_size=2)
+            processed = []
+            async for page in pool.process(_slow_pages()):
+                processed.append(page["page_id"])
+                if len(processed) == 2:
+                    crawl_resumed.set()
+            return processed
+
+        processed = asyncio.run(asyncio.wait_for(_run(), timeout=60))
+        self.assertEqual(sorted(processed), ["0", "1", "2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
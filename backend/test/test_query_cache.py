@@ -0,0 +1,40 @@
+import unittest
+from unittest.mock import patch
+
+from core.query_cache import TTLCache, normalize_query
+
+
+class TestQueryCache(unittest.TestCase):
+
+    def test_normalize_query(self):
+        self.assertEqual(normalize_query("  What is a   BIN? "), "what is a bin")
+        self.assertEqual(normalize_query("what is a bin"), normalize_query("What is a BIN?"))
+
+    def test_lru_eviction_and_stats(self):
+        cache = TTLCache(max_size=2, ttl_seconds=60)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        self.assertEqual(cache.get("a"), 1)  # "a" is now most recently used
+        cache.put("c", 3)
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+        stats = cache.stats()
+        self.assertEqual((stats["size"], stats["hits"], stats["misses"]), (2, 2, 1))
+        self.assertAlmostEqual(stats["hit_rate"], 2 / 3)
+
+    @patch('core.query_cache.time.monotonic')
+    def test_entries_expire(self, mock_monotonic):
+        cache = TTLCache(max_size=10, ttl_seconds=5)
+        mock_monotonic.return_value = 100.0
+        cache.put("q", "answer")
+
+        mock_monotonic.return_value = 104.0
+        self.assertEqual(cache.get("q"), "answer")
+        mock_monotonic.return_value = 105.0
+        self.assertIsNone(cache.get("q"))
+        self.assertEqual(len(cache), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import time
+import unittest
+
+import numpy as np
+
+from core.reranker import Reranker, LexicalReranker, create_reranker
+
+
+def _candidates(*texts):
+    return [(text, {"chunk_id": str(i)}, 0.1 * i) for i, text in enumerate(texts)]
+
+
+class _SlowReranker(Reranker):
+    """Scores by text length, one candidate at a time, slowly."""
+
+    def __init__(self, **kwargs):
+        super().__init__(batch_size=1, **kwargs)
+        self.batches = 0
+
+    def score_batch(self, query, texts):
+        self.batches += 1
+        time.sleep(0.01)
+        return np.array([len(text) / 100 for text in texts])
+
+
+class TestLexicalReranker(unittest.TestCase):
+
+    def test_orders_by_query_coverage_and_drops_low_scores(self):
+        reranker = LexicalReranker(top_k=4, min_score=0.2)
+        candidates = _candidates(
+            "Cards are issued through the issuing API.",
+            "To freeze a card, call the freeze endpoint for the card.",
+            "Webhooks report card status changes.",
+            "A frozen card cannot authorize transactions; freeze it from the dashboard.",
+        )
+
+        result = reranker.rerank("How do I freeze a card?", candidates)
+
+        self.assertEqual([meta["chunk_id"] for _, meta, _ in result], ["1", "3"])
+        self.assertTrue(all(0.2 <= score <= 1 for _, _, score in result))
+        self.assertGreater(result[0][2], result[1][2])
+
+    def test_keeps_top_k(self):
+        reranker = LexicalReranker(top_k=2, min_score=0.0)
+        candidates = _candidates("freeze", "freeze card", "card", "freeze card freeze card")
+
+        result = reranker.rerank("freeze card", candidates)
+
+        self.assertEqual(len(result), 2)
+        self.assertEqual({meta["chunk_id"] for _, meta, _ in result}, {"1", "3"})
+
+    def test_no_matching_terms_keeps_first_stage_order(self):
+        reranker = LexicalReranker(top_k=3)
+        candidates = _candidates("Alpha.", "Beta.", "Gamma.", "Delta.")
+
+        result = reranker.rerank("How do I block a card?", candidates)
+
+        self.assertEqual([meta["chunk_id"] for _, meta, _ in result], ["0", "1", "2"])
+        self.assertEqual([score for _, _, score in result], [1.0, 1.0, 1.0])
+
+    def test_empty_candidates(self):
+        self.assertEqual(LexicalReranker().rerank("freeze", []), [])
+
+
+class TestRerankerBudget(unittest.TestCase):
+
+    def test_unscored_candidates_follow_in_first_stage_order(self):
+        reranker = _SlowReranker(top_k=4, min_score=0.0, budget_ms=0)
+        candidates = _candidates("short", "a much longer candidate text", "mid length", "x")
+
+        result = reranker.rerank("query", candidates)
+
+        # Only the first batch fits the budget; the rest keep their first-stage scores.
+        self.assertEqual(reranker.batches, 1)
+        self.assertEqual([meta["chunk_id"] for _, meta, _ in result], ["0", "1", "2", "3"])
+        self.assertAlmostEqual(result[0][2], 0.05)
+        self.assertAlmostEqual(result[1][2], 0.1)
+
+    def test_scores_every_batch_within_budget(self):
+        reranker = _SlowReranker(top_k=2, min_score=0.0, budget_ms=10_000)
+        candidates = _candidates("short", "a much longer candidate text", "mid length", "x")
+
+        result = reranker.rerank("query", candidates)
+
+        self.assertEqual(reranker.batches, 4)
+        self.assertEqual([meta["chunk_id"] for _, meta, _ in result], ["1", "2"])
+
+
+class TestCreateReranker(unittest.TestCase):
+
+    def test_create_reranker(self):
+        self.assertIsNone(create_reranker("none"))
+        self.assertIsInstance(create_reranker("lexical"), LexicalReranker)
+        with self.assertRaises(ValueError):
+            create_reranker("llm")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import asyncio
+import unittest
+from unittest.mock import patch, AsyncMock
+
+from core.session_memory import SessionMemoryStore
+
+
+class TestSessionMemoryStore(unittest.IsolatedAsyncioTestCase):
+
+    async def test_sessions_are_isolated(self):
+        store = SessionMemoryStore()
+        await store.save_turn("a", "Hi from a", "Hello a")
+
+        self.assertEqual([m.content for m in store.load_history("a")], ["Hi from a", "Hello a"])
+        self.assertEqual(store.load_history("b"), [])
+
+    @patch('core.session_memory.count_tokens', side_effect=lambda text: len(text.split()))
+    async def test_window_stays_within_budget_and_summarizes_dropped_turns(self, _):
+        summarizer = AsyncMock(return_value="User asked about BINs.")
+        store = SessionMemoryStore(max_history_tokens=6, summarizer=summarizer)
+
+        await store.save_turn("s", "what is a BIN", "first six digits")  # 7 tokens
+        await store.save_turn("s", "and PAN", "card number")  # 4 tokens
+
+        history = store.load_history("s")
+        self.assertEqual(history[0].type, "system")
+        self.assertIn("User asked about BINs.", history[0].content)
+        self.assertEqual([m.content for m in history[1:]], ["and PAN", "card number"])
+        dropped = summarizer.await_args_list[-1][0][1]
+        self.assertIn("first six digits", [m.content for m in dropped])
+
+    @patch('core.session_memory.count_tokens', side_effect=lambda text: len(text.split()))
+    async def test_concurrent_turns_are_summarized_one_after_another(self, _):
+        calls = []
+
+        async def summarizer(previous, dropped):
+            calls.append((previous, [m.content for m in dropped]))
+            await asyncio.sleep(0.01)
+            return f"{previous} +{len(dropped)}".strip()
+
+        store = SessionMemoryStore(max_history_tokens=2, summarizer=summarizer)
+        await asyncio.gather(
+            store.save_turn("s", "q1", "a1"),
+            store.save_turn("s", "q2", "a2"),
+            store.save_turn("s", "q3", "a3"),
+        )
+
+        # Each summary starts from the previous one, and no dropped turn is lost.
+        self.assertEqual([previous for previous, _ in calls], ["", "+2"])
+        self.assertEqual(sum(len(dropped) for _, dropped in calls), 4)
+        self.assertIn("+2 +2", store.load_history("s")[0].content)
+
+    @patch('core.session_memory.time.monotonic')
+    async def test_idle_and_excess_sessions_are_evicted(self, mock_monotonic):
+        store = SessionMemoryStore(idle_ttl_seconds=60, max_sessions=2)
+        mock_monotonic.return_value = 0.0
+        await store.save_turn("a", "q", "a")
+        await store.save_turn("b", "q", "a")
+        await store.save_turn("c", "q", "a")
+        self.assertEqual(len(store), 2)
+        self.assertEqual(store.load_history("a"), [])
+
+        mock_monotonic.return_value = 61.0
+        self.assertEqual(store.load_history("b"), [])
+        self.assertEqual(len(store), 0)
+        self.assertEqual(store.stats()["evicted"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
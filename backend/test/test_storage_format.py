@@ -0,0 +1,48 @@
+import unittest
+
+from core.storage_format import extract_text
+
+
+class TestStorageFormat(unittest.TestCase):
+
+    def test_entities_and_inline_markup(self):
+        html = "<p>Cards &amp; BINs&nbsp;use <strong>API</strong> &lt;v2&gt; &#8212; done</p>"
+        self.assertEqual(extract_text(html), "Cards & BINs use API <v2> — done")
+
+    def test_headings_lists_and_tables_keep_boundaries(self):
+        html = (
+            "<h2>Error codes</h2><ul><li><p>First</p></li><li>Second</li></ul>"
+            "<table><tbody><tr><th>Code</th><th>Meaning</th></tr>"
+            "<tr><td><p>ERR_4012</p></td><td><p>Card blocked</p><p>Call support</p></td></tr></tbody></table>"
+        )
+        self.assertEqual(extract_text(html).split("\n"), [
+            "## Error codes",
+            "- First",
+            "- Second",
+            "Code | Meaning",
+            "ERR_4012 | Card blocked Call support",
+        ])
+
+    def test_code_macro_is_kept_verbatim_and_parameters_dropped(self):
+        html = (
+            '<p>Example:</p><ac:structured-macro ac:name="code">'
+            '<ac:parameter ac:name="language">java</ac:parameter>'
+            "<ac:plain-text-body><![CDATA[if (a < b) {\n    return x && y;\n}]]></ac:plain-text-body>"
+            "</ac:structured-macro><p>After</p>"
+        )
+        self.assertEqual(
+            extract_text(html),
+            "Example:\n```\nif (a < b) {\n    return x && y;\n}\n```\nAfter"
+        )
+
+    def test_links_fall_back_to_target_title(self):
+        html = (
+            '<p>See <ac:link><ri:page ri:content-title="Fees &amp; Limits" /></ac:link> or '
+            '<ac:link><ri:page ri:content-title="Other" /><ac:plain-text-link-body>'
+            "<![CDATA[this page]]></ac:plain-text-link-body></ac:link>.</p>"
+        )
+        self.assertEqual(extract_text(html), "See Fees & Limits or this page.")
+
+
+if __name__ == "__main__":
+    unittest.main()
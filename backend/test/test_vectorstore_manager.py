@@ -4,9 +4,10 @@ from core.vectorstore_manager import VectorStoreManager
 
 class TestVectorStoreManager(unittest.TestCase):
 
-    @patch('core.vectorstore_manager.Chroma')
-    @patch('core.vectorstore_manager.OpenAIEmbeddings')
-    def setUp(self, MockOpenAIEmbeddings, MockChroma):
+    @patch('core.vectorstore_manager.EmbeddingCache')
+    @patch('langchain_chroma.Chroma')
+    @patch('langchain_openai.OpenAIEmbeddings')
+    def setUp(self, MockOpenAIEmbeddings, MockChroma, MockEmbeddingCache):
         self.mock_embeddings = MockOpenAIEmbeddings.return_value
         self.mock_chroma = MockChroma.return_value
         self.vs_manager = VectorStoreManager()
@@ -35,5 +36,50 @@ class TestVectorStoreManager(unittest.TestCase):
         await self.vs_manager.delete_document("123")
         self.mock_chroma.delete_document.assert_called_once_with("123")
 
+
+class TestVectorStoreManagerDeletion(unittest.IsolatedAsyncioTestCase):
+
+    @patch('core.vectorstore_manager.EmbeddingCache')
+    @patch('langchain_chroma.Chroma')
+    @patch('langchain_openai.OpenAIEmbeddings')
+    def setUp(self, MockOpenAIEmbeddings, MockChroma, MockEmbeddingCache):
+        self.mock_chroma = MockChroma.return_value
+        self.vs_manager = VectorStoreManager()
+
+    async def test_delete_document_with_known_chunk_ids(self):
+        deleted = await self.vs_manager.delete_document("123", chunk_ids=["123:a", "123:b"])
+
+        self.assertEqual(deleted, 2)
+        self.mock_chroma.get.assert_not_called()
+        self.mock_chroma.delete.assert_called_once_with(ids=["123:a", "123:b"])
+        self.mock_chroma.delete_collection.assert_not_called()
+
+    async def test_delete_documents_resolves_unknown_pages_in_one_lookup(self):
+        self.mock_chroma.get.return_value = {"ids": ["2:x", "3:y"]}
+
+        deleted = await self.vs_manager.delete_documents(["1", "2", "3"], {"1": ["1:a"]})
+
+        self.assertEqual(deleted, 3)
+        self.mock_chroma.get.assert_called_once_with(where={"page_id": {"$in": ["2", "3"]}}, include=[])
+        self.mock_chroma.delete.assert_called_once_with(ids=["1:a", "2:x", "3:y"])
+
+    async def test_repeated_query_reuses_cached_embedding(self):
+        self.vs_manager.embedding_fn.embed_query.return_value = [0.1, 0.2]
+        self.mock_chroma.similarity_search_by_vector_with_relevance_scores.return_value = []
+
+        await self.vs_manager.similarity_search_with_scores("What is a BIN?")
+        await self.vs_manager.similarity_search_with_scores("what is a bin")
+
+        self.vs_manager.embedding_fn.embed_query.assert_called_once_with("What is a BIN?")
+        self.assertEqual(self.mock_chroma.similarity_search_by_vector_with_relevance_scores.call_count, 2)
+
+    async def test_warm_up_searches_without_calling_openai(self):
+        await self.vs_manager.warm_up()
+
+        self.vs_manager.embedding_fn.embed_query.assert_not_called()
+        vector = self.mock_chroma.similarity_search_by_vector_with_relevance_scores.call_args[0][0]
+        self.assertEqual(len(vector), self.vs_manager.embedding_signature.dimension)
+        self.assertFalse(any(vector))
+
 if __name__ == "__main__":
     unittest.main()
@@ -6,6 +6,7 @@ const ChatInterface = () => {
   const [question, setQuestion] = useState('');
   const [messages, setMessages] = useState([]);
   const [loading, setLoading] = useState(false);
+  const [sessionId, setSessionId] = useState(null);
 
   const handleSend = async () => {
     if (!question.trim()) return;
@@ -18,8 +19,10 @@ const ChatInterface = () => {
     try {
       const response = await axios.post('http://localhost:5000/query', {
         question: question,
+        session_id: sessionId,
       });
 
+      setSessionId(response.data.session_id);
       const botMessage = { sender: 'Assistant', text: response.data.answer };
       setMessages((prev) => [...prev, botMessage]);
     } catch (error) {